@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+from utils.review_store import build_review_store, append_reviews, ReviewStore
+from utils.answer_cache import AnswerCache
+
+
+def _reviews(rows):
+    return pd.DataFrame(rows, columns=["reviews", "reviewers", "date_reviews", "course_id", "rating", "name", "institution"])
+
+
+def test_answers_are_dropped_when_another_process_appends_reviews(tmp_path):
+    store_dir = str(tmp_path / "review_store")
+    build_review_store(_reviews([("Great lectures.", "A", "2020", "ml-1", 5, "Machine Learning", "Stanford")]), store_dir)
+    cache = AnswerCache(ReviewStore(store_dir))
+    embedding = np.ones(4, dtype=np.float32)
+    cache.put("Stanford", "Machine Learning", embedding, "cached answer")
+    assert cache.get("Stanford", "Machine Learning", embedding) == "cached answer"
+
+    # The long-lived cache's store object is never reopened by hand
+    append_reviews(_reviews([("Loved the projects.", "B", "2022", "ml-1", 5, "Machine Learning", "Stanford")]),
+                   store_dir, ingested_path=str(tmp_path / "ingested.jsonl"))
+    assert cache.get("Stanford", "Machine Learning", embedding) is None
+    assert len(cache.store) == 2
@@ -0,0 +1,24 @@
+import numpy as np
+from utils import embedding_cache
+from utils.embedding_cache import EmbeddingCache
+
+
+def test_add_appends_and_merges_the_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "SHARD_SIZE", 64)
+    rng = np.random.default_rng(0)
+    cache = EmbeddingCache("model", root=str(tmp_path))
+    expected = {}
+    for size in [10, 30, 50, 5, 200, 1, 40, 90]:
+        hashes = rng.integers(0, 2**63, size=size, dtype=np.uint64)
+        vectors = rng.normal(size=(size, 4)).astype(np.float32)
+        cache.add(hashes, vectors)
+        expected.update(zip(hashes.tolist(), vectors))
+
+        for reopened in (cache, EmbeddingCache("model", root=str(tmp_path))):
+            keys = np.fromiter(expected, dtype=np.uint64)
+            assert len(reopened) == len(expected)
+            np.testing.assert_array_equal(reopened.get_by_hash(keys), np.stack(list(expected.values())))
+            assert not reopened.locate(np.array([1, 2], dtype=np.uint64))[0].any()
+    # Keys were merged into the sorted index at least once, and shards filled up to SHARD_SIZE
+    assert cache.meta["sorted_keys"] > 0 and np.all(np.diff(cache.keys.astype(np.float64)) >= 0)
+    assert all(len(cache._shard(i)) == 64 for i in range(cache.meta["num_shards"] - 1))
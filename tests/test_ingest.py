@@ -0,0 +1,33 @@
+import pandas as pd
+from utils.review_store import build_review_store, ReviewStore
+from utils.summary_cache import SummaryCache, SUMMARY_CACHE_PATH
+from utils.ingest import ingest_batch
+
+
+def _reviews(rows):
+    return pd.DataFrame(rows, columns=["reviews", "reviewers", "date_reviews", "course_id", "rating", "name", "institution"])
+
+
+def test_ingest_invalidates_summaries_of_updated_course_ids(tmp_path, monkeypatch):
+    # Every data path is relative to the repository root
+    monkeypatch.chdir(tmp_path)
+    build_review_store(_reviews([
+        ("Great lectures.", "A", "2020", "ml-1", 5, "Machine Learning", "Stanford"),
+        ("Too much math.", "B", "2020", "ml-1", 3, "Machine Learning", "Stanford"),
+        ("Clear and short.", "C", "2021", "py-1", 4, "Python", "Michigan"),
+    ]), "data/processed/review_store")
+    cache = SummaryCache(SUMMARY_CACHE_PATH)
+    for course_id in ("ml-1", "py-1"):
+        cache.put_summary(course_id, "params", "digest", f"summary of {course_id}")
+
+    batch = tmp_path / "batch.jsonl"
+    _reviews([
+        ("Loved the projects.", "D", "2022", "ml-1", 5, "Machine Learning", "Stanford"),
+        ("Great lectures.", "A", "2020", "ml-1", 5, "Machine Learning", "Stanford"),
+    ]).to_json(batch, orient="records", lines=True)
+    entry = ingest_batch(str(batch), "data/processed/review_store", use_vader=False)
+
+    assert entry["added"] == 1 and "summaries" in entry["stages"]
+    assert len(ReviewStore("data/processed/review_store").reviews_for_course_id("ml-1")) == 3
+    assert cache.get_summary("ml-1", "params", "digest") is None
+    assert cache.get_summary("py-1", "params", "digest") == "summary of py-1"
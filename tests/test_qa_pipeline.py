@@ -0,0 +1,38 @@
+import pandas as pd
+from utils import model_registry
+from utils.review_store import build_review_store, ReviewStore
+from utils.sentiment_engine import build_sentiment_store
+from utils.pipeline_benchmark import register_stand_in_models
+from utils.qa_pipeline import QAPipeline
+from utils.ingest import ingest_batch
+
+
+def _reviews(rows):
+    return pd.DataFrame(rows, columns=["reviews", "reviewers", "date_reviews", "course_id", "rating", "name", "institution"])
+
+
+def test_pipeline_answers_from_reviews_ingested_after_it_was_opened(tmp_path, monkeypatch):
+    # Every data path is relative to the repository root
+    monkeypatch.chdir(tmp_path)
+    register_stand_in_models("models")
+    build_review_store(_reviews([
+        ("Great lectures.", "A", "2020", "ml-1", 5, "Machine Learning", "Stanford"),
+        ("Too much math.", "B", "2020", "ml-1", 3, "Machine Learning", "Stanford"),
+    ]), "data/processed/review_store")
+    tokenizer, model = model_registry.get("roberta_sentiment")
+    build_sentiment_store(ReviewStore("data/processed/review_store"), tokenizer, model, processes=1, use_vader=False)
+
+    question = "Are the python projects useful for a career?"
+    pipeline = QAPipeline(ReviewStore("data/processed/review_store"))
+    before = pipeline.ask(question, "Stanford", "Machine Learning", generate=False)
+    assert question not in [r["review"] for r in before.get("reviews", [])]
+
+    batch = tmp_path / "batch.jsonl"
+    _reviews([(question, "C", "2022", "ml-1", 5, "Machine Learning", "Stanford")]).to_json(
+        batch, orient="records", lines=True)
+    ingest_batch(str(batch), "data/processed/review_store", use_vader=False)
+
+    after = pipeline.ask(question, "Stanford", "Machine Learning", generate=False)
+    assert "cached" not in after
+    hits = [r for r in after["reviews"] if r["review"] == question]
+    assert len(hits) == 1 and "sentiment" in hits[0]
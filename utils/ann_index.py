@@ -0,0 +1,160 @@
+"""FAISS index subsystem for review search.
+
+Supports an exact ``flat`` index plus the approximate ``ivf``, ``hnsw`` and
+``ivfpq`` variants. Indexes are trained once, written to
+``data/processed/indexes/`` and loaded on later runs; ``nprobe`` (IVF) and
+``ef_search`` (HNSW) can be tuned per query. ``recall_report`` measures
+recall@k and latency of every variant against the exact flat index.
+"""
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import faiss
+
+INDEX_DIR = "data/processed/indexes"
+INDEX_KINDS = ("flat", "ivf", "hnsw", "ivfpq")
+
+DEFAULT_PARAMS = {
+    "flat": {},
+    "ivf": {"nlist": None},
+    "hnsw": {"m": 32, "ef_construction": 200},
+    "ivfpq": {"nlist": None, "pq_m": 16, "pq_bits": 8},
+}
+
+
+def _default_nlist(n):
+    """~4*sqrt(n) lists, keeping at least 39 training points per list."""
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def build_index(embeddings, kind="flat", **params):
+    """Build (and train, if needed) an inner-product index over normalized embeddings."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}', expected one of {INDEX_KINDS}")
+    params = {**DEFAULT_PARAMS[kind], **params}
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        nlist = params["nlist"] or _default_nlist(n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            pq_m = params["pq_m"]
+            while dim % pq_m:
+                pq_m -= 1
+            # Each PQ codebook wants ~39 training points per centroid
+            pq_bits = min(params["pq_bits"], max(1, int(np.log2(max(n // 39, 2)))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+
+    index.add(embeddings)
+    return index
+
+
+def save_index(index, path, info=None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    faiss.write_index(index, path)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(info or {}, f)
+
+
+def load_index(path):
+    index = faiss.read_index(path)
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        info = json.load(f)
+    return index, info
+
+
+def load_or_build_index(embeddings, kind="flat", name="reviews", index_dir=INDEX_DIR, **params):
+    """Load a persisted index if it matches the embeddings, otherwise build and save it."""
+    path = os.path.join(index_dir, f"{name}.{kind}.faiss")
+    checksum = hashlib.blake2b(np.ascontiguousarray(embeddings).tobytes(), digest_size=8).hexdigest()
+    info = {
+        "kind": kind,
+        "ntotal": int(len(embeddings)),
+        "checksum": checksum,
+        "params": {**DEFAULT_PARAMS[kind], **params},
+    }
+    if os.path.exists(path) and os.path.exists(path + ".json"):
+        index, saved_info = load_index(path)
+        if saved_info == info:
+            print(f"📂 Loaded {kind} index from {path}")
+            return index
+    print(f"⚙️ Building {kind} index over {len(embeddings)} vectors...")
+    index = build_index(embeddings, kind, **params)
+    save_index(index, path, info)
+    return index
+
+
+def search_params(index, nprobe=None, ef_search=None):
+    """Per-query FAISS search parameters (None when the defaults apply)."""
+    inner = faiss.downcast_index(index)
+    if nprobe is not None and isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search is not None and isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+
+def search(index, queries, top_k=5, nprobe=None, ef_search=None):
+    """Search the index, returning (scores, ids) like ``index.search``."""
+    queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+    params = search_params(index, nprobe=nprobe, ef_search=ef_search)
+    if params is None:
+        return index.search(queries, top_k)
+    return index.search(queries, top_k, params=params)
+
+
+def recall_report(embeddings, queries, top_k=10, configs=None):
+    """Compare recall@k and latency of index variants against the exact flat index."""
+    import pandas as pd
+
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if configs is None:
+        configs = [
+            ("flat", {}, {}),
+            ("ivf", {}, {"nprobe": 1}),
+            ("ivf", {}, {"nprobe": 8}),
+            ("ivf", {}, {"nprobe": 32}),
+            ("hnsw", {}, {"ef_search": 16}),
+            ("hnsw", {}, {"ef_search": 64}),
+            ("ivfpq", {}, {"nprobe": 8}),
+            ("ivfpq", {}, {"nprobe": 32}),
+        ]
+
+    _, exact_ids = build_index(embeddings, "flat").search(queries, top_k)
+
+    rows = []
+    built = {}
+    for kind, build_params, query_params in configs:
+        key = (kind, json.dumps(build_params, sort_keys=True))
+        if key not in built:
+            start = time.perf_counter()
+            built[key] = (build_index(embeddings, kind, **build_params), time.perf_counter() - start)
+        index, build_seconds = built[key]
+
+        start = time.perf_counter()
+        _, ids = search(index, queries, top_k, **query_params)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        hits = sum(len(set(found) & set(exact)) for found, exact in zip(ids, exact_ids))
+        rows.append({
+            "index": kind,
+            "build_params": build_params,
+            "query_params": query_params,
+            f"recall@{top_k}": hits / (top_k * len(queries)),
+            "ms_per_query": latency_ms,
+            "build_s": build_seconds,
+            "size_mb": faiss.serialize_index(index).nbytes / 2**20,
+        })
+    return pd.DataFrame(rows)
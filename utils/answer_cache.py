@@ -0,0 +1,97 @@
+"""Per-course semantic answer cache for repeated and paraphrased questions.
+
+Entries are keyed on the normalized question embedding. A new question for
+the same course whose cosine distance to a cached question is at most
+``MAX_DISTANCE`` reuses that entry's intent, retrieved reviews and generated
+answer. Each course keeps at most ``MAX_ENTRIES_PER_COURSE`` entries (least
+recently used first out) and entries expire after ``TTL_SECONDS``. Entries
+remember the course's review digest, so a course whose reviews changed
+starts with an empty cache. The store is refreshed before every digest, so
+reviews appended by ``utils.ingest`` in another process are noticed too.
+"""
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+MAX_DISTANCE = 0.08  # cosine distance (1 - similarity) still treated as the same question
+MAX_ENTRIES_PER_COURSE = 256
+TTL_SECONDS = 24 * 3600
+
+
+class AnswerCache:
+    """LRU/TTL cache of responses per (institution, course), looked up by embedding similarity."""
+
+    def __init__(self, store, max_distance=MAX_DISTANCE, max_entries=MAX_ENTRIES_PER_COURSE, ttl=TTL_SECONDS):
+        self.store = store
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.courses = {}  # (institution, course) -> (digest, OrderedDict of entry id -> entry)
+        self.next_id = 0
+        self.counts = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _entries(self, institution, course):
+        """Entries of a course, dropped first if the course's reviews changed."""
+        key = (institution, course)
+        self.store.refresh()
+        digest = self.store.course_digest(institution, course)
+        cached = self.courses.get(key)
+        if cached is None or cached[0] != digest:
+            if cached is not None and cached[1]:
+                self.counts["invalidations"] += 1
+            cached = (digest, OrderedDict())
+            self.courses[key] = cached
+        return cached[1]
+
+    def _expire(self, entries, now):
+        expired = [entry_id for entry_id, entry in entries.items() if now - entry["created"] > self.ttl]
+        for entry_id in expired:
+            del entries[entry_id]
+        self.counts["expirations"] += len(expired)
+
+    def get(self, institution, course, embedding):
+        """Cached response of the nearest cached question within ``max_distance``, else None."""
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self.lock:
+            entries = self._entries(institution, course)
+            self._expire(entries, time.time())
+            if entries:
+                ids = list(entries)
+                similarities = np.stack([entries[i]["embedding"] for i in ids]) @ query
+                best = int(similarities.argmax())
+                if 1.0 - similarities[best] <= self.max_distance:
+                    entries.move_to_end(ids[best])
+                    self.counts["hits"] += 1
+                    return entries[ids[best]]["response"]
+            self.counts["misses"] += 1
+            return None
+
+    def put(self, institution, course, embedding, response):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        with self.lock:
+            entries = self._entries(institution, course)
+            entries[self.next_id] = {"embedding": embedding, "response": response, "created": time.time()}
+            self.next_id += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    def invalidate(self, institution, course=None):
+        """Drop the entries of one course, or of every course of an institution."""
+        with self.lock:
+            for key in [k for k in self.courses if k[0] == institution and (course is None or k[1] == course)]:
+                del self.courses[key]
+                self.counts["invalidations"] += 1
+
+    def stats(self):
+        lookups = self.counts["hits"] + self.counts["misses"]
+        return {
+            **self.counts,
+            "hit_rate": self.counts["hits"] / lookups if lookups else 0.0,
+            "entries": sum(len(entries) for _, entries in self.courses.values()),
+        }
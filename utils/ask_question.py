@@ -1,36 +1,25 @@
-import os
-import pickle
-import pandas as pd
-import torch
+import numpy as np
 from collections import Counter
-from sentence_transformers import SentenceTransformer, util
+from utils import model_registry, tracing
+from utils.model_registry import SBERT_MODEL
+from utils.inference_backend import variant_name
+from utils.review_store import open_review_store
+from utils.embedding_cache import EmbeddingCache
+from utils.answer_cache import AnswerCache
+from utils.recommender import open_recommender
+from utils.question_gate import open_question_gate, GATE_THRESHOLD
 
 # ------------------------------
-# 🧠 Load Sentence-BERT model
+# 🧠 Warm Sentence-BERT in the background while the user picks a course
 # ------------------------------
-print("\n🔗 Loading Sentence-BERT model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# ------------------------------
-# 📁 Load Generated Questions
-# ------------------------------
-generated_qs_path = "generated_questions.txt"
-if os.path.exists(generated_qs_path):
-    with open(generated_qs_path, "r", encoding="utf-8") as f:
-        generated_questions = [line.strip() for line in f if line.strip()]
-    generated_embeddings = model.encode(generated_questions, convert_to_tensor=True)
-else:
-    generated_questions = []
-    generated_embeddings = None
-    print("⚠️ No 'generated_questions.txt' found or it's empty!")
+model_registry.warm("sbert")
+tracing.configure(sample_rate=tracing.ENTRY_SAMPLE_RATE)
+embedding_cache = EmbeddingCache(variant_name(SBERT_MODEL))
 
 # ------------------------------
 # 🧾 Load Dataset
 # ------------------------------
-with open("data.pkl", "rb") as f:
-    df = pickle.load(f)
-
-df = df.drop_duplicates(subset=["reviews"]).reset_index(drop=True)
+store = open_review_store()
 
 # ------------------------------
 # 📚 Define Template Questions w/ Sentiments
@@ -55,12 +44,11 @@ question_templates = [
 
 template_texts = [q for q, _ in question_templates]
 template_labels = [label for _, label in question_templates]
-template_embeddings = model.encode(template_texts, convert_to_tensor=True)
 
 # ------------------------------
 # 🏫 Institution & Course Selection
 # ------------------------------
-institutions = sorted(df["institution"].dropna().unique())
+institutions = store.institutions()
 print("\n🏫 Available Institutions:")
 for i, inst in enumerate(institutions):
     print(f"{i + 1}. {inst}")
@@ -68,8 +56,7 @@ for i, inst in enumerate(institutions):
 inst_index = int(input("\n🔸 Select an institution (number): ")) - 1
 selected_inst = institutions[inst_index]
 
-inst_df = df[df["institution"] == selected_inst]
-courses = sorted(inst_df["name"].dropna().unique())
+courses = store.courses(selected_inst)
 
 print(f"\n📚 Courses under {selected_inst}:")
 for i, course in enumerate(courses):
@@ -78,61 +65,128 @@ for i, course in enumerate(courses):
 course_index = int(input("\n🔸 Select a course (number): ")) - 1
 selected_course = courses[course_index]
 
+# ------------------------------
+# 🧭 Similar Courses (precomputed by python -m utils.recommender)
+# ------------------------------
+recommender = open_recommender(store)
+similar_courses = recommender.similar(selected_inst, selected_course, k=5) if recommender else []
+if similar_courses:
+    print(f"\n🧭 Courses like {selected_course}:")
+    for i, other in enumerate(similar_courses):
+        rating = f"{other['mean_rating']:.2f}" if other["mean_rating"] is not None else "n/a"
+        print(f"{i + 1}. {other['course']} ({other['institution']}) | Similarity: {other['similarity']:.2f} | Rating: {rating}")
+
+# ------------------------------
+# 🧠 Sentence-BERT (loaded in the background during the prompts)
+# ------------------------------
+model = model_registry.get("sbert")
+template_embeddings = embedding_cache.encode(template_texts, model)
+
+# ------------------------------
+# 📁 Load Generated Questions (deduplicated and clustered by utils/question_gate.py)
+# ------------------------------
+question_gate = open_question_gate(model, embedding_cache)
+if question_gate is None:
+    print("⚠️ No 'generated_questions.txt' found or it's empty!")
+
 # ------------------------------
 # 🗂️ Filter Course Reviews
 # ------------------------------
-course_df = inst_df[inst_df["name"] == selected_course]
-course_reviews = course_df["reviews"].dropna().tolist()
+course_reviews = store.reviews(selected_inst, selected_course)
 
 if not course_reviews:
     print("\n⚠️ No reviews available for this course.")
     exit()
 
+# ------------------------------
+# 🔍 Sentiment Prediction & Generated Question Matching
+# ------------------------------
+answer_cache = AnswerCache(store)
+
+
+def match_question(user_embedding, k=3, top_n=5):
+    """Top-k template votes and top-n generated questions for one question embedding."""
+    cos_scores = template_embeddings @ user_embedding
+    top_k_indices = np.argsort(-cos_scores, kind="stable")[:k].tolist()
+    top_k_labels = [template_labels[i] for i in top_k_indices]
+    label_counts = Counter(top_k_labels)
+
+    # Only clusters that can still beat the current top-n are scored
+    generated = question_gate.search(user_embedding, top_n=top_n)[0] if question_gate is not None else []
+
+    return {
+        "templates": [(template_texts[i], template_labels[i], float(cos_scores[i])) for i in top_k_indices],
+        "predicted_type": label_counts.most_common(1)[0][0],
+        "generated": generated,
+        "related": not generated or generated[0][1] >= GATE_THRESHOLD,
+    }
+
+
 # ------------------------------
 # 💬 Ask Questions
 # ------------------------------
 print("\n💬 You can now ask questions about the course.")
-print("📌 Type 'exit' to stop asking questions.\n")
+print("📌 Type 'exit' to stop asking questions.")
+if similar_courses:
+    print("📌 Type 'compare <number>' to compare with one of the similar courses.")
+print()
 
 while True:
     question = input("❓ Your question: ").strip()
     if question.lower() == "exit":
         print("\n👋 Exiting. Thanks for exploring the course reviews!")
+        tracing.write_metrics()
         break
 
-    # 🔍 Sentiment Prediction
-    user_embedding = model.encode(question, convert_to_tensor=True)
-    cos_scores = util.pytorch_cos_sim(user_embedding, template_embeddings)[0]
-
-    k = 3
-    top_k_indices = torch.topk(cos_scores, k=k).indices.tolist()
-    top_k_labels = [template_labels[i] for i in top_k_indices]
-    top_k_templates = [template_texts[i] for i in top_k_indices]
-    top_k_scores = [cos_scores[i].item() for i in top_k_indices]
-
-    label_counts = Counter(top_k_labels)
-    predicted_type = label_counts.most_common(1)[0][0]
-
+    if question.lower().startswith("compare ") and similar_courses:
+        try:
+            other = similar_courses[int(question.split()[1]) - 1]
+        except (ValueError, IndexError):
+            print(f"⚠️ Enter a number between 1 and {len(similar_courses)}.")
+            continue
+        comparison = recommender.compare((selected_inst, selected_course), (other["institution"], other["course"]))
+        print(f"\n⚖️ {selected_course} vs {other['course']} (similarity {comparison['similarity']:.2f})")
+        for stats in comparison["courses"]:
+            rating = f"{stats['mean_rating']:.2f}" if stats["mean_rating"] is not None else "n/a"
+            sentiment = stats["sentiment"] or {}
+            print(f"   - {stats['course']}: {stats['reviews']} reviews | Rating: {rating} | "
+                  f"Positive: {sentiment.get('positive', 0):.0%} | Negative: {sentiment.get('negative', 0):.0%}")
+        print(f"🏆 Better rated: {comparison['better_rated']}")
+        print("\n" + "-" * 60)
+        continue
+
+    with tracing.span("ask_question", institution=selected_inst, course=selected_course):
+        with tracing.span("encode", batch_size=1):
+            user_embedding = model.encode(question, normalize_embeddings=True)
+
+        # ♻️ Repeated or paraphrased questions reuse the cached result
+        with tracing.span("answer_cache") as cache_span:
+            result = answer_cache.get(selected_inst, selected_course, user_embedding)
+            cache_span.set(cache_hit=result is not None)
+        if result is None:
+            with tracing.span("match_question"):
+                result = match_question(user_embedding)
+            answer_cache.put(selected_inst, selected_course, user_embedding, result)
+        else:
+            print("\n♻️ Reusing the result of a similar earlier question.")
+
+    k = len(result["templates"])
     print(f"\n🧠 Top {k} template matches:")
-    for i in range(k):
-        print(f"   - '{top_k_templates[i]}' | Sentiment: {top_k_labels[i]} | Score: {top_k_scores[i]:.2f}")
+    for template, label, score in result["templates"]:
+        print(f"   - '{template}' | Sentiment: {label} | Score: {score:.2f}")
 
-    print(f"\n📌 Predicted sentiment: {predicted_type.upper()} (based on top-{k} voting)")
+    print(f"\n📌 Predicted sentiment: {result['predicted_type'].upper()} (based on top-{k} voting)")
 
     # ------------------------------
     # 📈 Compare with Generated Questions
     # ------------------------------
-    if generated_questions:
+    if question_gate is not None:
         print("\n🔍 Comparing with generated questions...")
-        question_similarities = util.pytorch_cos_sim(user_embedding, generated_embeddings)[0]
-        top_n = 5
-        top_indices = torch.topk(question_similarities, k=top_n).indices.tolist()
-
-        print(f"\n🧩 Top {top_n} matching generated questions:")
-        for idx in top_indices:
-            sim_score = question_similarities[idx].item()
-            matched_q = generated_questions[idx]
+        print(f"\n🧩 Top {len(result['generated'])} matching generated questions:")
+        for matched_q, sim_score in result["generated"]:
             print(f"   - '{matched_q}' | Score: {sim_score:.2f}")
+        if not result["related"]:
+            print(f"\n⚠️ No generated question reaches {GATE_THRESHOLD} similarity; this may not be about the course.")
     else:
         print("\n⚠️ Skipping similarity with generated questions (no data).")
 
@@ -0,0 +1,270 @@
+"""BM25 inverted index over review text, plus hybrid lexical + dense retrieval.
+
+The index is a CSR layout over the whole review store, written to
+``data/processed/bm25/``: ``offsets[t]:offsets[t + 1]`` slices term ``t``'s
+postings (review-store row ids, ascending) and their term frequencies out of
+two flat arrays, next to one length per review. A course's reviews occupy a
+few contiguous row ranges, so its posting list for a term is a handful of
+``searchsorted`` slices of the global one. Document frequencies and the
+average review length are taken per course, which gives every course its own
+BM25 statistics. All arrays are memory-mapped.
+
+Reviews appended to the store (``utils.ingest``) are indexed as small
+segments under ``segments/`` that are searched alongside the main postings;
+after ``MAX_SEGMENTS`` of them the next update rebuilds a single index.
+
+``hybrid_search`` combines BM25 with a ``CourseRetriever``:
+
+* ``prefilter``: only the top ``LEXICAL_CANDIDATES`` BM25 hits are scored
+  densely (falls back to a full dense scan when the question shares no terms
+  with the course's reviews);
+* ``fusion``: dense and BM25 rankings merged by reciprocal rank fusion.
+
+Build it with ``python -m utils.bm25_index`` from the repository root.
+"""
+
+import os
+import re
+import json
+import shutil
+import numpy as np
+from collections import Counter
+from utils.review_store import open_review_store, load_array, save_array
+
+BM25_DIR = "data/processed/bm25"
+K1 = 1.2
+B = 0.75
+LEXICAL_CANDIDATES = 200  # BM25 hits re-ranked densely in "prefilter" mode
+RRF_K = 60  # reciprocal rank fusion constant
+RETRIEVAL_MODES = ("dense", "prefilter", "fusion")
+MAX_SEGMENTS = 16  # appended segments before the index is rebuilt as one
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i if in is it its
+me my of on or our so than that the their them then there these they this to was we were what when
+where which who why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens without stopwords."""
+    return [t for t in _TOKEN.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def _write_postings(store, out_dir, start, end):
+    """Tokenize rows ``[start, end)`` once and write their CSR postings to ``out_dir``."""
+    vocab = {}
+    term_ids, rows, tfs = [], [], []
+    doc_len = np.zeros(end - start, dtype=np.int32)
+    reviews = store.columns["reviews"]
+    for row_id in range(start, end):
+        counts = Counter(tokenize(reviews[row_id]))
+        doc_len[row_id - start] = sum(counts.values())
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row_id)
+            tfs.append(tf)
+
+    term_ids = np.array(term_ids, dtype=np.int32)
+    rows = np.array(rows, dtype=np.int32)
+    tfs = np.minimum(np.array(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)
+    # Rows were appended in ascending order, so a stable sort on the term keeps each posting list sorted
+    order = np.argsort(term_ids, kind="stable")
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+
+    os.makedirs(out_dir, exist_ok=True)
+    save_array(os.path.join(out_dir, "offsets.npy"), offsets)
+    save_array(os.path.join(out_dir, "postings.npy"), rows[order])
+    save_array(os.path.join(out_dir, "tfs.npy"), tfs[order])
+    save_array(os.path.join(out_dir, "doc_len.npy"), doc_len)
+    with open(os.path.join(out_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    return len(vocab), len(rows)
+
+
+def _write_meta(store, out_dir, segments, num_terms, num_postings):
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"store": store.store_digest(), "num_docs": len(store), "num_terms": num_terms,
+                   "num_postings": num_postings, "segments": segments}, f)
+
+
+def build_bm25_index(store, out_dir=BM25_DIR):
+    """Tokenize every review once and write the CSR postings."""
+    print(f"⚙️ Indexing {len(store)} review(s) for BM25...")
+    shutil.rmtree(os.path.join(out_dir, "segments"), ignore_errors=True)
+    num_terms, num_postings = _write_postings(store, out_dir, 0, len(store))
+    _write_meta(store, out_dir, [], num_terms, num_postings)
+    print(f"✅ BM25 index written to {out_dir} ({num_terms} terms, {num_postings} postings).")
+
+
+def append_bm25_segment(store, start, out_dir=BM25_DIR):
+    """Index the rows appended to the store from ``start`` on as a new segment (or rebuild after ``MAX_SEGMENTS``)."""
+    with open(os.path.join(out_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["store"] != store.store_digest(start) or len(meta.get("segments", [])) >= MAX_SEGMENTS:
+        build_bm25_index(store, out_dir)
+        return
+    name = f"{start}-{len(store)}"
+    num_terms, num_postings = _write_postings(store, os.path.join(out_dir, "segments", name), start, len(store))
+    _write_meta(store, out_dir, meta.get("segments", []) + [name], meta["num_terms"],
+                meta["num_postings"] + num_postings)
+    print(f"✅ BM25 segment {name} added ({num_terms} terms, {num_postings} postings).")
+
+
+class _Postings:
+    """One memory-mapped CSR segment."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        self.offsets = load_array(os.path.join(path, "offsets.npy"))
+        self.postings = load_array(os.path.join(path, "postings.npy"))
+        self.tfs = load_array(os.path.join(path, "tfs.npy"))
+        self.doc_len = load_array(os.path.join(path, "doc_len.npy"))
+
+    def lookup(self, term, ranges):
+        """(row ids, term frequencies) of ``term`` inside the row ranges."""
+        if term not in self.vocab:
+            return [], []
+        t = self.vocab[term]
+        lo, hi = self.offsets[t], self.offsets[t + 1]
+        postings = self.postings[lo:hi]
+        rows, tfs = [], []
+        for start, end in ranges:
+            first, last = np.searchsorted(postings, [start, end])
+            if first < last:
+                rows.append(np.asarray(postings[first:last], dtype=np.int64))
+                tfs.append(np.asarray(self.tfs[lo + first:lo + last], dtype=np.float32))
+        return rows, tfs
+
+
+class BM25Index:
+    """Memory-mapped BM25 postings; scores any set of row ranges (a course, or the whole store)."""
+
+    def __init__(self, path=BM25_DIR, store=None, k1=K1, b=B):
+        self.path = path
+        self.store = store
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            segments = json.load(f).get("segments", [])
+        self.segments = [_Postings(path)] + [_Postings(os.path.join(path, "segments", s)) for s in segments]
+        self.doc_len = self.segments[0].doc_len if len(self.segments) == 1 else \
+            np.concatenate([segment.doc_len for segment in self.segments])
+
+    def score_ranges(self, query, ranges):
+        """(row_ids, scores) of the reviews in the ``[start, end)`` ranges sharing at least one term with ``query``."""
+        terms = [t for t in set(tokenize(query)) if any(t in segment.vocab for segment in self.segments)]
+        num_docs = sum(end - start for start, end in ranges)
+        if not terms or num_docs <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        avg_len = float(sum(np.sum(self.doc_len[start:end], dtype=np.int64) for start, end in ranges) / num_docs) or 1.0
+
+        docs, partial = [], []
+        for term in terms:
+            rows, tfs = [], []
+            for segment in self.segments:
+                segment_rows, segment_tfs = segment.lookup(term, ranges)
+                rows += segment_rows
+                tfs += segment_tfs
+            if not rows:
+                continue
+            rows, tf = np.concatenate(rows), np.concatenate(tfs)
+            df = len(rows)
+            idf = np.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[rows] / avg_len)
+            docs.append(rows)
+            partial.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if not docs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        row_ids, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        return row_ids, np.bincount(inverse, weights=np.concatenate(partial)).astype(np.float32)
+
+    def score_range(self, query, start, end):
+        """(row_ids, scores) of the reviews in ``[start, end)`` sharing at least one term with ``query``."""
+        return self.score_ranges(query, [(start, end)])
+
+    def _ranked(self, row_ids, scores, top_k):
+        order = np.argsort(-scores, kind="stable")
+        if top_k is not None:
+            order = order[:top_k]
+        return [(int(row_ids[i]), float(scores[i])) for i in order]
+
+    def search_range(self, query, start, end, top_k=None):
+        """[(row_id, score)] sorted by BM25 score."""
+        return self._ranked(*self.score_range(query, start, end), top_k)
+
+    def search(self, institution, course, query, top_k=None):
+        """[(row_id, score)] of one course's reviews, sorted by BM25 score."""
+        ranges = self.store.course_ranges(institution, course)
+        if not ranges:
+            return []
+        return self._ranked(*self.score_ranges(query, ranges), top_k)
+
+
+def open_bm25_index(store, path=BM25_DIR):
+    """Load the BM25 index, (re)building it if it is missing or the review store changed."""
+    meta_path = os.path.join(path, "meta.json")
+    stale = True
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            stale = json.load(f)["store"] != store.store_digest()
+    if stale:
+        build_bm25_index(store, path)
+    return BM25Index(path, store)
+
+
+# ------------------------------
+# Hybrid retrieval
+# ------------------------------
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """[(id, fused score)] from several ranked lists of ids (score = sum of 1 / (k + rank))."""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: -kv[1])
+
+
+def hybrid_search(retriever, bm25, institution, course, question, query_embedding, mode="prefilter",
+                  top_k=None, threshold=None, candidates=LEXICAL_CANDIDATES):
+    """[(row_id, score)] for a question, combining BM25 with a ``CourseRetriever``.
+
+    ``prefilter`` returns cosine similarities of the lexical candidates only;
+    ``fusion`` returns reciprocal-rank-fusion scores (``threshold`` applies to the dense side).
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+    if mode == "dense":
+        return retriever.search(institution, course, query_embedding, top_k=top_k, threshold=threshold)
+
+    lexical = bm25.search(institution, course, question, top_k=candidates)
+    if mode == "fusion":
+        dense = retriever.search(institution, course, query_embedding, threshold=threshold)
+        fused = reciprocal_rank_fusion([[r for r, _ in dense], [r for r, _ in lexical]])
+        return fused[:top_k] if top_k is not None else fused
+
+    if not lexical:
+        return retriever.search(institution, course, query_embedding, top_k=top_k, threshold=threshold)
+    row_ids, matrix = retriever.matrix(institution, course)
+    lexical_ids = np.array([r for r, _ in lexical], dtype=np.int64)
+    positions = np.searchsorted(row_ids, lexical_ids)
+    # Drop BM25 hits the course matrix does not have a row for (e.g. built before an ingest)
+    found = positions < len(row_ids)
+    found[found] = row_ids[positions[found]] == lexical_ids[found]
+    lexical_ids, positions = lexical_ids[found], positions[found]
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    query = query / (np.linalg.norm(query) or 1.0)
+    scores = matrix.dot(query, rows=positions)
+
+    keep = np.flatnonzero(scores >= threshold) if threshold is not None else np.arange(len(scores))
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+    if top_k is not None:
+        keep = keep[:top_k]
+    return [(int(lexical_ids[i]), float(scores[i])) for i in keep]
+
+
+if __name__ == "__main__":
+    build_bm25_index(open_review_store())
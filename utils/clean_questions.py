@@ -1,16 +1,15 @@
-# Clean generated_questions.txt by keeping only proper questions
+# Clean generated_questions.txt by keeping only proper questions.
+# New runs of utils/question_generation.py already apply this filter while streaming;
+# this script is only needed for question files produced by older runs.
+from utils.question_generation import is_proper_question
 
-input_path = "generated_questions.txt"
-output_path = "cleaned_generated_questions.txt"
-
-with open(input_path, "r", encoding="utf-8") as f:
-    lines = f.readlines()
+input_path = "data/intermediate/generated_questions.txt"
+output_path = "data/intermediate/cleaned_generated_questions.txt"
 
 # Filter only lines that end with a question mark
-cleaned_questions = [line.strip() for line in lines if line.strip().endswith("?")]
-
-with open(output_path, "w", encoding="utf-8") as f:
-    for question in cleaned_questions:
-        f.write(question + "\n")
+with open(input_path, "r", encoding="utf-8") as f, open(output_path, "w", encoding="utf-8") as out_f:
+    for line in f:
+        if is_proper_question(line):
+            out_f.write(line.strip() + "\n")
 
 print(f"✅ Cleaned questions saved to: {output_path}")
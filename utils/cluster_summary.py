@@ -0,0 +1,127 @@
+"""Embedding-clustering extractive summarizer for courses of any size.
+
+Reviews are split into sentences and embedded through a sentence embedding
+cache of its own (``SENTENCE_CACHE_DIR``), so sentence vectors never crowd the
+review cache used for retrieval. The sentences are grouped with mini-batch
+k-means, and each cluster contributes the sentence closest to its centroid,
+largest cluster first. Every k-means step only touches one mini-batch, so the
+cost grows linearly with the number of sentences. A whole course is summarized
+without the 300-review cap and without TextRank's quadratic sentence graph.
+With ``sentiment`` set, sentences from reviews that lean that way are
+preferred (RoBERTa probabilities from the sentiment store).
+"""
+
+import re
+import numpy as np
+from utils.embedding_cache import EmbeddingCache
+from utils.inference_backend import variant_name
+from utils.model_registry import SBERT_MODEL
+from utils.sentiment_engine import ROBERTA_COLUMNS, SENTIMENT_LABELS
+from utils.tracing import span
+
+SENTENCE_CACHE_DIR = "data/processed/sentence_embedding_cache"
+NUM_SENTENCES = 5
+MIN_SENTENCE_WORDS = 4  # shorter sentences ("Great course!") are only used if nothing else is left
+BATCH_SIZE = 1024
+MAX_ITER = 100
+TOLERANCE = 1e-4  # stop once no centroid moves more than this in a step
+SENTIMENT_WEIGHT = 0.3  # added to a sentence's centroid similarity per unit of sentiment probability
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(reviews, min_words=MIN_SENTENCE_WORDS):
+    """Sentences of all reviews plus the index of the review each came from."""
+    sentences, owners = [], []
+    for i, review in enumerate(reviews):
+        for sentence in _SENTENCE_END.split(str(review).strip()):
+            sentence = sentence.strip()
+            if sentence:
+                sentences.append(sentence)
+                owners.append(i)
+    owners = np.array(owners, dtype=np.int64)
+    long_enough = np.array([len(s.split()) >= min_words for s in sentences], dtype=bool)
+    if long_enough.any():
+        sentences = [s for s, keep in zip(sentences, long_enough) if keep]
+        owners = owners[long_enough]
+    return sentences, owners
+
+
+def assign(embeddings, centroids, chunk_size=65536):
+    """Index of the nearest (highest cosine) centroid of every row."""
+    labels = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), chunk_size):
+        labels[start:start + chunk_size] = (embeddings[start:start + chunk_size] @ centroids.T).argmax(1)
+    return labels
+
+
+def minibatch_kmeans(embeddings, k, batch_size=BATCH_SIZE, max_iter=MAX_ITER, tol=TOLERANCE, seed=0):
+    """Spherical mini-batch k-means (Sculley, 2010) on normalized vectors; returns (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    centroids = embeddings[rng.choice(n, size=k, replace=False)].astype(np.float32)
+    counts = np.zeros(k, dtype=np.float64)
+
+    for _ in range(max_iter):
+        batch = embeddings[rng.integers(0, n, size=min(batch_size, n))]
+        nearest = assign(batch, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, nearest, batch)
+        hits = np.bincount(nearest, minlength=k)
+        updated = hits > 0
+        counts[updated] += hits[updated]
+        # Per-centroid learning rate 1/count: each centroid is the running mean of the points it has seen
+        previous = centroids.copy()
+        centroids[updated] += (sums[updated] - hits[updated, None] * centroids[updated]) / counts[updated, None]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+        if np.abs(centroids - previous).max() < tol:
+            break
+    return centroids, assign(embeddings, centroids)
+
+
+def summarize_sentences(sentences, embeddings, num_sentences=NUM_SENTENCES, weights=None, seed=0):
+    """Most central sentence of each of ``num_sentences`` clusters, largest cluster first."""
+    if not sentences:
+        return []
+    k = min(num_sentences, len(set(sentences)))
+    centroids, labels = minibatch_kmeans(embeddings, k, seed=seed)
+
+    picked = []
+    for cluster in np.argsort(-np.bincount(labels, minlength=k), kind="stable"):
+        members = np.flatnonzero(labels == cluster)
+        if not len(members):
+            continue
+        scores = embeddings[members] @ centroids[cluster]
+        if weights is not None:
+            scores = scores + SENTIMENT_WEIGHT * weights[members]
+        picked.append((sentences[members[int(scores.argmax())]], len(members)))
+    return picked
+
+
+def summarize_reviews(reviews, model, cache=None, num_sentences=NUM_SENTENCES, sentiment=None,
+                      sentiment_scores=None, seed=0):
+    """Extractive summary of a list of reviews.
+
+    ``sentiment_scores`` is an ``(len(reviews), 3)`` array of negative/neutral/positive
+    probabilities; with ``sentiment`` ("positive", "neutral" or "negative") it biases the pick.
+    """
+    cache = cache or EmbeddingCache(variant_name(SBERT_MODEL), root=SENTENCE_CACHE_DIR)
+    sentences, owners = split_sentences(reviews)
+    with span("cluster_summary", reviews=len(reviews), batch_size=len(sentences)):
+        embeddings = cache.encode(sentences, model)
+        weights = None
+        if sentiment is not None and sentiment_scores is not None:
+            weights = np.asarray(sentiment_scores)[owners, SENTIMENT_LABELS.index(sentiment)]
+        picked = summarize_sentences(sentences, embeddings, num_sentences, weights, seed)
+    return " ".join(sentence for sentence, _ in picked)
+
+
+def summarize_course(store, institution, course, model, cache=None, num_sentences=NUM_SENTENCES,
+                     sentiment=None, sentiment_store=None):
+    """Extractive summary over every review of a course (sentiment weighting needs a ``SentimentStore``)."""
+    row_ids = store.row_ids(institution, course)
+    sentiment_scores = None
+    if sentiment is not None and sentiment_store is not None:
+        sentiment_scores = np.stack([np.asarray(sentiment_store.columns[c][row_ids]) for c in ROBERTA_COLUMNS], axis=1)
+    return summarize_reviews(store.reviews(institution, course), model, cache, num_sentences, sentiment,
+                             sentiment_scores)
@@ -0,0 +1,204 @@
+"""Compact float16 / int8 storage for embedding matrices.
+
+Review and question embeddings are normalized float32 vectors. Stored as-is,
+every vector of every course and of the question bank costs ``4 * dim``
+bytes. ``EMBEDDING_DTYPE`` (environment variable ``QA_EMBEDDING_DTYPE``)
+picks how the per-course matrices (``utils.course_embeddings``) and the
+question gate bank (``utils.question_gate``) are written instead:
+
+* ``float32``: unchanged (default);
+* ``float16``: half the memory, scores off by ~1e-4. Scoring is slower
+  than int8 on CPUs, because NumPy converts half floats in software;
+* ``int8``: a quarter of the memory. Every dimension gets one scale
+  (``max |x| / 127`` over the matrix, saved next to it as ``<name>.scale.npy``)
+  and a vector is stored as ``round(x / scale)``.
+
+``CompactEmbeddings`` scores queries against the stored codes directly: an
+int8 matrix is scored as ``codes @ (query * scale)``, so the scale is folded
+into the query and never applied to the matrix. Rows are processed in blocks
+of ``BLOCK_ROWS``, and only one block at a time is cast to float32 for the
+matrix product. The memory-mapped matrix is never upcast as a whole.
+
+The embedding cache keeps float32 vectors, so switching the dtype only
+rewrites the compact matrices (no re-encoding). Compare recall, latency and
+memory of every dtype against float32 with ``python -m utils.compact_embeddings``
+from the repository root.
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from utils.review_store import load_array, save_array
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+EMBEDDING_DTYPE = os.environ.get("QA_EMBEDDING_DTYPE", "float32")
+BLOCK_ROWS = 4096  # rows cast to float32 at a time when scoring
+INT8_MAX = 127
+REPORT_ROWS = 50000  # review vectors sampled for the comparison
+REPORT_QUERIES = 200  # generated questions used as queries
+REPORT_TOP_K = 10
+
+
+def scale_path(path):
+    return os.path.splitext(path)[0] + ".scale.npy"
+
+
+def quantize(matrix, dtype=None):
+    """(codes, per-dimension scale or None) of a float matrix in ``dtype``."""
+    dtype = dtype or EMBEDDING_DTYPE
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unknown embedding dtype '{dtype}' (expected one of: {', '.join(EMBEDDING_DTYPES)})")
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype != "int8":
+        return matrix.astype(dtype), None
+    scale = np.abs(matrix).max(axis=0) / INT8_MAX if len(matrix) else np.ones(matrix.shape[1], dtype=np.float32)
+    scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+    return codes, scale
+
+
+def save_embeddings(path, matrix, dtype=None):
+    """Write ``matrix`` in ``dtype`` (plus its scale for int8); returns the stored ``CompactEmbeddings``."""
+    codes, scale = quantize(matrix, dtype)
+    if scale is not None:
+        save_array(scale_path(path), scale)
+    elif os.path.exists(scale_path(path)):
+        os.remove(scale_path(path))
+    save_array(path, codes)
+    return CompactEmbeddings(codes, scale)
+
+
+def load_embeddings(path):
+    """Memory-map a matrix written by ``save_embeddings`` (plain float32 ``.npy`` files load too)."""
+    codes = load_array(path)
+    scale = np.load(scale_path(path)) if codes.dtype == np.int8 else None
+    return CompactEmbeddings(codes, scale)
+
+
+class CompactEmbeddings:
+    """A float32, float16 or int8 (per-dimension scale) embedding matrix, scored block by block."""
+
+    def __init__(self, codes, scale=None, block_rows=BLOCK_ROWS):
+        self.codes = codes
+        self.scale = scale
+        self.block_rows = block_rows
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def dtype(self):
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def _blocks(self, rows):
+        if rows is None:
+            rows = slice(0, len(self))
+        if isinstance(rows, slice):
+            start, stop, _ = rows.indices(len(self))
+            for lo in range(start, stop, self.block_rows):
+                yield self.codes[lo:min(lo + self.block_rows, stop)]
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            for lo in range(0, len(rows), self.block_rows):
+                yield self.codes[rows[lo:lo + self.block_rows]]
+
+    def dot(self, queries, rows=None):
+        """Similarity of the stored rows (all, a slice or an index array) to one query (n,) or several (n, q)."""
+        queries = np.asarray(queries, dtype=np.float32)
+        folded = queries * self.scale if self.scale is not None else queries
+        parts = [np.asarray(block, dtype=np.float32) @ folded.T for block in self._blocks(rows)]
+        if not parts:
+            return np.zeros((0,) + queries.shape[:-1], dtype=np.float32)
+        return np.concatenate(parts)
+
+    def __getitem__(self, rows):
+        """Float32 copy of the selected rows."""
+        block = np.asarray(self.codes[rows], dtype=np.float32)
+        return block * self.scale if self.scale is not None else block
+
+    def mean(self):
+        """Mean vector of all rows, accumulated block by block."""
+        total = np.zeros(self.shape[1], dtype=np.float64)
+        for block in self._blocks(None):
+            total += np.asarray(block, dtype=np.float32).sum(axis=0)
+        total = total.astype(np.float32) / max(len(self), 1)
+        return total * self.scale if self.scale is not None else total
+
+
+# ------------------------------
+# float32 comparison
+# ------------------------------
+def precision_report(matrix, queries, top_k=REPORT_TOP_K, repeats=5):
+    """Recall@k against float32, score error, latency and memory of every dtype on the same vectors."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    top_k = min(top_k, len(matrix))
+    rows, reference = [], None
+    for dtype in EMBEDDING_DTYPES:
+        compact = CompactEmbeddings(*quantize(matrix, dtype))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            scores = np.stack([compact.dot(query) for query in queries], axis=1)
+        latency_ms = (time.perf_counter() - start) * 1000 / (repeats * len(queries))
+        top = np.argpartition(-scores, top_k - 1, axis=0)[:top_k].T
+        if reference is None:
+            reference = (scores, top)
+        recall = np.mean([len(np.intersect1d(a, b)) / top_k for a, b in zip(top, reference[1])])
+        rows.append({
+            "dtype": dtype,
+            "rows": len(matrix),
+            "memory_mb": compact.nbytes / 2**20,
+            "bytes_per_vector": compact.nbytes / max(len(matrix), 1),
+            f"recall@{top_k}": float(recall),
+            "max_score_error": float(np.abs(scores - reference[0]).max()),
+            "ms_per_query": latency_ms,
+        })
+    return pd.DataFrame(rows)
+
+
+def sample_vectors(store, cache, model, rows=REPORT_ROWS, queries=REPORT_QUERIES):
+    """float32 vectors of a fixed review sample and of generated questions (cache hits after the builds)."""
+    from utils.question_gate import load_generated_questions
+
+    rng = np.random.default_rng(0)
+    row_ids = np.sort(rng.choice(len(store), size=min(rows, len(store)), replace=False))
+    matrix = cache.encode([str(text) for text in store.columns["reviews"].take(row_ids)], model)
+    questions = load_generated_questions()
+    if questions:
+        picks = rng.choice(len(questions), size=min(queries, len(questions)), replace=False)
+        query_vectors = cache.encode([questions[i] for i in picks], model)
+    else:
+        query_vectors = matrix[rng.choice(len(matrix), size=min(queries, len(matrix)), replace=False)]
+    return np.asarray(matrix, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32)
+
+
+def main():
+    from utils import model_registry
+    from utils.review_store import open_review_store
+    from utils.embedding_cache import EmbeddingCache
+    from utils.inference_backend import variant_name
+
+    parser = argparse.ArgumentParser(description="Compare float16 / int8 embedding storage with float32.")
+    parser.add_argument("--rows", type=int, default=REPORT_ROWS, help="review vectors to search")
+    parser.add_argument("--queries", type=int, default=REPORT_QUERIES, help="generated questions used as queries")
+    parser.add_argument("--top-k", type=int, default=REPORT_TOP_K)
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(variant_name(model_registry.SBERT_MODEL))
+    matrix, queries = sample_vectors(open_review_store(), cache, model_registry.get("sbert"), args.rows, args.queries)
+    print(f"\n📊 {len(queries)} question(s) against {len(matrix)} review vector(s), top {args.top_k}:")
+    print(precision_report(matrix, queries, args.top_k).to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
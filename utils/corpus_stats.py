@@ -0,0 +1,244 @@
+"""Vectorized corpus statistics and MinHash-LSH near-duplicate detection.
+
+``corpus_report`` computes every report table of ``data_analysis.py`` in one
+grouped pass over the review store's columns (no per-institution filtering or
+``iterrows``) and ``write_report`` saves them as JSON or Parquet next to the
+console view.
+
+``find_near_duplicates`` shingles every review into character 5-grams,
+computes MinHash signatures and buckets them with LSH banding; candidate pairs
+whose estimated Jaccard similarity reaches the threshold are merged, and every
+review is mapped to the first review of its cluster. The resulting canonical
+mapping (``data/processed/near_duplicates.npy``) lets the embedding and
+sentiment builds process one review per cluster.
+
+Run ``python -m utils.corpus_stats`` from the repository root to write both.
+"""
+
+import os
+import re
+import json
+import numpy as np
+import pandas as pd
+from utils.review_store import open_review_store, load_array, save_array, append_array
+
+REPORT_DIR = "data/processed/report"
+NEAR_DUPLICATES_PATH = "data/processed/near_duplicates.npy"
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+NEAR_DUP_THRESHOLD = 0.8
+
+
+# ------------------------------
+# Report tables
+# ------------------------------
+def corpus_report(store):
+    """All report tables, computed from per-row arrays with one grouped pass."""
+    lengths = np.diff(np.asarray(store.columns["reviews"].offsets))
+    rows = pd.DataFrame({
+        "group": np.asarray(store.group),
+        "rating": np.asarray(store.rating),
+        "review_bytes": lengths,
+    })
+    per_group = rows.groupby("group").agg(
+        review_count=("rating", "size"),
+        rated=("rating", "count"),
+        rating_sum=("rating", "sum"),
+        review_bytes=("review_bytes", "sum"),
+    )
+    # Row groups are course segments; a course that gained reviews after the build spans several
+    courses = pd.DataFrame(store.course_table, columns=["institution", "name", "start", "end"])
+    courses = courses[(courses["institution"] != "") & (courses["name"] != "")]
+    per_course = courses.join(per_group, how="inner").groupby(["institution", "name"], sort=True).sum()
+    per_course = pd.DataFrame({
+        "review_count": per_course["review_count"],
+        "mean_rating": per_course["rating_sum"] / per_course["rated"],
+        "mean_review_bytes": per_course["review_bytes"] / per_course["review_count"],
+    }).reset_index()
+
+    per_institution = per_course.groupby("institution").agg(
+        courses=("name", "nunique"),
+        reviews=("review_count", "sum"),
+        mean_rating=("mean_rating", "mean"),
+    ).sort_values("courses", ascending=False).reset_index()
+
+    ratings = rows["rating"].value_counts(dropna=False).sort_index()
+    rating_distribution = ratings.rename_axis("rating").reset_index(name="count")
+
+    summary = pd.DataFrame([{
+        "raw_rows": store.meta["raw_rows"],
+        "duplicate_rows": store.meta["duplicate_rows"],
+        "unique_reviews": len(store),
+        "institutions": len(per_institution),
+        "courses": len(per_course),
+    }])
+    return {
+        "summary": summary,
+        "institutions": per_institution,
+        "courses": per_course,
+        "ratings": rating_distribution,
+    }
+
+
+def print_report(report):
+    """Console view of the report tables."""
+    summary = report["summary"].iloc[0]
+    print(f"\n🧾 Total rows in dataset: {summary['raw_rows']}")
+    print(f"🔁 Number of duplicate reviews: {summary['duplicate_rows']}")
+    print(f"\n🏫 Number of unique institutions: {summary['institutions']}")
+
+    print("\n📍 Institutions:")
+    for inst in sorted(report["institutions"]["institution"]):
+        print(f"- {inst}")
+
+    print("\n📚 Total number of unique courses offered by each institution:")
+    for row in report["institutions"].itertuples():
+        print(f"- {row.institution}: {row.courses} course(s)")
+
+    print("\n📊 Detailed Summary: Reviews per Course by Institution\n")
+    counts = report["institutions"].set_index("institution")["courses"]
+    for institution, group in report["courses"].groupby("institution", sort=True):
+        print(f"\n🏫 Institution: {institution} — {counts[institution]} course(s)")
+        print("-" * (len(institution) + 20))
+        lines = [f"   📘 {name}: {count} review(s)" for name, count in zip(group["name"], group["review_count"])]
+        print("\n".join(lines))
+
+
+def write_report(report, out_dir=REPORT_DIR, fmt="json"):
+    """Write every table as JSON (records) or Parquet."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, table in report.items():
+        if fmt == "parquet":
+            table.to_parquet(os.path.join(out_dir, f"{name}.parquet"), index=False)
+        else:
+            table.to_json(os.path.join(out_dir, f"{name}.json"), orient="records", force_ascii=False, indent=1)
+    print(f"✅ Report tables written to {out_dir} ({fmt})")
+
+
+# ------------------------------
+# MinHash-LSH near-duplicate detection
+# ------------------------------
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _normalize(text):
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    """Distinct character k-gram shingles of a normalized text, packed into integers."""
+    data = np.frombuffer(_normalize(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    weights = np.uint64(256) ** np.arange(min(k, max(len(data), 1)), dtype=np.uint64)
+    if len(data) <= k:
+        return np.array([int((data * weights[:len(data)]).sum())], dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(data, k)
+    return np.unique((windows * weights).sum(axis=1))
+
+
+def _permutations(num_perm, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM):
+    """(n, num_perm) MinHash signatures using multiply-shift hash functions."""
+    a, b = _permutations(num_perm)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for i, text in enumerate(texts):
+            values = shingles(text)
+            hashed = (values[None, :] * a[:, None] + b[:, None]) >> np.uint64(32)
+            signatures[i] = hashed.min(axis=1)
+    return signatures
+
+
+def lsh_bands(num_perm, threshold):
+    """Pick (bands, rows) with bands * rows = num_perm and an S-curve centred near the threshold."""
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def find_near_duplicates(texts, threshold=NEAR_DUP_THRESHOLD, num_perm=NUM_PERM):
+    """Map every text to the index of the first text of its near-duplicate cluster."""
+    signatures = minhash_signatures(texts, num_perm)
+    bands, rows = lsh_bands(num_perm, threshold)
+    parent = np.arange(len(texts))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = {}
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(len(texts)):
+            # One representative row per cluster in the bucket, so each row is
+            # verified against every distinct cluster once, not every member
+            key = block[i].tobytes()
+            members = buckets.get(key, [])
+            for j in members:
+                root_a, root_b = find(j), find(i)
+                # Verify the candidate pair on the full signature before merging
+                if root_a != root_b and np.mean(signatures[j] == signatures[i]) >= threshold:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+            representatives = {}
+            for j in members + [i]:
+                representatives.setdefault(find(j), j)
+            buckets[key] = list(representatives.values())
+
+    return np.array([find(i) for i in range(len(texts))], dtype=np.int64)
+
+
+def build_near_duplicate_map(store, path=NEAR_DUPLICATES_PATH, threshold=NEAR_DUP_THRESHOLD):
+    """Compute and persist the canonical-review mapping for the whole store."""
+    print(f"⚙️ Finding near-duplicate reviews (Jaccard ≥ {threshold})...")
+    canonical = find_near_duplicates(store.columns["reviews"].take(range(len(store))), threshold)
+    save_array(path, canonical)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"threshold": threshold, "num_perm": NUM_PERM, "store": store.store_digest()}, f)
+    redundant = int((canonical != np.arange(len(canonical))).sum())
+    print(f"✅ {redundant} near-duplicate review(s) mapped to a canonical review in {path}")
+    return canonical
+
+
+def extend_near_duplicate_map(store, start, path=NEAR_DUPLICATES_PATH):
+    """Map rows appended to the store from ``start`` on to themselves, keeping the map in sync.
+
+    Appended reviews are not compared against the existing ones (that needs a
+    full ``build_near_duplicate_map``); returns False if the map did not cover
+    exactly the first ``start`` rows.
+    """
+    if not os.path.exists(path + ".json"):
+        return False
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["store"] != store.store_digest(start):
+        return False
+    append_array(path, np.arange(start, len(store), dtype=np.int64), start)
+    meta["store"] = store.store_digest()
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return True
+
+
+def load_canonical_map(store, path=NEAR_DUPLICATES_PATH):
+    """Canonical row id per review, or None if the map is missing or out of date."""
+    if not os.path.exists(path + ".json"):
+        return None
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        if json.load(f)["store"] != store.store_digest():
+            return None
+    return load_array(path)
+
+
+if __name__ == "__main__":
+    store = open_review_store()
+    report = corpus_report(store)
+    print_report(report)
+    write_report(report)
+    build_near_duplicate_map(store)
@@ -0,0 +1,159 @@
+"""Precomputed per-course review embedding matrices for QA retrieval.
+
+The offline build writes one normalized ``(num_reviews, dim)`` matrix per
+course to ``data/processed/course_embeddings/``, stored in float32, float16 or
+int8 (``utils.compact_embeddings.EMBEDDING_DTYPE``). Vectors come from the
+shared embedding cache, so nothing is encoded twice. At question time the
+matrix is memory-mapped on first use and scored block by block on its stored
+dtype, so retrieval cost no longer includes encoding the course's reviews.
+
+Build everything with ``python -m utils.course_embeddings`` from the
+repository root.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+from utils.review_store import open_review_store
+from utils.embedding_cache import EmbeddingCache
+from utils.corpus_stats import load_canonical_map
+from utils.tracing import span
+from utils.model_registry import SBERT_MODEL
+from utils.inference_backend import variant_name
+from utils.compact_embeddings import EMBEDDING_DTYPE, save_embeddings, load_embeddings
+
+COURSE_EMB_DIR = "data/processed/course_embeddings"
+MODEL_NAME = variant_name(SBERT_MODEL)
+
+
+def course_key(institution, course):
+    """File-system safe key for an (institution, course) pair."""
+    return hashlib.blake2b(f"{institution}\x00{course}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, "manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def build_course_embeddings(store, model, cache=None, out_dir=COURSE_EMB_DIR, courses=None, model_name=MODEL_NAME,
+                            dtype=EMBEDDING_DTYPE):
+    """Write one normalized embedding matrix per course in ``dtype``, skipping unchanged courses.
+
+    Near-duplicate reviews (see ``utils.corpus_stats``) reuse the vector of
+    their canonical review, so each cluster is encoded once.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if cache is None:
+        cache = EmbeddingCache(model_name)
+    canonical = load_canonical_map(store)
+    manifest = _load_manifest(out_dir)
+    courses = courses if courses is not None else [(inst, name) for inst, name, _ in store.groups()]
+
+    built = 0
+    for institution, course in courses:
+        key = course_key(institution, course)
+        row_ids = store.row_ids(institution, course)
+        digest = store.course_digest(institution, course)
+        entry = manifest.get(key)
+        if (entry and entry["digest"] == digest and entry["model_name"] == model_name
+                and entry.get("dtype", "float32") == dtype):
+            continue
+
+        source_ids = row_ids if canonical is None else canonical[row_ids]
+        reviews = store.columns["reviews"].take(source_ids)
+        matrix = cache.encode(reviews, model) if reviews else np.zeros((0, cache.dim or 0), dtype=np.float32)
+        save_embeddings(os.path.join(out_dir, f"{key}.npy"), matrix, dtype)
+        np.save(os.path.join(out_dir, f"{key}.rows.npy"), row_ids.astype(np.int64))
+        manifest[key] = {
+            "institution": institution,
+            "course": course,
+            "model_name": model_name,
+            "dtype": dtype,
+            "digest": digest,
+            "rows": int(len(row_ids)),
+        }
+        built += 1
+
+    _save_manifest(out_dir, manifest)
+    print(f"✅ Course embeddings up to date ({built} course(s) rebuilt, {len(manifest)} total).")
+    return manifest
+
+
+class CourseRetriever:
+    """Lazily memory-maps per-course matrices (``CompactEmbeddings``) and scores questions against them."""
+
+    def __init__(self, store, out_dir=COURSE_EMB_DIR, model=None, cache=None, model_name=MODEL_NAME):
+        self.store = store
+        self.out_dir = out_dir
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name
+        self._matrices = {}
+
+    def matrix(self, institution, course):
+        """Return (row_ids, embedding matrix) for a course, building it on demand if a model was given."""
+        key = course_key(institution, course)
+        if key not in self._matrices:
+            path = os.path.join(self.out_dir, f"{key}.npy")
+            if not os.path.exists(path):
+                if self.model is None:
+                    raise FileNotFoundError(
+                        f"No embeddings for '{course}' ({institution}); run python -m utils.course_embeddings"
+                    )
+                with span("course_encode", reviews=len(self.store.row_ids(institution, course))):
+                    build_course_embeddings(self.store, self.model, self.cache, self.out_dir,
+                                            courses=[(institution, course)], model_name=self.model_name)
+            matrix = load_embeddings(path)
+            row_ids = np.load(os.path.join(self.out_dir, f"{key}.rows.npy"))
+            self._matrices[key] = (row_ids, matrix)
+        return self._matrices[key]
+
+    def forget(self, courses=None):
+        """Drop loaded matrices of (institution, course) pairs (all if None), so they are re-read on next use."""
+        if courses is None:
+            self._matrices.clear()
+        for institution, course in courses or []:
+            self._matrices.pop(course_key(institution, course), None)
+
+    def search(self, institution, course, query_embedding, top_k=None, threshold=None):
+        """Return [(row_id, score)] sorted by score, limited by top_k and/or a similarity threshold."""
+        row_ids, matrix = self.matrix(institution, course)
+        if len(row_ids) == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = matrix.dot(query)
+
+        if threshold is not None:
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(len(scores))
+        if top_k is not None and len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row_ids[i]), float(scores[i])) for i in candidates]
+
+    def retrieve(self, institution, course, query_embedding, top_k=None, threshold=None):
+        """Like ``search`` but returns [(review, score)]."""
+        hits = self.search(institution, course, query_embedding, top_k=top_k, threshold=threshold)
+        return [(self.store.review(row_id), score) for row_id, score in hits]
+
+
+if __name__ == "__main__":
+    from utils import model_registry
+
+    store = open_review_store()
+    model = model_registry.get("sbert")
+    build_course_embeddings(store, model)
@@ -1,80 +1,54 @@
-import os
-import pickle
 import pandas as pd
-import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
-import torch
-
-# Device setup
-device = "cuda" if torch.cuda.is_available() else "cpu"
+from utils import model_registry
+from utils.inference_backend import variant_name
+from utils.review_store import open_review_store
+from utils.embedding_cache import EmbeddingCache
+from utils.corpus_stats import corpus_report, print_report, write_report, build_near_duplicate_map, load_canonical_map
+from utils.ann_index import load_or_build_index, search as index_search, recall_report
+from utils.bm25_index import open_bm25_index, reciprocal_rank_fusion
 
 # 🔢 Global variable
-NUM_SENTENCES = 1000
-EMBEDDING_FILE = "embeddings.npy"
-
-# 1. Load DataFrame
-with open("data.pkl", "rb") as f:
-    df = pickle.load(f)
+NUM_SENTENCES = 1000  # None embeds and indexes the whole deduplicated corpus
+MODEL_NAME = variant_name(model_registry.SBERT_MODEL)
+INDEX_KIND = "flat"  # one of "flat", "ivf", "hnsw", "ivfpq"
+NPROBE = 16  # IVF lists probed per query
+EF_SEARCH = 64  # HNSW candidate list size per query
+SEARCH_MODE = "dense"  # "dense" (FAISS), "bm25" (keywords) or "fusion" (both, reciprocal rank fusion)
+RUN_INDEX_REPORT = False
+REPORT_FORMAT = "json"  # or "parquet"
+RUN_NEAR_DUPLICATES = True
+NEAR_DUP_THRESHOLD = 0.8  # estimated Jaccard similarity of character 5-grams
+
+# Sentence-BERT loads in the background while the report is computed
+model_registry.warm("sbert")
+
+# 1. Open the review store (deduplicated and indexed at build time)
+store = open_review_store()
 
 print("\n🧾 One sample row from the dataset:")
-print(df.iloc[0])
-print(df.iloc[1000])
-print(df.iloc[2000])
-
-# 2. Stats before filtering
-total_rows = len(df)
-duplicate_count = df.duplicated(subset=["reviews"]).sum()
-
-print(f"\n🧾 Total rows in dataset: {total_rows}")
-print(f"🔁 Number of duplicate reviews: {duplicate_count}")
-
-# Institutions List
-unique_institutions = df["institution"].nunique()
-print(f"\n🏫 Number of unique institutions: {unique_institutions}")
-
-# Optional: List the institution names
-print("\n📍 Institutions:")
-for inst in sorted(df["institution"].dropna().unique()):
-    print(f"- {inst}")
-
-# 📚 Total number of unique courses offered by each institution
-print("\n📚 Total number of unique courses offered by each institution:")
-course_counts = df.groupby("institution")["name"].nunique().sort_values(ascending=False)
-for inst, count in course_counts.items():
-    print(f"- {inst}: {count} course(s)")
-
-# 🧮 Total number of reviews per course from each institution (formatted nicely)
-print("\n📊 Detailed Summary: Reviews per Course by Institution\n")
-reviews_per_course = df.groupby(["institution", "name"]).size().reset_index(name="review_count")
-course_counts = reviews_per_course.groupby("institution")["name"].nunique()
-
-for institution in sorted(reviews_per_course["institution"].unique()):
-    total_courses = course_counts[institution]
-    print(f"\n🏫 Institution: {institution} — {total_courses} course(s)")
-    print("-" * (len(institution) + 20))
-    inst_df = reviews_per_course[reviews_per_course["institution"] == institution]
-    for _, row in inst_df.iterrows():
-        print(f"   📘 {row['name']}: {row['review_count']} review(s)")
-
-# 3. Show example of two duplicate reviews
-duplicates_df = df[df.duplicated(subset=["reviews"], keep=False)]
-if len(duplicates_df) >= 2:
-    grouped = duplicates_df.groupby("reviews")
-    for review_text, group in grouped:
-        if len(group) >= 2:
-            print("\n📋 Two duplicate reviews found:\n")
-            print(f"🔸 Review 1:\n{group.iloc[0]['reviews']}")
-            print(f"\n🔸 Review 2:\n{group.iloc[1]['reviews']}")
-            break
-    else:
-        print("❌ No exact duplicate text found.")
+print(store.row(0))
+print(store.row(1000))
+print(store.row(2000))
+
+# 2. Report tables (one grouped pass over the store), printed and saved as JSON
+report = corpus_report(store)
+print_report(report)
+write_report(report, fmt=REPORT_FORMAT)
+
+# 3. Show an example of a duplicated review (its copies have the same text, so it is printed once)
+if store.meta["duplicate_example"]:
+    print("\n📋 Duplicate review found (stored once):\n")
+    print(f"🔸 {store.meta['duplicate_example']}")
 else:
     print("❌ Not enough duplicate entries to show examples.")
 
-# 4. Filter to unique reviews only
-df_unique = df.drop_duplicates(subset=["reviews"]).reset_index(drop=True)
-print(f"\n✨ Unique reviews retained: {len(df_unique)}")
+# 4. Unique reviews were already filtered when the store was built
+print(f"\n✨ Unique reviews retained: {len(store)}")
+
+# Near-identical reviews (MinHash-LSH), mapped to one canonical review per cluster;
+# skipped while the saved map still matches the store
+if RUN_NEAR_DUPLICATES and load_canonical_map(store) is None:
+    build_near_duplicate_map(store, threshold=NEAR_DUP_THRESHOLD)
 
 # 5. Combine columns into a single string per row
 def combine_fields(row):
@@ -89,47 +63,48 @@ def combine_fields(row):
     return " | ".join([str(p) for p in parts if pd.notnull(p)])
 
 # 6. Apply to first NUM_SENTENCES of unique reviews
-df_filtered = df_unique.iloc[:NUM_SENTENCES]
-combined_texts = df_filtered.apply(combine_fields, axis=1).tolist()
+num_rows = len(store) if NUM_SENTENCES is None else min(NUM_SENTENCES, len(store))
+combined_texts = [combine_fields(store.row(i)) for i in range(num_rows)]
 
 print("\n📌 Example combined sentence from data:")
 print(combined_texts[0])
 
 # 7. Load model
-model = SentenceTransformer("all-MiniLM-L6-v2", device=device)
+model = model_registry.get("sbert")
 
-# 8. Load or compute embeddings
-if os.path.exists(EMBEDDING_FILE):
-    print(f"\n📂 Found existing embeddings file: {EMBEDDING_FILE}, so loading from disk.")
-    with open(EMBEDDING_FILE, "rb") as f:
-        embeddings = np.load(f)
-else:
-    print(f"\n⚙️ Embeddings file not found. Encoding the first {NUM_SENTENCES} unique combined texts...")
-    embeddings = model.encode(
-        combined_texts,
-        convert_to_tensor=False,
-        show_progress_bar=True,
-        normalize_embeddings=True
-    )
-    with open(EMBEDDING_FILE, "wb") as f:
-        np.save(f, embeddings)
-    print("✅ Embeddings saved to disk.")
-
-# 9. Create FAISS index
-dim = embeddings[0].shape[0]
-index = faiss.IndexFlatIP(dim)
-index.add(np.array(embeddings))
+# 8. Load or compute embeddings (only texts never seen by this model are encoded)
+embedding_cache = EmbeddingCache(MODEL_NAME)
+print(f"\n📂 Embedding cache holds {len(embedding_cache)} vector(s) for {MODEL_NAME}.")
+embeddings = embedding_cache.encode(combined_texts, model, show_progress_bar=True)
+print("✅ Embeddings ready.")
+
+# 9. Load or build the FAISS index
+index = load_or_build_index(embeddings, INDEX_KIND)
+
+if RUN_INDEX_REPORT:
+    print("\n📈 Recall@10 vs latency against the exact flat index:")
+    print(recall_report(embeddings, embeddings[:200], top_k=10).to_string(index=False))
+
+# 10. BM25 keyword index (exact matches such as "quizzes" or "Andrew Ng")
+bm25 = open_bm25_index(store)
 
 # 🔍 Search function
-def search(query, top_k=5):
-    query_embedding = model.encode(query, convert_to_tensor=False, normalize_embeddings=True)
-    query_embedding = np.expand_dims(query_embedding, axis=0)
-    scores, indices = index.search(query_embedding, top_k)
-
-    print(f"\n🔍 Query: {query}\n")
-    for i, idx in enumerate(indices[0]):
-        row = df_filtered.iloc[idx]
-        print(f"Rank {i+1} (Score: {scores[0][i]:.4f})")
+def search(query, top_k=5, nprobe=NPROBE, ef_search=EF_SEARCH, mode=SEARCH_MODE):
+    hits = []
+    if mode in ("dense", "fusion"):
+        query_embedding = model.encode(query, convert_to_tensor=False, normalize_embeddings=True)
+        scores, indices = index_search(index, query_embedding, top_k * 4, nprobe=nprobe, ef_search=ef_search)
+        hits = [(int(idx), float(score)) for idx, score in zip(indices[0], scores[0]) if idx >= 0]
+    if mode in ("bm25", "fusion"):
+        # Only the rows that are in the dense index, so both rankings cover the same reviews
+        lexical = bm25.search_range(query, 0, num_rows, top_k=top_k * 4)
+        hits = lexical if mode == "bm25" else reciprocal_rank_fusion([[i for i, _ in hits], [i for i, _ in lexical]])
+    hits = hits[:top_k]
+
+    print(f"\n🔍 Query: {query} ({mode})\n")
+    for i, (idx, score) in enumerate(hits):
+        row = store.row(idx)
+        print(f"Rank {i+1} (Score: {score:.4f})")
         print(f"Review: {row['reviews']}")
         print(f"Course: {row['name']} | Institution: {row['institution']}")
         print(f"Rating: {row['rating']} | By: {row['reviewers']} on {row['date_reviews']}\n")
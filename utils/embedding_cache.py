@@ -0,0 +1,219 @@
+"""Persistent, content-addressed embedding cache.
+
+Vectors are keyed by (model name, text hash): every model gets its own
+directory under ``data/processed/embedding_cache/`` holding a sorted
+``keys.npy`` (64-bit text hashes), the matching ``shards.npy``/``rows.npy``
+locations and the vectors themselves in ``shard_XXXXX.npy`` files. All files
+are memory-mapped, so a lookup only touches the rows it returns.
+
+New vectors are appended in place to the last shard. Their keys are appended
+to a ``tail_*.npy`` index in insertion order, which is sorted in memory on
+load. Once the tail outgrows ``TAIL_RATIO`` of the sorted index, the two are
+merged (only the tail is sorted), so every key is rewritten a bounded number
+of times however the cache grows. ``meta.json`` records the committed row
+counts and is written last.
+
+``encode`` only runs the model on texts it has never seen, so encoding the
+full corpus is a one-time cost and restarts are free. The cache assumes a
+single writer process at a time.
+"""
+
+import os
+import json
+import numpy as np
+from utils.review_store import text_hash, load_array, save_array, append_array
+from utils.tracing import span
+
+CACHE_DIR = "data/processed/embedding_cache"
+SHARD_SIZE = 65536
+TAIL_RATIO = 0.25  # tail keys (relative to the sorted index) before they are merged into it
+INDEX_FILES = ("keys", "shards", "rows")
+
+
+def _merge(index, new_index):
+    """Merge (keys, shards, rows) arrays into a key-sorted index; only the new entries are sorted."""
+    order = np.argsort(new_index[0], kind="stable")
+    at = np.searchsorted(index[0], new_index[0][order], side="right")
+    return tuple(np.insert(np.asarray(a), at, b[order]) for a, b in zip(index, new_index))
+
+
+class EmbeddingCache:
+    """Sharded, memory-mapped store of sentence embeddings for one model."""
+
+    def __init__(self, model_name, root=CACHE_DIR, normalize=True):
+        self.model_name = model_name
+        self.normalize = normalize
+        suffix = "-normalized" if normalize else ""
+        self.dir = os.path.join(root, model_name.replace("/", "__") + suffix)
+        os.makedirs(self.dir, exist_ok=True)
+        self._shards = {}
+        self._load_index()
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _load_index(self):
+        meta_path = self._path("meta.json")
+        empty = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            # Rows past the committed counts belong to an interrupted add
+            rows = self.meta.get("sorted_keys")
+            if rows == 0:
+                self.keys, self.shard_of, self.row_of = empty
+            else:
+                self.keys, self.shard_of, self.row_of = (load_array(self._path(f"{name}.npy"))[:rows]
+                                                         for name in INDEX_FILES)
+            tail = self.meta.get("tail_keys", 0)
+            if tail:
+                tail_index = tuple(np.asarray(load_array(self._path(f"tail_{name}.npy"))[:tail]) for name in INDEX_FILES)
+                self.tail = _merge(empty, tail_index)
+            else:
+                self.tail = empty
+        else:
+            self.meta = {"model_name": self.model_name, "normalize": self.normalize, "dim": None, "num_shards": 0}
+            self.keys, self.shard_of, self.row_of = empty
+            self.tail = empty
+        self._shards.clear()
+
+    def __len__(self):
+        return len(self.keys) + len(self.tail[0])
+
+    @property
+    def dim(self):
+        return self.meta["dim"]
+
+    def _shard(self, shard_id):
+        if shard_id not in self._shards:
+            self._shards[shard_id] = load_array(self._path(f"shard_{shard_id:05d}.npy"))
+        return self._shards[shard_id]
+
+    # ------------------------------
+    # Lookups
+    # ------------------------------
+    def locate(self, hashes):
+        """Return (found mask, positions into the key index) for the given hashes.
+
+        Positions from ``len(self.keys)`` on point into the tail index.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = np.zeros(len(hashes), dtype=bool)
+        positions = np.zeros(len(hashes), dtype=np.int64)
+        for offset, keys in ((0, self.keys), (len(self.keys), self.tail[0])):
+            if len(keys) == 0:
+                continue
+            clipped = np.minimum(np.searchsorted(keys, hashes), len(keys) - 1)
+            hit = ~found & (keys[clipped] == hashes)
+            found |= hit
+            positions[hit] = offset + clipped[hit]
+        return found, positions
+
+    def contains(self, text):
+        return bool(self.locate([text_hash(text)])[0][0])
+
+    def get_by_hash(self, hashes):
+        """Gather the vectors for hashes that are all known to the cache."""
+        found, positions = self.locate(hashes)
+        if not found.all():
+            raise KeyError(f"{int((~found).sum())} text(s) are not in the embedding cache")
+        out = np.empty((len(positions), self.dim), dtype=np.float32)
+        in_tail = positions >= len(self.keys)
+        shards = np.empty(len(positions), dtype=np.int32)
+        rows = np.empty(len(positions), dtype=np.int32)
+        shards[~in_tail] = self.shard_of[positions[~in_tail]]
+        rows[~in_tail] = self.row_of[positions[~in_tail]]
+        shards[in_tail] = self.tail[1][positions[in_tail] - len(self.keys)]
+        rows[in_tail] = self.tail[2][positions[in_tail] - len(self.keys)]
+        for shard_id in np.unique(shards):
+            mask = shards == shard_id
+            out[mask] = self._shard(int(shard_id))[rows[mask]]
+        return out
+
+    def get(self, texts):
+        return self.get_by_hash([text_hash(t) for t in texts])
+
+    # ------------------------------
+    # Encoding
+    # ------------------------------
+    def encode(self, texts, model, batch_size=64, show_progress_bar=False):
+        """Embed texts, running the model only on texts not already cached."""
+        hashes = np.array([text_hash(t) for t in texts], dtype=np.uint64)
+        found, _ = self.locate(hashes)
+        missing = {}
+        for text, h, hit in zip(texts, hashes, found):
+            if not hit and h not in missing:
+                missing[h] = text
+
+        if missing:
+            print(f"⚙️ Encoding {len(missing)} new text(s) with {self.model_name} ({int(found.sum())} cached)...")
+            with span("embedding_encode", batch_size=len(missing), cached=int(found.sum())):
+                vectors = model.encode(
+                    list(missing.values()),
+                    batch_size=batch_size,
+                    convert_to_tensor=False,
+                    show_progress_bar=show_progress_bar,
+                    normalize_embeddings=self.normalize,
+                )
+            self.add(np.fromiter(missing.keys(), dtype=np.uint64, count=len(missing)), vectors)
+
+        if len(texts) == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self.get_by_hash(hashes)
+
+    def add(self, hashes, vectors):
+        """Append new (hash, vector) pairs, topping up the last shard first."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if self.meta["dim"] is None:
+            self.meta["dim"] = int(vectors.shape[1])
+
+        new_shards = np.empty(len(hashes), dtype=np.int32)
+        new_rows = np.empty(len(hashes), dtype=np.int32)
+        num_shards = self.meta["num_shards"]
+        written = 0
+
+        # The last shard grows in place until it is full
+        if num_shards:
+            last_id = num_shards - 1
+            filled = len(self._shard(last_id))
+            room = SHARD_SIZE - filled
+            if room > 0:
+                take = min(room, len(vectors))
+                self._shards.pop(last_id, None)
+                append_array(self._path(f"shard_{last_id:05d}.npy"), vectors[:take], filled)
+                new_shards[:take] = last_id
+                new_rows[:take] = np.arange(filled, filled + take)
+                written = take
+
+        while written < len(vectors):
+            take = min(SHARD_SIZE, len(vectors) - written)
+            save_array(self._path(f"shard_{num_shards:05d}.npy"), vectors[written:written + take])
+            new_shards[written:written + take] = num_shards
+            new_rows[written:written + take] = np.arange(take)
+            num_shards += 1
+            written += take
+        self.meta["num_shards"] = num_shards
+
+        new_index = (hashes, new_shards, new_rows)
+        tail = len(self.tail[0])
+        if tail + len(hashes) > max(SHARD_SIZE, TAIL_RATIO * len(self.keys)):
+            merged = _merge((self.keys, self.shard_of, self.row_of),
+                            tuple(np.concatenate(pair) for pair in zip(self.tail, new_index)))
+            for name, array in zip(INDEX_FILES, merged):
+                save_array(self._path(f"{name}.npy"), array)
+            self.keys, self.shard_of, self.row_of = merged
+            self.tail = tuple(a[:0] for a in self.tail)
+        else:
+            for name, array in zip(INDEX_FILES, new_index):
+                path = self._path(f"tail_{name}.npy")
+                if tail and os.path.exists(path):
+                    append_array(path, array, tail)
+                else:
+                    save_array(path, array)
+            self.tail = _merge(self.tail, new_index)
+        self.meta["sorted_keys"] = len(self.keys)
+        self.meta["tail_keys"] = len(self.tail[0])
+        with open(self._path("meta.json") + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(self._path("meta.json") + ".tmp", self._path("meta.json"))
@@ -0,0 +1,176 @@
+"""Token-aware, batched map-reduce generation for T5 summarization and NLG.
+
+Texts are tokenized once and packed into chunks by real token count, so a
+chunk plus its prompt always fits the model's 512-token input and nothing is
+silently truncated. All chunks of a course are generated in padded batches,
+and partial outputs are reduced recursively by feeding their token ids straight
+back in, without decoding and re-tokenizing in between.
+
+With a ``SummaryCache`` attached, every chunk output is memoized by content
+and final per-course results are cached, so only changed chunks are
+regenerated.
+"""
+
+from utils.summary_cache import cache_key
+from utils.tracing import span
+
+
+class ChunkedGenerator:
+    """Map-reduce generation over long inputs with a seq2seq model such as T5."""
+
+    def __init__(self, model, tokenizer, batch_size=8, num_beams=4, max_length=100, min_length=30,
+                 length_penalty=2.0, max_input_tokens=512, reduce_tokens=400, cache=None, model_name=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.cache = cache
+        self.model_name = model_name or getattr(model.config, "_name_or_path", type(model).__name__)
+        self.batch_size = batch_size
+        self.max_input_tokens = max_input_tokens
+        self.reduce_tokens = reduce_tokens
+        self.generate_kwargs = {
+            "num_beams": num_beams,
+            "max_length": max_length,
+            "min_length": min_length,
+            "length_penalty": length_penalty,
+            "early_stopping": True,
+        }
+        self.special_ids = set(tokenizer.all_special_ids)
+
+    # ------------------------------
+    # Tokenization and chunking
+    # ------------------------------
+    def encode_texts(self, texts):
+        """Token ids of each text, without special tokens."""
+        return self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+
+    def budget(self, prefix_ids):
+        """Tokens left for content once the prompt and EOS token are added."""
+        return self.max_input_tokens - len(prefix_ids) - 1
+
+    def pack(self, pieces, budget):
+        """Greedily pack token-id pieces into chunks of at most ``budget`` tokens.
+
+        Piece boundaries are kept whenever possible (a review is only split if it
+        is longer than a whole chunk), so appending reviews only changes the last
+        chunk.
+        """
+        chunks, current = [], []
+        for piece in pieces:
+            for start in range(0, max(len(piece), 1), budget):
+                part = piece[start:start + budget]
+                if not part:
+                    continue
+                if current and len(current) + len(part) > budget:
+                    chunks.append(current)
+                    current = []
+                current = current + part
+        if current:
+            chunks.append(current)
+        return chunks
+
+    # ------------------------------
+    # Batched generation
+    # ------------------------------
+    def _strip(self, ids):
+        return [t for t in ids if t not in self.special_ids]
+
+    def params_key(self, **overrides):
+        """Key identifying the model and every setting that affects outputs."""
+        return cache_key(self.model_name, {**self.generate_kwargs, **overrides},
+                         self.max_input_tokens, self.reduce_tokens)
+
+    def generate_ids(self, prefix_ids, chunks, **overrides):
+        """Generate one output (as token ids) per chunk, reusing memoized chunk outputs."""
+        if self.cache is None:
+            with span("generate_chunks", chunks=len(chunks), tokens=sum(len(c) for c in chunks)):
+                return self._generate_batched(prefix_ids, chunks, overrides)
+
+        params = self.params_key(**overrides)
+        keys = [cache_key(params, prefix_ids, chunk) for chunk in chunks]
+        known = self.cache.get_chunks(keys)
+        missing = {}
+        for key, chunk in zip(keys, chunks):
+            if key not in known:
+                missing[key] = chunk
+        if missing:
+            with span("generate_chunks", chunks=len(missing), cached_chunks=len(known),
+                      tokens=sum(len(c) for c in missing.values())):
+                outputs = self._generate_batched(prefix_ids, list(missing.values()), overrides)
+            fresh = dict(zip(missing.keys(), outputs))
+            self.cache.put_chunks(fresh)
+            known.update(fresh)
+        return [known[key] for key in keys]
+
+    def _generate_batched(self, prefix_ids, chunks, overrides):
+        """Generate one output per chunk, in padded length-sorted batches."""
+        import torch
+
+        kwargs = {**self.generate_kwargs, **overrides}
+        eos = [self.tokenizer.eos_token_id] if self.tokenizer.eos_token_id is not None else []
+        pad_id = self.tokenizer.pad_token_id
+        device = next(self.model.parameters()).device
+        inputs = [prefix_ids + chunk + eos for chunk in chunks]
+        order = sorted(range(len(inputs)), key=lambda i: len(inputs[i]))
+        outputs = [None] * len(inputs)
+
+        with torch.no_grad():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                width = max(len(inputs[i]) for i in batch)
+                input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+                attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+                for row, i in enumerate(batch):
+                    input_ids[row, :len(inputs[i])] = torch.tensor(inputs[i])
+                    attention_mask[row, :len(inputs[i])] = 1
+                generated = self.model.generate(
+                    input_ids=input_ids.to(device), attention_mask=attention_mask.to(device), **kwargs
+                )
+                for row, i in enumerate(batch):
+                    outputs[i] = self._strip(generated[row].tolist())
+        return outputs
+
+    def reduce(self, prefix_ids, pieces, **overrides):
+        """Map every chunk to an output, then recursively reduce the outputs if still too long."""
+        budget = self.budget(prefix_ids)
+        chunks = self.pack(pieces, budget)
+        if not chunks:
+            return []
+        outputs = self.generate_ids(prefix_ids, chunks, **overrides)
+        combined = [t for output in outputs for t in output]
+        if len(chunks) > 1 and len(combined) > self.reduce_tokens:
+            if len(self.pack(outputs, budget)) >= len(chunks):
+                # Outputs of half a chunk or more would never pack tighter: cut them so at least two fit per chunk
+                outputs = [output[:budget // 2] for output in outputs]
+            return self.reduce(prefix_ids, outputs, **overrides)
+        return combined
+
+    def run(self, prefix, texts, course=None, **overrides):
+        """Map-reduce generation of ``prefix + chunk`` over a list of texts.
+
+        When a cache is attached and ``course`` is given, the final result is
+        cached per (course, model, params, prompt) and reused while the
+        course's chunks are unchanged.
+        """
+        prefix_ids = self.tokenizer(prefix, add_special_tokens=False)["input_ids"]
+        pieces = self.encode_texts(texts)
+
+        if self.cache is not None and course is not None:
+            params = cache_key(self.params_key(**overrides), prefix_ids)
+            digest = cache_key(pieces)
+            with span("summary_cache") as s:
+                summary = self.cache.get_summary(course, params, digest)
+                s.set(cache_hit=summary is not None)
+            if summary is not None:
+                return summary
+
+        output_ids = self.reduce(prefix_ids, pieces, **overrides)
+        result = self.tokenizer.decode(output_ids, skip_special_tokens=True)
+        if self.cache is not None and course is not None:
+            self.cache.put_summary(course, params, digest, result)
+        return result
+
+    def summarize(self, texts, prefix="summarize: ", course=None, **overrides):
+        return self.run(prefix, texts, course=course, **overrides)
+
+    def answer(self, question, texts, course=None, **overrides):
+        return self.run(f"question: {question} context: ", texts, course=course, **overrides)
@@ -0,0 +1,205 @@
+"""Selectable CPU inference backend for the Sentence-BERT, RoBERTa and T5 models.
+
+``BACKEND`` (environment variable ``QA_INFERENCE_BACKEND``) decides how
+``model_registry`` builds ``sbert``, ``roberta_sentiment`` and ``t5``:
+
+* ``fp32``: the original eager PyTorch models (default, GPU when available);
+* ``int8``: dynamic int8 quantization of every ``nn.Linear`` (int8 weights,
+  activations quantized on the fly), CPU only. The quantized module is saved
+  once to ``data/models/int8/<name>.pt`` and later processes load it directly
+  instead of the fp32 checkpoint; the sidecar ``.json`` ties it to the source
+  model and the torch version, so an upgrade rebuilds it.
+
+Caches keyed by model name (embeddings, course matrices, intent prototypes,
+summaries) use ``variant_name`` so fp32 and int8 outputs never mix.
+
+Check int8 against fp32 with ``python -m utils.inference_backend`` from the
+repository root: embedding cosine drift, sentiment label agreement, ROUGE
+delta and the CPU speedup of every model.
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+BACKENDS = ("fp32", "int8")
+BACKEND = os.environ.get("QA_INFERENCE_BACKEND", "fp32")
+ARTIFACT_DIR = "data/models"
+PARITY_PATH = "data/processed/parity_{backend}.json"
+PARITY_SAMPLE = 200  # reviews used for embedding/sentiment parity
+PARITY_COURSES = 5  # courses summarized for the ROUGE comparison
+PARITY_REVIEWS_PER_COURSE = 20
+
+
+def variant_name(model_name, backend=None):
+    """Model name used in cache keys: the plain name for fp32, ``<name>@<backend>`` otherwise."""
+    backend = backend or BACKEND
+    return model_name if backend == "fp32" else f"{model_name}@{backend}"
+
+
+def artifact_path(name, backend):
+    return os.path.join(ARTIFACT_DIR, backend, f"{name}.pt")
+
+
+def quantize(model):
+    """Dynamic int8 copy of ``model`` for CPU inference."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model.to("cpu").eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(name, source, build, device="cpu", backend=None):
+    """``build(device)`` for fp32; for int8 the cached quantized module, converted from ``build("cpu")`` once."""
+    import torch
+
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of: {', '.join(BACKENDS)})")
+    if backend == "fp32":
+        return build(device)
+
+    path = artifact_path(name, backend)
+    meta = {"name": name, "source": source, "backend": backend, "torch": torch.__version__}
+    if os.path.exists(path) and os.path.exists(path + ".json"):
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            if json.load(f) == meta:
+                return torch.load(path, weights_only=False).eval()
+
+    print(f"⚙️ Quantizing {source} to {backend} (cached in {path})...")
+    model = quantize(build("cpu"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(model, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return model
+
+
+# ------------------------------
+# Parity check
+# ------------------------------
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _summarize(tokenizer, model, texts):
+    """Same settings as ``summarize_with_t5`` in ``summarization_variousmodels.py``, one text at a time."""
+    import torch
+
+    summaries = []
+    with torch.no_grad():
+        for text in texts:
+            input_ids = tokenizer.encode("summarize: " + text, return_tensors="pt", max_length=512, truncation=True)
+            summary_ids = model.generate(input_ids.to(next(model.parameters()).device), max_length=100,
+                                         min_length=30, length_penalty=2.0, num_beams=4, early_stopping=True)
+            summaries.append(tokenizer.decode(summary_ids[0], skip_special_tokens=True))
+    return summaries
+
+
+def _rouge_l(references, summaries):
+    from rouge_score import rouge_scorer
+    scorer = rouge_scorer.RougeScorer(["rougeL"], use_stemmer=True)
+    return np.array([scorer.score(r, s)["rougeL"].fmeasure for r, s in zip(references, summaries)])
+
+
+def parity_report(texts, documents, backend="int8"):
+    """Compare ``backend`` with fp32 on the same reviews (``texts``) and course documents."""
+    from utils import model_registry
+    from utils.sentiment_engine import score_roberta
+
+    report = {"backend": backend, "reviews": len(texts), "documents": len(documents)}
+
+    outputs, seconds = {}, {}
+    for variant in ("fp32", backend):
+        model = model_registry.build("sbert", backend=variant, device="cpu")
+        outputs[variant], seconds[variant] = _timed(
+            lambda t: model.encode(t, batch_size=64, normalize_embeddings=True), texts)
+        del model
+    cosine = np.sum(outputs["fp32"] * outputs[backend], axis=1)
+    report["embedding"] = {
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "mean_drift": float(1.0 - cosine.mean()),
+        "speedup": seconds["fp32"] / seconds[backend],
+    }
+
+    for variant in ("fp32", backend):
+        tokenizer, model = model_registry.build("roberta_sentiment", backend=variant, device="cpu")
+        outputs[variant], seconds[variant] = _timed(score_roberta, texts, tokenizer, model)
+        del model
+    report["sentiment"] = {
+        "label_agreement": float(np.mean(outputs["fp32"].argmax(1) == outputs[backend].argmax(1))),
+        "max_probability_diff": float(np.abs(outputs["fp32"] - outputs[backend]).max()),
+        "speedup": seconds["fp32"] / seconds[backend],
+    }
+
+    # As in summarization_variousmodels.py, the first 3 sentences serve as the reference summary
+    references = [" ".join(document.split(". ")[:3]) for document in documents]
+    for variant in ("fp32", backend):
+        tokenizer, model = model_registry.build("t5", backend=variant, device="cpu")
+        outputs[variant], seconds[variant] = _timed(_summarize, tokenizer, model, documents)
+        del model
+    rouge = {variant: _rouge_l(references, outputs[variant]) for variant in ("fp32", backend)}
+    report["summarization"] = {
+        "rougeL_fp32": float(rouge["fp32"].mean()),
+        f"rougeL_{backend}": float(rouge[backend].mean()),
+        "rougeL_delta": float(rouge[backend].mean() - rouge["fp32"].mean()),
+        "rougeL_vs_fp32_output": float(_rouge_l(outputs["fp32"], outputs[backend]).mean()),
+        "speedup": seconds["fp32"] / seconds[backend],
+    }
+    return report
+
+
+def sample_inputs(store, sample=PARITY_SAMPLE, courses=PARITY_COURSES, per_course=PARITY_REVIEWS_PER_COURSE):
+    """A fixed random sample of reviews plus one document per course for the parity check."""
+    rng = np.random.default_rng(0)
+    row_ids = np.sort(rng.choice(len(store), size=min(sample, len(store)), replace=False))
+    texts = [str(text) for text in store.columns["reviews"].take(row_ids)]
+
+    documents = []
+    for institution in store.institutions():
+        for course in store.courses(institution):
+            reviews = store.reviews(institution, course)
+            if len(reviews) >= per_course:
+                documents.append(" ".join(reviews[:per_course]))
+            if len(documents) == courses:
+                return texts, documents
+    return texts, documents
+
+
+def print_parity(report):
+    embedding, sentiment, summarization = report["embedding"], report["sentiment"], report["summarization"]
+    print(f"\n📏 {report['backend']} vs fp32 ({report['reviews']} reviews, {report['documents']} course documents)")
+    print(f"   - Embeddings: mean cosine {embedding['mean_cosine']:.4f} (min {embedding['min_cosine']:.4f}), "
+          f"{embedding['speedup']:.2f}x")
+    print(f"   - Sentiment: label agreement {sentiment['label_agreement']:.2%}, "
+          f"max probability diff {sentiment['max_probability_diff']:.3f}, {sentiment['speedup']:.2f}x")
+    print(f"   - Summaries: ROUGE-L delta {summarization['rougeL_delta']:+.4f}, "
+          f"ROUGE-L vs fp32 output {summarization['rougeL_vs_fp32_output']:.3f}, {summarization['speedup']:.2f}x")
+
+
+def main():
+    from utils.review_store import open_review_store
+
+    parser = argparse.ArgumentParser(description="Check a quantized backend against fp32.")
+    parser.add_argument("--backend", default="int8", choices=[b for b in BACKENDS if b != "fp32"])
+    parser.add_argument("--sample", type=int, default=PARITY_SAMPLE, help="reviews for embedding/sentiment parity")
+    parser.add_argument("--courses", type=int, default=PARITY_COURSES, help="course documents to summarize")
+    args = parser.parse_args()
+
+    texts, documents = sample_inputs(open_review_store(), args.sample, args.courses)
+    report = parity_report(texts, documents, args.backend)
+    print_parity(report)
+
+    path = PARITY_PATH.format(backend=args.backend)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Parity report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Streaming ingestion of new review batches.
+
+``ingest_batch`` appends a JSONL or CSV batch (``data.pkl`` columns: reviews,
+reviewers, date_reviews, course_id, rating, name, institution) to the review
+store, dropping reviews whose text is already stored. It then brings every
+derived artifact that already exists up to date. Only the new reviews and the
+courses they belong to are touched:
+
+* review store: one new segment at the end of every column;
+* near-duplicate map: the new rows map to themselves;
+* course embeddings: the matrices of the affected courses (only new texts
+  reach the model, the rest are embedding-cache hits);
+* BM25: a new postings segment;
+* sentiment: the new rows are scored and the affected course aggregates refreshed;
+* recommender: statistics and centroids of the affected courses, then the
+  neighbour table;
+* course text files: new reviews appended, and the files reopened for
+  ``utils.question_generation``;
+* summaries: the final summaries of the course_ids that gained reviews
+  (the key ``summarization.py`` caches them under) are dropped from the
+  summary cache. Chunk entries stay reusable.
+
+Answer caches key their entries on the course digest, so they drop a course's
+entries by themselves once a process opens the updated store. Artifacts that
+were never built are left to their own full builds.
+
+Every batch appends one line to ``data/processed/ingest_log.jsonl`` with its
+counts, stage timings and freshness lag (time from the batch file's arrival to
+the end of its update). Run it from the repository root::
+
+    python -m utils.ingest new_reviews.jsonl more_reviews.csv
+    python -m utils.ingest --watch data/incoming
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import pandas as pd
+from utils import model_registry
+from utils import reviews_generator
+from utils import question_generation
+from utils.tracing import span
+from utils.review_store import STORE_DIR, ReviewStore, append_reviews
+from utils.corpus_stats import extend_near_duplicate_map
+from utils.course_embeddings import COURSE_EMB_DIR, build_course_embeddings
+from utils.bm25_index import BM25_DIR, append_bm25_segment
+from utils.sentiment_engine import SENTIMENT_DIR, SentimentStore, update_sentiment_store
+from utils.recommender import RECOMMENDER_DIR, update_recommender
+from utils.summary_cache import SUMMARY_CACHE_PATH, SummaryCache
+
+LOG_PATH = "data/processed/ingest_log.jsonl"
+REQUIRED_COLUMNS = ["reviews", "name", "institution"]
+OPTIONAL_COLUMNS = ["reviewers", "date_reviews", "course_id", "rating"]
+BATCH_SUFFIXES = (".jsonl", ".json", ".csv")
+POLL_SECONDS = 5  # how often --watch looks for new batch files
+
+
+def read_batch(path):
+    """Load a JSONL/CSV review batch as a DataFrame with the ``data.pkl`` columns."""
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+    elif path.endswith((".jsonl", ".json")):
+        df = pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+    else:
+        raise ValueError(f"Unsupported batch format '{path}', expected one of {BATCH_SUFFIXES}")
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Batch {path} is missing column(s) {missing}")
+    for column in OPTIONAL_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    return df[REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
+
+
+# ------------------------------
+# Downstream updates
+# ------------------------------
+def export_new_reviews(store, start, courses):
+    """Append the new reviews to the exported course files and reopen them for question generation."""
+    manifest = reviews_generator.load_manifest()
+    line_offsets = {}
+    for institution, course in courses:
+        course_file = reviews_generator.course_file_path(institution, course)
+        row_ids = store.row_ids(institution, course)
+        old, new = row_ids[row_ids < start], row_ids[row_ids >= start]
+        os.makedirs(os.path.dirname(course_file), exist_ok=True)
+        if os.path.exists(course_file) and manifest.get(course_file) == store.digest(old):
+            with open(course_file, "r", encoding="utf-8") as f:
+                line_offsets[course_file] = sum(1 for _ in f)
+            with open(course_file, "a", encoding="utf-8") as f:
+                for review in store.columns["reviews"].take(new):
+                    f.write(f"{review.strip()}\n")
+        else:
+            # Out of sync with the last export: rewrite it; already-seen lines are skipped by their hash
+            reviews_generator.export_course(store, institution, course, course_file)
+            line_offsets[course_file] = 0
+        manifest[course_file] = store.course_digest(institution, course)
+    reviews_generator.save_manifest(manifest)
+    return question_generation.requeue(line_offsets)
+
+
+def invalidate_summaries(store, start, cache):
+    """Drop the cached final summaries of every course_id with rows from ``start`` on; returns their number."""
+    course_ids = set(store.columns["course_id"].take(range(start, len(store)))) - {""}
+    for course_id in course_ids:
+        cache.invalidate(course_id)
+    return len(course_ids)
+
+
+def ingest_batch(path, store_dir=STORE_DIR, use_vader=True, log_path=LOG_PATH):
+    """Append one batch file to the store and propagate the new reviews; returns the log entry."""
+    arrived = os.path.getmtime(path)
+    timings = {}
+
+    def stage(name, **attrs):
+        return span(f"ingest_{name}", **attrs)
+
+    with stage("store") as s:
+        df = read_batch(path)
+        start, end, courses = append_reviews(df, store_dir)
+        s.set(batch_size=len(df), reviews=end - start)
+    timings["store"] = s.duration
+    store = ReviewStore(store_dir)
+    print(f"📥 {os.path.basename(path)}: {len(df)} review(s), {end - start} new across {len(courses)} course(s).")
+
+    if end > start:
+        with stage("near_duplicates") as s:
+            extend_near_duplicate_map(store, start)
+        timings["near_duplicates"] = s.duration
+
+        has_embeddings = os.path.exists(os.path.join(COURSE_EMB_DIR, "manifest.json"))
+        if has_embeddings:
+            with stage("embeddings", reviews=end - start) as s:
+                build_course_embeddings(store, model_registry.get("sbert"), courses=courses)
+            timings["embeddings"] = s.duration
+
+        if os.path.exists(os.path.join(BM25_DIR, "meta.json")):
+            with stage("bm25", reviews=end - start) as s:
+                append_bm25_segment(store, start)
+            timings["bm25"] = s.duration
+
+        sentiment_store = None
+        if os.path.exists(os.path.join(SENTIMENT_DIR, "hash.npy")):
+            with stage("sentiment", reviews=end - start) as s:
+                tokenizer, model = model_registry.get("roberta_sentiment")
+                update_sentiment_store(store, start, courses, tokenizer, model, use_vader=use_vader)
+            timings["sentiment"] = s.duration
+            sentiment_store = SentimentStore()
+
+        if has_embeddings and os.path.exists(os.path.join(RECOMMENDER_DIR, "meta.json")):
+            with stage("recommender") as s:
+                update_recommender(store, start, courses, sentiment_store=sentiment_store)
+            timings["recommender"] = s.duration
+
+        with stage("export") as s:
+            reopened = export_new_reviews(store, start, courses)
+        timings["export"] = s.duration
+        print(f"📝 {len(courses)} course file(s) updated, {reopened} reopened for question generation.")
+
+        if os.path.exists(SUMMARY_CACHE_PATH):
+            with stage("summaries") as s:
+                invalidate_summaries(store, start, SummaryCache())
+            timings["summaries"] = s.duration
+
+    entry = {
+        "batch": path,
+        "received": len(df),
+        "added": end - start,
+        "duplicates": len(df) - (end - start),
+        "courses": len(courses),
+        "rows": len(store),
+        "stages": {name: round(seconds, 4) for name, seconds in timings.items()},
+        "freshness_lag_s": round(time.time() - arrived, 3),
+        "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"✅ Ingested in {sum(timings.values()):.2f}s (freshness lag {entry['freshness_lag_s']:.1f}s).")
+    return entry
+
+
+def watch(directory, store_dir=STORE_DIR, use_vader=True, poll_seconds=POLL_SECONDS):
+    """Ingest batch files dropped into ``directory`` (oldest first), moving them to ``done/`` or ``failed/``."""
+    print(f"👀 Watching {directory} for review batches (Ctrl+C to stop)...")
+    for sub in ("done", "failed"):
+        os.makedirs(os.path.join(directory, sub), exist_ok=True)
+    while True:
+        batches = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(BATCH_SUFFIXES)]
+        for path in sorted(batches, key=os.path.getmtime):
+            try:
+                ingest_batch(path, store_dir, use_vader)
+                shutil.move(path, os.path.join(directory, "done", os.path.basename(path)))
+            except Exception as e:
+                print(f"❌ Failed to ingest {path}: {e}")
+                shutil.move(path, os.path.join(directory, "failed", os.path.basename(path)))
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append review batches to the store and update derived data.")
+    parser.add_argument("batches", nargs="*", help="JSONL or CSV batch files, ingested in order")
+    parser.add_argument("--watch", metavar="DIR", help="keep ingesting batch files dropped into this folder")
+    parser.add_argument("--no-vader", action="store_true", help="leave the VADER columns of new reviews at zero")
+    args = parser.parse_args()
+    if not args.batches and not args.watch:
+        parser.error("give batch files and/or --watch DIR")
+
+    for path in args.batches:
+        ingest_batch(path, use_vader=not args.no_vader)
+    if args.watch:
+        try:
+            watch(args.watch, use_vader=not args.no_vader)
+        except KeyboardInterrupt:
+            print("\n👋 Stopped watching.")
+
+
+if __name__ == "__main__":
+    main()
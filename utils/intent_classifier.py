@@ -0,0 +1,279 @@
+"""Embedding-prototype intent classifier with optional zero-shot fallback.
+
+Zero-shot BART-MNLI runs one NLI forward pass per candidate label, i.e. 11
+large forward passes per question. ``PrototypeIntentClassifier`` instead
+reuses the MiniLM question embedding the QA pipeline already computes and
+matches it against one prototype per intent: the normalized mean embedding of
+that intent's example questions. Prototypes are persisted to
+``data/processed/intent_prototypes.npy`` and rebuilt only when the examples or
+the model change. Questions whose best prototype similarity falls below
+``PROTOTYPE_THRESHOLD`` can be handed to the zero-shot classifier.
+
+``compare_classifiers`` extends the notebook's 11-question accuracy check and
+reports accuracy and latency of several classifiers side by side.
+"""
+
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from utils.summary_cache import cache_key
+from utils.review_store import load_array, save_array
+from utils import model_registry
+from utils.model_registry import SBERT_MODEL
+from utils.inference_backend import variant_name
+
+PROTOTYPES_PATH = "data/processed/intent_prototypes.npy"
+PROTOTYPE_THRESHOLD = 0.45  # below this similarity the zero-shot fallback (if any) decides
+
+LABEL_MAP = {
+    "Is the user asking a yes or no question?": "yes_no",
+    "Is the user asking about the instructor?": "instructor",
+    "Is the user asking about the course content or topics?": "content",
+    "Is the user asking about how difficult the course is?": "difficulty",
+    "Is the user asking about career outcomes or job relevance?": "career",
+    "Is the user asking for general opinions from students?": "general_opinion",
+    "Is the user asking for a summary or overview of the course?": "course_overview",
+    "Is the user asking about course prerequisites?": "prerequisites",
+    "Is the user asking about the course schedule or duration?": "schedule",
+    "Is the user asking about course fees or costs?": "fees",
+    "Is the user asking about course certification or accreditation?": "certification",
+}
+INTENT_LABELS = list(LABEL_MAP)
+
+# Example questions per intent; the readable zero-shot label is always included too
+INTENT_EXAMPLES = {
+    "yes_no": [
+        "Is this course worth it?",
+        "Should I take this course?",
+        "Is it good for someone with no experience?",
+        "Does the course live up to the hype?",
+    ],
+    "instructor": [
+        "How good is the teacher?",
+        "Does the professor explain things well?",
+        "What do students say about the lecturer?",
+        "Is the instructor engaging?",
+    ],
+    "content": [
+        "What does the course teach?",
+        "Which subjects are included in the syllabus?",
+        "Does it cover deep learning?",
+        "What will I learn in this course?",
+    ],
+    "difficulty": [
+        "How hard is this course?",
+        "Is the workload heavy?",
+        "Are the assignments challenging?",
+        "Is it too advanced for me?",
+    ],
+    "career": [
+        "Will this help me get a job?",
+        "Is this course useful for my career?",
+        "Can I get hired after completing it?",
+        "Is it relevant for industry work?",
+    ],
+    "general_opinion": [
+        "What do people think of this course?",
+        "How did students like the course?",
+        "What are the reviews saying?",
+        "What is the overall feedback?",
+    ],
+    "course_overview": [
+        "Give me a summary of the course.",
+        "Can you describe this course briefly?",
+        "What is this course about?",
+        "Summarize the course for me.",
+    ],
+    "prerequisites": [
+        "What do I need to know before starting?",
+        "Are there any requirements to enroll?",
+        "Do I need programming experience first?",
+        "What background is required?",
+    ],
+    "schedule": [
+        "How long does the course take?",
+        "How many weeks is the course?",
+        "How many hours per week are needed?",
+        "When does the course start?",
+    ],
+    "fees": [
+        "Is this course free?",
+        "What is the price of the course?",
+        "How expensive is it?",
+        "Do I have to pay to enroll?",
+    ],
+    "certification": [
+        "Do I get a certificate?",
+        "Is the certificate recognized?",
+        "Is the course accredited?",
+        "Can I add the certificate to LinkedIn?",
+    ],
+}
+
+# Held-out evaluation set: the notebook's 11 questions plus two paraphrases per intent
+EVAL_SET = [
+    ("Is this course suitable for beginners?", "yes_no"),
+    ("How experienced is the instructor?", "instructor"),
+    ("What topics are covered in this course?", "content"),
+    ("Is this course difficult?", "difficulty"),
+    ("Will this course help me in my career?", "career"),
+    ("What do students think about this course?", "general_opinion"),
+    ("Can you give me an overview of the course?", "course_overview"),
+    ("What are the prerequisites for this course?", "prerequisites"),
+    ("What is the course schedule?", "schedule"),
+    ("How much does the course cost?", "fees"),
+    ("Will I receive a certificate after completing the course?", "certification"),
+    ("Would you recommend this course?", "yes_no"),
+    ("Is it a good course for a complete newbie?", "yes_no"),
+    ("Is the instructor's teaching style clear?", "instructor"),
+    ("Who teaches this course and are they good?", "instructor"),
+    ("Does the course include Python programming?", "content"),
+    ("What concepts will the lectures go through?", "content"),
+    ("How tough are the quizzes?", "difficulty"),
+    ("Is the material hard to follow?", "difficulty"),
+    ("Does this course improve my job prospects?", "career"),
+    ("Will employers value this course?", "career"),
+    ("What are the general opinions about this course?", "general_opinion"),
+    ("How do learners rate this course overall?", "general_opinion"),
+    ("Could you give me a short overview?", "course_overview"),
+    ("Summarize what this course is about.", "course_overview"),
+    ("What should I study before taking this course?", "prerequisites"),
+    ("Do I need to know calculus beforehand?", "prerequisites"),
+    ("How much time does it take to finish?", "schedule"),
+    ("What is the weekly time commitment?", "schedule"),
+    ("Do I need to pay for this course?", "fees"),
+    ("Is there a fee for the certificate track?", "fees"),
+    ("Is there a certification at the end?", "certification"),
+    ("Is the certificate accredited by a university?", "certification"),
+]
+
+
+def _normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+class ZeroShotIntentClassifier:
+    """BART-MNLI zero-shot classification over the readable intent labels.
+
+    Without an explicit pipeline the registry's ``zero_shot`` model is used,
+    loaded on the first question that needs it.
+    """
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline
+
+    def classify(self, questions):
+        pipeline = self.pipeline or model_registry.get("zero_shot")
+        results = pipeline(list(questions), candidate_labels=INTENT_LABELS, multi_label=False)
+        if isinstance(results, dict):
+            results = [results]
+        return [(LABEL_MAP[r["labels"][0]], float(r["scores"][0])) for r in results]
+
+
+class PrototypeIntentClassifier:
+    """Nearest-prototype intent classification on sentence embeddings."""
+
+    def __init__(self, model, model_name=variant_name(SBERT_MODEL), path=PROTOTYPES_PATH, examples=None,
+                 fallback=None, threshold=PROTOTYPE_THRESHOLD):
+        self.model = model
+        self.model_name = model_name
+        self.path = path
+        self.examples = examples or INTENT_EXAMPLES
+        self.fallback = fallback
+        self.threshold = threshold
+        self.fallbacks = 0
+        self.intents, self.prototypes = self._load_or_build()
+
+    def _examples_with_labels(self):
+        readable = {intent: label for label, intent in LABEL_MAP.items()}
+        return {intent: [readable[intent]] + list(texts) if intent in readable else list(texts)
+                for intent, texts in self.examples.items()}
+
+    def _load_or_build(self):
+        examples = self._examples_with_labels()
+        fingerprint = cache_key(self.model_name, examples)
+        meta_path = self.path + ".json"
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["fingerprint"] == fingerprint:
+                return meta["intents"], load_array(self.path)
+
+        print("⚙️ Building intent prototypes...")
+        intents = list(examples)
+        prototypes = []
+        for intent in intents:
+            vectors = _normalize_rows(self.model.encode(examples[intent], convert_to_numpy=True))
+            prototypes.append(vectors.mean(axis=0))
+        prototypes = _normalize_rows(np.stack(prototypes))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        save_array(self.path, prototypes)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "model_name": self.model_name, "intents": intents}, f)
+        return intents, prototypes
+
+    def scores(self, embeddings):
+        """(n, num_intents) cosine similarities of question embeddings to every prototype."""
+        embeddings = _normalize_rows(np.asarray(embeddings).reshape(len(embeddings), -1))
+        return embeddings @ self.prototypes.T
+
+    def classify_embeddings(self, embeddings, questions=None):
+        """[(intent, score)] from precomputed embeddings; low-confidence questions go to the fallback."""
+        scores = self.scores(embeddings)
+        best = scores.argmax(axis=1)
+        results = [(self.intents[i], float(scores[row, i])) for row, i in enumerate(best)]
+
+        if self.fallback is not None and questions is not None:
+            unsure = [row for row, (_, score) in enumerate(results) if score < self.threshold]
+            if unsure:
+                self.fallbacks += len(unsure)
+                for row, result in zip(unsure, self.fallback.classify([questions[row] for row in unsure])):
+                    results[row] = result
+        return results
+
+    def classify(self, questions):
+        embeddings = self.model.encode(list(questions), convert_to_numpy=True)
+        return self.classify_embeddings(embeddings, questions)
+
+
+def compare_classifiers(classifiers, eval_set=EVAL_SET):
+    """Accuracy and per-question latency of each named classifier on the evaluation set."""
+    questions = [q for q, _ in eval_set]
+    truth = [intent for _, intent in eval_set]
+    rows, mistakes = [], {}
+    for name, classifier in classifiers.items():
+        latencies, predictions = [], []
+        for question in questions:
+            start = time.perf_counter()
+            predictions.append(classifier.classify([question])[0][0])
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        correct = np.array(predictions) == np.array(truth)
+        rows.append({
+            "classifier": name,
+            "accuracy": float(correct.mean()),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "mean_ms": float(latencies.mean()),
+        })
+        mistakes[name] = [(q, p, t) for q, p, t, ok in zip(questions, predictions, truth, correct) if not ok]
+    return pd.DataFrame(rows), mistakes
+
+
+if __name__ == "__main__":
+    model = model_registry.get("sbert")
+    zero_shot = ZeroShotIntentClassifier()
+    classifiers = {
+        "prototype": PrototypeIntentClassifier(model),
+        "prototype + zero-shot fallback": PrototypeIntentClassifier(model, fallback=zero_shot),
+        "zero-shot": zero_shot,
+    }
+    report, mistakes = compare_classifiers(classifiers)
+    print(report.to_string(index=False))
+    for name, wrong in mistakes.items():
+        print(f"\n❌ {name}: {len(wrong)} mispredicted")
+        for question, predicted, true in wrong:
+            print(f"   - {question} → {predicted} (expected {true})")
@@ -0,0 +1,191 @@
+"""Process-wide registry of lazily loaded models.
+
+Scripts ask for a model by name (``get("t5")``) instead of importing
+``torch``/``transformers``/``sentence_transformers`` and calling
+``from_pretrained`` at import time. A model is loaded on first use, kept as a
+singleton for the rest of the process, and can be warmed on a background
+thread (``warm("sbert")``) while the user is still answering the
+institution/course prompts. Load time and resident memory are recorded per
+model and shown by ``print_report``.
+
+Registered models:
+
+* ``sbert``: Sentence-BERT (``all-MiniLM-L6-v2``) question/review encoder;
+* ``zero_shot``: BART-MNLI zero-shot classification pipeline;
+* ``roberta_sentiment``: ``(tokenizer, model)`` for RoBERTa sentiment;
+* ``t5``: ``(tokenizer, model)`` for T5 summarization/NLG;
+* ``qg``: T5 question-generation pipeline;
+* ``bertsum``: BERT extractive summarizer (``bert-extractive-summarizer``);
+* ``pegasus``: ``(tokenizer, model)`` for PEGASUS-XSum summarization.
+
+``sbert``, ``roberta_sentiment`` and ``t5`` are built for the configured
+inference backend (fp32 or dynamic int8, see ``utils.inference_backend``).
+"""
+
+import os
+import time
+import threading
+from utils import inference_backend
+
+SBERT_MODEL = "all-MiniLM-L6-v2"
+ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
+ROBERTA_MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+T5_MODEL = "t5-small"
+QG_MODEL = "valhalla/t5-base-qg-hl"
+PEGASUS_MODEL = "google/pegasus-xsum"
+
+_loaders = {}
+_models = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def register(name, loader):
+    """Register (or replace) the loader of a model; an already loaded instance is dropped."""
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+        _models.pop(name, None)
+        _stats.pop(name, None)
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def get(name):
+    """The model registered under ``name``, loading it on first use."""
+    if name in _models:
+        return _models[name]
+    if name not in _loaders:
+        raise KeyError(f"Unknown model '{name}' (registered: {', '.join(sorted(_loaders))})")
+    with _locks[name]:
+        if name not in _models:
+            print(f"🔗 Loading {name} model...")
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            _models[name] = _loaders[name]()
+            _stats[name] = {
+                "load_seconds": time.perf_counter() - start,
+                "rss_delta_mb": rss_mb() - rss_before,
+                "thread": threading.current_thread().name,
+            }
+            print(f"✅ Loaded {name} in {_stats[name]['load_seconds']:.1f}s")
+    return _models[name]
+
+
+def warm(*names):
+    """Load models on a background thread; returns the thread (join it to wait)."""
+    def load_all():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"⚠️ Could not warm {name}: {e}")
+
+    thread = threading.Thread(target=load_all, name=f"warm-{'-'.join(names)}", daemon=True)
+    thread.start()
+    return thread
+
+
+def report():
+    """Per-model load time and RSS growth during load, plus current process RSS."""
+    return {
+        "rss_mb": rss_mb(),
+        "models": {name: dict(stats) for name, stats in _stats.items()},
+    }
+
+
+def print_report():
+    """Console view of ``report``; loads that overlapped on different threads share their RSS growth."""
+    stats = report()
+    print(f"\n📦 Process RSS: {stats['rss_mb']:.0f} MB")
+    for name, model_stats in stats["models"].items():
+        print(f"   - {name}: loaded in {model_stats['load_seconds']:.2f}s, "
+              f"+{model_stats['rss_delta_mb']:.0f} MB")
+
+
+# ------------------------------
+# Built-in models
+# ------------------------------
+def _load_sbert(backend=None, device_name=None):
+    from sentence_transformers import SentenceTransformer
+    return inference_backend.load_model(
+        "sbert", SBERT_MODEL, lambda d: SentenceTransformer(SBERT_MODEL, device=d), device_name or device(), backend
+    )
+
+
+def _load_zero_shot():
+    from transformers import pipeline
+    return pipeline("zero-shot-classification", model=ZERO_SHOT_MODEL, device=device())
+
+
+def _load_roberta_sentiment(backend=None, device_name=None):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    tokenizer = AutoTokenizer.from_pretrained(ROBERTA_MODEL)
+    model = inference_backend.load_model(
+        "roberta_sentiment", ROBERTA_MODEL,
+        lambda d: AutoModelForSequenceClassification.from_pretrained(ROBERTA_MODEL).to(d),
+        device_name or device(), backend,
+    )
+    return tokenizer, model
+
+
+def _load_t5(backend=None, device_name=None):
+    from transformers import T5Tokenizer, T5ForConditionalGeneration
+    tokenizer = T5Tokenizer.from_pretrained(T5_MODEL)
+    model = inference_backend.load_model(
+        "t5", T5_MODEL, lambda d: T5ForConditionalGeneration.from_pretrained(T5_MODEL).to(d),
+        device_name or device(), backend,
+    )
+    return tokenizer, model
+
+
+def _load_qg():
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=QG_MODEL, device=device())
+
+
+def _load_bertsum():
+    from summarizer import Summarizer
+    return Summarizer()
+
+
+def _load_pegasus():
+    from transformers import PegasusTokenizer, PegasusForConditionalGeneration
+    tokenizer = PegasusTokenizer.from_pretrained(PEGASUS_MODEL)
+    model = PegasusForConditionalGeneration.from_pretrained(PEGASUS_MODEL).to(device())
+    return tokenizer, model
+
+
+_BACKEND_LOADERS = {"sbert": _load_sbert, "roberta_sentiment": _load_roberta_sentiment, "t5": _load_t5}
+
+
+def build(name, backend=None, device=None):
+    """A fresh, unregistered instance of a built-in model for a given backend (used by the parity check)."""
+    return _BACKEND_LOADERS[name](backend, device)
+
+
+register("sbert", _load_sbert)
+register("zero_shot", _load_zero_shot)
+register("roberta_sentiment", _load_roberta_sentiment)
+register("t5", _load_t5)
+register("qg", _load_qg)
+register("bertsum", _load_bertsum)
+register("pegasus", _load_pegasus)
@@ -0,0 +1,324 @@
+"""End-to-end benchmark of the QA pipeline stages with offline stand-in models.
+
+A synthetic corpus shaped like ``data/processed/data.pkl`` / ``data/reviews/``
+(configurable number of institutions, courses and reviews) is written to a
+temporary workspace, and tiny randomly initialized local models are registered
+in ``model_registry`` under the real model names (Sentence-BERT, BART-MNLI,
+RoBERTa, T5). Nothing is downloaded, so the suite runs offline, and the
+pipeline code under test is exactly the code the scripts use.
+
+Stages: data load, course filter, question-gate encode, intent classification
+(prototype and zero-shot), review retrieval, sentiment, T5 summarization and
+NLG, and the full ``qa.ipynb`` flow (``QAPipeline.ask``). Each stage reports
+throughput, p50/p95/p99 latency and peak RSS. Results are saved as a JSON
+baseline in ``data/benchmarks/`` and can be diffed against an earlier run::
+
+    python -m utils.pipeline_benchmark --name before
+    python -m utils.pipeline_benchmark --name after --compare data/benchmarks/before.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import resource
+import numpy as np
+import pandas as pd
+from utils import model_registry
+from utils.review_store import build_review_store, open_review_store, STORE_DIR
+from utils.course_embeddings import build_course_embeddings
+from utils.sentiment_engine import build_sentiment_store, score_roberta
+from utils.intent_classifier import EVAL_SET, ZeroShotIntentClassifier
+from utils.generation import ChunkedGenerator
+from utils.qa_pipeline import QAPipeline
+
+BENCHMARK_DIR = "data/benchmarks"
+REGRESSION_TOLERANCE = 0.10  # relative slowdown of p95 (or drop in throughput) flagged as a regression
+
+WORDS = (
+    "course instructor teacher professor lecture lectures video videos quiz quizzes assignment assignments "
+    "project projects exam week weeks content material materials topic topics example examples python data "
+    "machine learning statistics math programming code coding career job skills certificate beginner "
+    "beginners advanced difficult hard easy clear useful helpful boring interesting great good bad excellent "
+    "poor amazing awesome recommend recommended explain explained explains pace slow fast time hours "
+    "practice theory practical real world knowledge understand understanding learned learn learning "
+    "the a an and or but very really too not it is was were this that i we you they of to in for on with "
+    "about at from by more most some all many much well so also just only would could should"
+).split()
+QUESTION_WORDS = "what how is are does do did will can who which why should would summarize question context ? : ,".split()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 1024)
+
+
+# ------------------------------
+# Synthetic corpus
+# ------------------------------
+def make_corpus(institutions=5, courses=4, reviews=200, seed=0):
+    """DataFrame with data.pkl's columns: ``courses`` courses per institution, ~``reviews`` reviews each."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(institutions):
+        institution = f"Institution {i}"
+        for c in range(courses):
+            name = f"Course {i}-{c}"
+            course_id = f"course-{i}-{c}"
+            for r in range(int(rng.integers(reviews // 2, reviews * 3 // 2 + 1))):
+                length = int(np.clip(rng.lognormal(2.8, 0.7), 2, 200))
+                text = " ".join(rng.choice(WORDS, size=length))
+                rows.append({
+                    "reviews": text.capitalize() + ".",
+                    "reviewers": f"By user {r}",
+                    "date_reviews": f"Jan {1 + r % 28}, 2020",
+                    "rating": int(rng.integers(1, 6)),
+                    "course_id": course_id,
+                    "name": name,
+                    "institution": institution,
+                })
+    return pd.DataFrame(rows)
+
+
+def write_corpus(df, questions):
+    """Write data.pkl, data/reviews/<institution>/<course>.txt and the generated question bank."""
+    os.makedirs("data/processed", exist_ok=True)
+    os.makedirs("data/intermediate", exist_ok=True)
+    df.to_pickle("data/processed/data.pkl")
+    for (institution, name), group in df.groupby(["institution", "name"]):
+        os.makedirs(os.path.join("data/reviews", institution), exist_ok=True)
+        with open(os.path.join("data/reviews", institution, f"{name}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(group["reviews"]) + "\n")
+    with open("data/intermediate/generated_questions.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(questions) + "\n")
+
+
+# ------------------------------
+# Tiny stand-in models
+# ------------------------------
+class TinySentenceEncoder:
+    """Mean-pooled tiny BERT with the ``SentenceTransformer.encode`` interface."""
+
+    def __init__(self, tokenizer, model):
+        self.tokenizer = tokenizer
+        self.model = model.eval()
+
+    def encode(self, sentences, batch_size=32, convert_to_tensor=False, convert_to_numpy=True,
+               show_progress_bar=False, normalize_embeddings=False):
+        import torch
+
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        outputs = []
+        with torch.no_grad():
+            for start in range(0, len(sentences), batch_size):
+                batch = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                       max_length=128, return_tensors="pt")
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).float()
+                vectors = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1)
+                if normalize_embeddings:
+                    vectors = torch.nn.functional.normalize(vectors, dim=1)
+                outputs.append(vectors)
+        embeddings = torch.cat(outputs) if outputs else torch.zeros((0, self.model.config.hidden_size))
+        embeddings = embeddings if convert_to_tensor else embeddings.numpy()
+        return embeddings[0] if single else embeddings
+
+
+def register_stand_in_models(model_dir, seed=0):
+    """Register tiny random models under the registry's real model names."""
+    import torch
+    from transformers import (BertConfig, BertModel, BertForSequenceClassification, BertTokenizerFast,
+                              T5Config, T5ForConditionalGeneration, pipeline)
+
+    os.makedirs(model_dir, exist_ok=True)
+    vocab_path = os.path.join(model_dir, "vocab.txt")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "."] + sorted(set(WORDS + QUESTION_WORDS))))
+    tokenizer = BertTokenizerFast(vocab_path)
+    tokenizer.eos_token = "[SEP]"
+
+    torch.manual_seed(seed)
+    bert = dict(vocab_size=len(tokenizer), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                intermediate_size=64, max_position_embeddings=512)
+    nli_labels = {0: "contradiction", 1: "neutral", 2: "entailment"}
+    sentiment_labels = {0: "negative", 1: "neutral", 2: "positive"}
+
+    model_registry.register("sbert", lambda: TinySentenceEncoder(tokenizer, BertModel(BertConfig(**bert))))
+    model_registry.register("zero_shot", lambda: pipeline(
+        "zero-shot-classification", tokenizer=tokenizer,
+        model=BertForSequenceClassification(BertConfig(**bert, num_labels=3, id2label=nli_labels,
+                                                       label2id={v: k for k, v in nli_labels.items()})),
+    ))
+    model_registry.register("roberta_sentiment", lambda: (tokenizer, BertForSequenceClassification(
+        BertConfig(**bert, num_labels=3, id2label=sentiment_labels)).eval()))
+    model_registry.register("t5", lambda: (tokenizer, T5ForConditionalGeneration(T5Config(
+        vocab_size=len(tokenizer), d_model=32, d_ff=64, num_layers=2, num_heads=2, d_kv=16,
+        pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.sep_token_id,
+        decoder_start_token_id=tokenizer.pad_token_id)).eval()))
+
+
+# ------------------------------
+# Measurement
+# ------------------------------
+def run_stage(name, calls, items_per_call=1):
+    """Time every call; report throughput (items/s), latency percentiles and peak RSS."""
+    if len(calls) > 1:
+        calls[0]()  # untimed warm-up (lazy loads, first-touch page faults)
+    latencies = []
+    start = time.perf_counter()
+    for call in calls:
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    result = {
+        "calls": len(latencies),
+        "throughput": len(latencies) * items_per_call / total if total > 0 else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"⏱️ {name:<20} {result['p50_ms']:9.2f} ms p50 {result['p95_ms']:9.2f} ms p95 "
+          f"{result['throughput']:9.1f}/s")
+    return result
+
+
+def run_benchmark(institutions=5, courses=4, reviews=200, questions=20, seed=0):
+    """Build the synthetic workspace in the current directory and benchmark every stage."""
+    random.seed(seed)
+    asked = [random.choice(EVAL_SET)[0] for _ in range(questions)]
+    df = make_corpus(institutions, courses, reviews, seed)
+    write_corpus(df, [q for q, _ in EVAL_SET])
+    register_stand_in_models("models", seed)
+
+    stages = {}
+    stages["data_load"] = run_stage("data_load", [
+        lambda: (build_review_store(pd.read_pickle("data/processed/data.pkl")), open_review_store())
+    ] * 3, items_per_call=len(df))
+    store = open_review_store(STORE_DIR)
+    groups = [(inst, name) for inst, name, _ in store.groups()]
+    targets = [random.choice(groups) for _ in range(questions)]
+
+    stages["course_filter"] = run_stage(
+        "course_filter", [lambda t=t: store.reviews(*t) for t in targets])
+
+    # One-off builds the pipeline relies on (also timed, as single calls)
+    stages["embedding_build"] = run_stage("embedding_build", [
+        lambda: build_course_embeddings(store, model_registry.get("sbert"))
+    ], items_per_call=len(store))
+    tokenizer, sentiment_model = model_registry.get("roberta_sentiment")
+    stages["sentiment_build"] = run_stage("sentiment_build", [
+        lambda: build_sentiment_store(store, tokenizer, sentiment_model, processes=1, use_vader=False)
+    ], items_per_call=len(store))
+
+    pipeline = QAPipeline(store)
+    pipeline.answer_cache.max_distance = -1.0  # measure the uncached path
+    t5_tokenizer, t5 = model_registry.get("t5")
+    pipeline.generator = ChunkedGenerator(t5, t5_tokenizer)
+    embeddings = {q: pipeline.encode([q])[0] for q in set(asked)}
+    pipeline.question_gate, pipeline.classifier
+    zero_shot = ZeroShotIntentClassifier()
+
+    stages["gate_encode"] = run_stage(
+        "gate_encode", [lambda q=q: pipeline.gate(pipeline.encode([q])) for q in asked])
+    stages["intent_prototype"] = run_stage(
+        "intent_prototype", [lambda q=q: pipeline.classifier.classify_embeddings([embeddings[q]]) for q in asked])
+    stages["intent_zero_shot"] = run_stage(
+        "intent_zero_shot", [lambda q=q: zero_shot.classify([q]) for q in asked])
+
+    hits = [pipeline.retrieve(*t, embeddings[q]) for q, t in zip(asked, targets)]
+    stages["retrieval"] = run_stage(
+        "retrieval", [lambda q=q, t=t: pipeline.retrieve(*t, embeddings[q]) for q, t in zip(asked, targets)])
+    contexts = [[store.review(row_id) for row_id, _ in h] or store.reviews(*t)[:20] for h, t in zip(hits, targets)]
+    stages["sentiment_score"] = run_stage(
+        "sentiment_score", [lambda c=c: score_roberta(c, tokenizer, sentiment_model) for c in contexts])
+    stages["sentiment_lookup"] = run_stage(
+        "sentiment_lookup", [lambda h=h: pipeline.sentiments([[row_id for row_id, _ in h]]) for h in hits])
+    stages["summarization"] = run_stage(
+        "summarization", [lambda c=c: pipeline.generator.summarize(c) for c in contexts])
+    stages["nlg"] = run_stage(
+        "nlg", [lambda q=q, c=c: pipeline.generator.answer(q, c) for q, c in zip(asked, contexts)])
+    stages["full_flow"] = run_stage(
+        "full_flow", [lambda q=q, t=t: pipeline.ask(q, *t) for q, t in zip(asked, targets)])
+
+    return {
+        "config": {"institutions": institutions, "courses": courses, "reviews": reviews,
+                   "questions": questions, "seed": seed, "rows": len(df)},
+        "environment": {"python": platform.python_version(), "machine": platform.machine()},
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "stages": stages,
+    }
+
+
+# ------------------------------
+# Baselines
+# ------------------------------
+def compare(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Per-stage relative change of every metric; flags p95 slowdowns and throughput drops."""
+    rows = []
+    for stage, metrics in current["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            continue
+        row = {"stage": stage}
+        for metric in ("throughput", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+            row[metric] = (metrics[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+        row["regression"] = row["p95_ms"] > tolerance or row["throughput"] < -tolerance
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--institutions", type=int, default=5)
+    parser.add_argument("--courses", type=int, default=4, help="courses per institution")
+    parser.add_argument("--reviews", type=int, default=200, help="average reviews per course")
+    parser.add_argument("--questions", type=int, default=20, help="questions per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--name", default="latest", help=f"baseline name, saved to {BENCHMARK_DIR}/<name>.json")
+    parser.add_argument("--compare", help="baseline JSON to diff against")
+    parser.add_argument("--keep-workspace", action="store_true")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(os.path.join(BENCHMARK_DIR, f"{args.name}.json"))
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    repo_dir = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="qa-benchmark-")
+    # Every data path in the pipeline is relative, so the whole run stays inside the workspace
+    os.chdir(workspace)
+    try:
+        results = run_benchmark(args.institutions, args.courses, args.reviews, args.questions, args.seed)
+    finally:
+        os.chdir(repo_dir)
+        if args.keep_workspace:
+            print(f"📂 Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    print("\n📊 Results")
+    print(pd.DataFrame(results["stages"]).T.to_string(float_format=lambda v: f"{v:.2f}"))
+    print(f"\n✅ Baseline written to {output_path}")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        diff = compare(results, baseline)
+        print(f"\n📈 Relative change vs {baseline_path}")
+        print(diff.to_string(index=False, float_format=lambda v: f"{v:+.1%}"))
+        if diff["regression"].any():
+            print(f"\n❌ Regressions: {', '.join(diff.loc[diff['regression'], 'stage'])}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Course QA pipeline from ``qa.ipynb`` as reusable, batch-oriented steps.
+
+Every step takes a list and returns a list, so a caller serving many users
+(``utils.qa_server``) can merge concurrent requests into one forward pass:
+
+* ``encode``: Sentence-BERT embeddings of questions;
+* ``gate``: max cosine similarity against the generated question bank
+  (clustered, with early exit at the threshold; see ``utils.question_gate``);
+* ``classify``: intent from the question embedding via intent prototypes, with
+  zero-shot BART-MNLI as fallback for low-confidence questions;
+* ``sentiments``: per-review scores from the precomputed sentiment store;
+* ``generate``: T5 answer (NLG) or summary of the retrieved reviews.
+
+``ask`` chains the steps for a single question. Answers are kept in a
+per-course ``AnswerCache``, so repeated or paraphrased questions skip every
+step after ``encode``. Every step is traced as a span (``utils.tracing``).
+"""
+
+import numpy as np
+from functools import cached_property
+from utils import model_registry
+from utils.model_registry import SBERT_MODEL, T5_MODEL
+from utils.inference_backend import variant_name
+from utils.review_store import open_review_store
+from utils.embedding_cache import EmbeddingCache
+from utils.course_embeddings import CourseRetriever
+from utils.bm25_index import open_bm25_index, hybrid_search
+from utils.sentiment_engine import SentimentStore
+from utils.generation import ChunkedGenerator
+from utils.summary_cache import SummaryCache
+from utils.answer_cache import AnswerCache
+from utils.intent_classifier import INTENT_LABELS, LABEL_MAP, PrototypeIntentClassifier, ZeroShotIntentClassifier
+from utils.question_gate import GATE_THRESHOLD, load_generated_questions, open_question_gate
+from utils.tracing import span
+
+INTENT_FALLBACK = True  # zero-shot BART-MNLI for questions no prototype matches well
+RELATED_THRESHOLD = 0.5  # min similarity of a review to the question
+MAX_CONTEXT_REVIEWS = 50  # most similar reviews passed to generation
+RETRIEVAL_MODE = "dense"  # or "prefilter" (BM25 candidates re-ranked densely) / "fusion" (see utils/bm25_index.py)
+
+INTENT_ACTIONS = {
+    "yes_no": {"sentiment": True, "nlg": True, "summarization": False},
+    "instructor": {"sentiment": True, "nlg": True, "summarization": False},
+    "content": {"sentiment": True, "nlg": True, "summarization": False},
+    "difficulty": {"sentiment": True, "nlg": True, "summarization": False},
+    "career": {"sentiment": True, "nlg": True, "summarization": False},
+    "general_opinion": {"sentiment": True, "nlg": True, "summarization": False},
+    "course_overview": {"sentiment": False, "nlg": False, "summarization": True},
+    "prerequisites": {"sentiment": False, "nlg": False, "summarization": True},
+    "schedule": {"sentiment": False, "nlg": False, "summarization": True},
+    "fees": {"sentiment": True, "nlg": True, "summarization": False},
+    "certification": {"sentiment": True, "nlg": True, "summarization": False},
+}
+
+
+class QAPipeline:
+    """Exposes the QA steps as batch functions over registry models (loaded on first use)."""
+
+    def __init__(self, store=None):
+        self.store = store or open_review_store()
+        self.embedding_cache = EmbeddingCache(variant_name(SBERT_MODEL))
+        self.sentiment_store = SentimentStore()
+        self.answer_cache = AnswerCache(self.store)
+        self.generated_questions = load_generated_questions()
+        if not self.generated_questions:
+            print("⚠️ No 'generated_questions.txt' found or it's empty!")
+
+    def warm(self, wait=False):
+        """Load every model the pipeline can use on a background thread."""
+        names = ["sbert", "t5"] + (["zero_shot"] if INTENT_FALLBACK else [])
+        thread = model_registry.warm(*names)
+        if wait:
+            thread.join()
+            # Also build everything derived from the models
+            self.question_gate, self.classifier, self.generator
+            if RETRIEVAL_MODE != "dense":
+                self.bm25
+        return thread
+
+    @property
+    def model(self):
+        return model_registry.get("sbert")
+
+    @cached_property
+    def question_gate(self):
+        return open_question_gate(self.model, self.embedding_cache)
+
+    @cached_property
+    def retriever(self):
+        return CourseRetriever(self.store, model=self.model, cache=self.embedding_cache)
+
+    @cached_property
+    def bm25(self):
+        return open_bm25_index(self.store)
+
+    @cached_property
+    def classifier(self):
+        fallback = ZeroShotIntentClassifier() if INTENT_FALLBACK else None
+        return PrototypeIntentClassifier(self.model, variant_name(SBERT_MODEL), fallback=fallback)
+
+    @cached_property
+    def generator(self):
+        tokenizer, t5 = model_registry.get("t5")
+        return ChunkedGenerator(t5, tokenizer, cache=SummaryCache(), model_name=variant_name(T5_MODEL))
+
+    def refresh(self):
+        """Pick up reviews appended by ``utils.ingest`` since the store was opened; True if there were any.
+
+        Matrices of the courses that gained reviews, the BM25 index and the
+        sentiment store are reopened, so answers never mix old and new rows.
+        """
+        ranges = dict(self.store.ranges)
+        if not self.store.refresh():
+            return False
+        changed = [key for key, value in self.store.ranges.items() if ranges.get(key) != value]
+        if "retriever" in self.__dict__:
+            self.retriever.forget(changed)
+        self.__dict__.pop("bm25", None)
+        self.sentiment_store = SentimentStore()
+        return True
+
+    # ------------------------------
+    # Batch steps
+    # ------------------------------
+    def encode(self, questions):
+        """(n, dim) normalized question embeddings."""
+        with span("encode", batch_size=len(questions)):
+            return self.model.encode(list(questions), batch_size=max(len(questions), 1),
+                                     convert_to_numpy=True, normalize_embeddings=True)
+
+    def gate(self, embeddings):
+        """Best cosine similarity of each question to the generated question bank, searched until its side of ``GATE_THRESHOLD`` is known."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if self.question_gate is None:
+            return np.ones(len(embeddings), dtype=np.float32)
+        return self.question_gate.max_similarity(embeddings, stop_at=GATE_THRESHOLD)
+
+    def classify(self, questions, embeddings=None):
+        """[(intent, score)] for each question, reusing its embedding when given."""
+        if embeddings is None:
+            embeddings = self.encode(questions)
+        with span("intent", batch_size=len(questions)) as s:
+            fallbacks = self.classifier.fallbacks
+            results = self.classifier.classify_embeddings(embeddings, list(questions))
+            s.set(fallbacks=self.classifier.fallbacks - fallbacks)
+        return results
+
+    def sentiments(self, row_id_lists):
+        """Sentiment scores for each list of review-store row ids."""
+        with span("sentiment", batch_size=len(row_id_lists), reviews=sum(len(r) for r in row_id_lists)):
+            return [self.sentiment_store.lookup(row_ids) for row_ids in row_id_lists]
+
+    def generate(self, jobs):
+        """Answer or summarize for each (question, intent, reviews, sentiments) job."""
+        outputs = []
+        for question, intent, reviews, sentiments in jobs:
+            outputs.append(self._generate_one(question, intent, reviews, sentiments))
+        return outputs
+
+    def _generate_one(self, question, intent, reviews, sentiments):
+        if not reviews:
+            return ""
+        with span("generation", intent=intent, reviews=len(reviews)):
+            if INTENT_ACTIONS[intent]["nlg"]:
+                return self.generator.answer(question, reviews)
+            prefix = "summarize: "
+            if sentiments:
+                labels = [s["sentiment"] for s in sentiments]
+                prefix = f"summarize this {max(set(labels), key=labels.count)} review: "
+            return self.generator.summarize(reviews, prefix=prefix)
+
+    # ------------------------------
+    # Single question
+    # ------------------------------
+    def retrieve(self, institution, course, embedding, question=None):
+        with span("retrieval", mode=RETRIEVAL_MODE) as s:
+            if RETRIEVAL_MODE == "dense" or question is None:
+                hits = self.retriever.search(institution, course, embedding,
+                                             top_k=MAX_CONTEXT_REVIEWS, threshold=RELATED_THRESHOLD)
+            else:
+                hits = hybrid_search(self.retriever, self.bm25, institution, course, question, embedding,
+                                     mode=RETRIEVAL_MODE, top_k=MAX_CONTEXT_REVIEWS, threshold=RELATED_THRESHOLD)
+            s.set(reviews=len(hits))
+        return hits
+
+    def respond(self, question, institution, course, embedding, gate_score, intent=None):
+        """Build the answer dict once the question has been encoded, gated and classified."""
+        response = {"question": question, "institution": institution, "course": course,
+                    "gate_score": float(gate_score), "related": bool(gate_score >= GATE_THRESHOLD)}
+        if not response["related"] or intent is None:
+            return response, None
+        hits = self.retrieve(institution, course, embedding, question)
+        response.update({
+            "intent": intent[0],
+            "intent_score": intent[1],
+            "actions": INTENT_ACTIONS[intent[0]],
+            "reviews": [{"review": self.store.review(row_id), "score": score} for row_id, score in hits],
+        })
+        return response, [row_id for row_id, _ in hits]
+
+    def cached(self, question, institution, course, embedding, generate=True):
+        """Response of a cached (near-)identical question, or None."""
+        self.refresh()
+        with span("answer_cache") as s:
+            response = self.answer_cache.get(institution, course, embedding)
+            if response is None or (generate and "answer" not in response):
+                s.set(cache_hit=False)
+                return None
+            s.set(cache_hit=True)
+        return {**response, "question": question, "cached": True}
+
+    def ask(self, question, institution, course, generate=True):
+        """Run the whole pipeline for one question."""
+        with span("ask", institution=institution, course=course):
+            return self._ask(question, institution, course, generate)
+
+    def _ask(self, question, institution, course, generate):
+        embedding = self.encode([question])[0]
+        response = self.cached(question, institution, course, embedding, generate)
+        if response is not None:
+            return response
+        gate_score = self.gate([embedding])[0]
+        intent = self.classify([question], [embedding])[0] if gate_score >= GATE_THRESHOLD else None
+        response, row_ids = self.respond(question, institution, course, embedding, gate_score, intent)
+        if row_ids is None:
+            return response
+        if response["actions"]["sentiment"]:
+            for review, scores in zip(response["reviews"], self.sentiments([row_ids])[0]):
+                review["sentiment"] = scores["sentiment"]
+        if generate:
+            reviews = [r["review"] for r in response["reviews"]]
+            sentiments = [{"sentiment": r["sentiment"]} for r in response["reviews"] if "sentiment" in r]
+            response["answer"] = self.generate([(question, intent[0], reviews, sentiments)])[0]
+        self.answer_cache.put(institution, course, embedding, response)
+        return response
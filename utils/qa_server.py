@@ -0,0 +1,289 @@
+"""Long-lived QA server with resident models and dynamic micro-batching.
+
+All models are loaded once (``QAPipeline``) and questions for any course are
+served concurrently over a small asyncio HTTP/JSON server. Concurrent
+``encode``, ``gate``, intent ``classify`` and ``sentiment`` calls are queued
+and merged by a ``MicroBatcher``: a batch is flushed as soon as it is full or
+the oldest request has waited ``MAX_DELAY`` seconds, so throughput grows with
+concurrency while added latency stays bounded.
+
+Start it with ``python -m utils.qa_server`` from the repository root::
+
+    POST /ask      {"institution": ..., "course": ..., "question": ..., "generate": true}
+    GET  /courses?institution=...
+    GET  /stats    p50/p99 latency, throughput, mean batch size per step, answer cache hit rate
+    GET  /metrics  per-stage metrics in Prometheus text format (traces: ``utils.tracing``)
+    GET  /similar?institution=...&course=...&k=10      courses like this one
+    GET  /best?topic=...&k=10                          best-rated courses for a topic
+    GET  /compare?institution=...&course=...&other_institution=...&other_course=...
+"""
+
+import time
+import json
+import asyncio
+import contextvars
+import numpy as np
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from utils import model_registry, tracing
+from utils.qa_pipeline import QAPipeline, GATE_THRESHOLD
+from utils.recommender import open_recommender
+
+HOST = "127.0.0.1"
+PORT = 8000
+MAX_BATCH_SIZE = 32  # requests merged into one forward pass
+MAX_DELAY = 0.005  # seconds the first request of a batch may wait for company
+LATENCY_WINDOW = 10000  # recent requests kept for percentiles
+
+
+class MicroBatcher:
+    """Merges concurrent single-item calls into calls of ``fn`` on a list of items."""
+
+    def __init__(self, fn, max_batch_size=MAX_BATCH_SIZE, max_delay=MAX_DELAY):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        # One worker thread: batches of the same model never run concurrently
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue = None
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        return asyncio.ensure_future(self._run())
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0}
+
+
+class LatencyTracker:
+    """Rolling window of request latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.finished = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+        self.finished.append(time.perf_counter())
+        self.count += 1
+
+    def stats(self):
+        if not self.latencies:
+            return {"requests": 0}
+        latencies = np.array(self.latencies) * 1000
+        span = self.finished[-1] - self.finished[0]
+        return {
+            "requests": self.count,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "throughput_rps": (len(self.finished) - 1) / span if span > 0 else 0.0,
+        }
+
+
+class QAServer:
+    """Routes HTTP requests through the micro-batched QA pipeline."""
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline or QAPipeline()
+        self.encoder = MicroBatcher(self.pipeline.encode)
+        self.gate = MicroBatcher(self.pipeline.gate)
+        self.classifier = MicroBatcher(self._classify)
+        self.sentiment = MicroBatcher(self.pipeline.sentiments)
+        # Generation runs one job at a time; the batcher only queues it off the event loop
+        self.generator = MicroBatcher(self.pipeline.generate, max_batch_size=1, max_delay=0)
+        self.latency = LatencyTracker()
+        self.recommender = open_recommender(self.pipeline.store)
+
+    def _classify(self, items):
+        questions = [question for question, _ in items]
+        return self.pipeline.classify(questions, np.stack([embedding for _, embedding in items]))
+
+    async def _call(self, fn, *args):
+        """Run a blocking pipeline step off the event loop; the copied context nests its spans under the request."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, fn, *args)
+
+    async def ask(self, question, institution, course, generate=True):
+        with tracing.span("ask", institution=institution, course=course):
+            return await self._ask(question, institution, course, generate)
+
+    async def _ask(self, question, institution, course, generate):
+        pipeline = self.pipeline
+        embedding = await self.encoder.submit(question)
+        # The answer cache may reopen the store after an ingest
+        cached = await self._call(pipeline.cached, question, institution, course, embedding, generate)
+        if cached is not None:
+            return cached
+        gate_score = await self.gate.submit(embedding)
+        intent = await self.classifier.submit((question, embedding)) if gate_score >= GATE_THRESHOLD else None
+
+        response, row_ids = await self._call(
+            pipeline.respond, question, institution, course, embedding, gate_score, intent
+        )
+        if row_ids is None:
+            return response
+        if response["actions"]["sentiment"]:
+            for review, scores in zip(response["reviews"], await self.sentiment.submit(row_ids)):
+                review["sentiment"] = scores["sentiment"]
+        if generate:
+            reviews = [r["review"] for r in response["reviews"]]
+            sentiments = [{"sentiment": r["sentiment"]} for r in response["reviews"] if "sentiment" in r]
+            response["answer"] = await self.generator.submit((question, intent[0], reviews, sentiments))
+        await self._call(pipeline.answer_cache.put, institution, course, embedding, response)
+        return response
+
+    async def recommend(self, path, params):
+        if self.recommender is None:
+            return 503, {"error": "recommendations not built; run python -m utils.recommender"}
+        k = int(params.get("k", 10))
+        try:
+            if path == "/similar":
+                return 200, self.recommender.similar(params.get("institution", ""), params.get("course", ""), k)
+            if path == "/compare":
+                return 200, self.recommender.compare(
+                    (params.get("institution", ""), params.get("course", "")),
+                    (params.get("other_institution", ""), params.get("other_course", "")),
+                )
+        except KeyError as e:
+            return 404, {"error": str(e.args[0])}
+        if not params.get("topic"):
+            return 400, {"error": "missing field(s): topic"}
+        embedding = await self.encoder.submit(params["topic"])
+        return 200, self.recommender.best_for_topic(embedding, k)
+
+    def stats(self):
+        return {
+            "latency": self.latency.stats(),
+            "answer_cache": self.pipeline.answer_cache.stats(),
+            "models": model_registry.report(),
+            "batches": {
+                "encode": self.encoder.stats(),
+                "gate": self.gate.stats(),
+                "classify": self.classifier.stats(),
+                "sentiment": self.sentiment.stats(),
+                "generate": self.generator.stats(),
+            },
+        }
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        store = self.pipeline.store
+        if method == "GET" and url.path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and url.path == "/stats":
+            return 200, self.stats()
+        if method == "GET" and url.path == "/metrics":
+            return 200, tracing.prometheus_text()
+        if method == "GET" and url.path in ("/similar", "/best", "/compare"):
+            return await self.recommend(url.path, {k: v[0] for k, v in query.items()})
+        if method == "GET" and url.path == "/institutions":
+            return 200, store.institutions()
+        if method == "GET" and url.path == "/courses":
+            return 200, store.courses(query.get("institution", [""])[0])
+        if method == "POST" and url.path == "/ask":
+            request = json.loads(body or b"{}")
+            missing = [k for k in ("institution", "course", "question") if not request.get(k)]
+            if missing:
+                return 400, {"error": f"missing field(s): {', '.join(missing)}"}
+            if not len(store.row_ids(request["institution"], request["course"])):
+                return 404, {"error": "unknown course"}
+            start = time.perf_counter()
+            response = await self.ask(request["question"], request["institution"], request["course"],
+                                      request.get("generate", True))
+            self.latency.record(time.perf_counter() - start)
+            return 200, response
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive: one JSON request/response at a time per connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                if isinstance(payload, str):
+                    content_type, data = "text/plain; version=0.0.4", payload.encode("utf-8")
+                else:
+                    content_type, data = "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        # Every model stays resident for the lifetime of the server
+        await asyncio.get_running_loop().run_in_executor(None, self.pipeline.warm, True)
+        model_registry.print_report()
+        for batcher in (self.encoder, self.gate, self.classifier, self.sentiment, self.generator):
+            batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🚀 QA server listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    tracing.configure(sample_rate=tracing.ENTRY_SAMPLE_RATE)
+    asyncio.run(QAServer().serve())
@@ -0,0 +1,291 @@
+"""Clustered relevance gate over the generated-question bank.
+
+A question counts as course-related when its best cosine similarity to a
+generated question reaches ``GATE_THRESHOLD``. Scanning all ~21k generated
+questions per query does a lot of redundant work, because the bank is full of
+near-duplicates. The offline build (``build_question_gate``):
+
+* drops exact duplicates (case and whitespace insensitive);
+* clusters the question embeddings with spherical mini-batch k-means
+  (``utils.cluster_summary``);
+* drops near-duplicates inside every cluster (cosine >= ``DEDUP_THRESHOLD``
+  to a question already kept);
+* writes the surviving embeddings grouped by cluster (in
+  ``utils.compact_embeddings.EMBEDDING_DTYPE``), one centroid per cluster,
+  its radius (the lowest member similarity to the centroid) and the largest
+  stored member norm to ``data/processed/question_gate/``.
+
+``QuestionGate`` compares a query with the centroids first. The radius
+bounds the best similarity any member of a cluster can reach, so clusters
+are visited best bound first, and the search stops as soon as:
+
+* no unvisited cluster can beat the best score found (the max is exact);
+* or, for the gate, the decision is known: a member reached the threshold,
+  or no unvisited cluster can reach it.
+
+Above ``ANN_MIN_CENTROIDS`` clusters, the ``PROBE_CLUSTERS`` nearest
+centroids come from a small HNSW index (``utils.ann_index``) and the bound
+check is skipped. ``gate_report`` checks accuracy and latency against the
+exact full scan on the notebook's course / non-course questions.
+
+Build it with ``python -m utils.question_gate`` from the repository root (it is
+also rebuilt on first use whenever the question bank changes).
+"""
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from utils.review_store import load_array, save_array
+from utils.cluster_summary import minibatch_kmeans
+from utils.ann_index import build_index, search as index_search
+from utils.tracing import span
+from utils.compact_embeddings import EMBEDDING_DTYPE, save_embeddings, load_embeddings
+
+GATE_DIR = "data/processed/question_gate"
+GENERATED_QUESTIONS_PATH = "data/intermediate/generated_questions.txt"
+GATE_THRESHOLD = 0.7  # min similarity to a generated question to count as course-related
+DEDUP_THRESHOLD = 0.95  # questions at least this similar to a kept one are dropped
+QUESTIONS_PER_CLUSTER = 64  # average cluster size the number of clusters is chosen for
+ANN_MIN_CENTROIDS = 4096  # above this many clusters, centroids are probed through HNSW
+PROBE_CLUSTERS = 32  # clusters visited per query in HNSW mode
+
+# Course / non-course questions of the notebook's gate evaluation (1 = course-related)
+GATE_EVAL_SET = [
+    ("How was the instructor’s teaching?", 1),
+    ("Was the course content clear?", 1),
+    ("How effective were the assignments and projects?", 1),
+    ("Would you recommend it?", 1),
+    ("Were videos easy to follow?", 1),
+    ("How well did the instructor explain complex topics?", 1),
+    ("Were the assignments helpful for practice?", 1),
+    ("Was the course organized and easy to navigate?", 1),
+    ("Did you find the learning platform user-friendly?", 1),
+    ("What improvements would you suggest for this course?", 1),
+    ("What’s your hobby?", 0),
+    ("Do you like music?", 0),
+    ("How are you?", 0),
+    ("Beach or mountains?", 0),
+    ("What do you enjoy doing in your free time?", 0),
+    ("Have you traveled anywhere interesting recently?", 0),
+    ("What’s your favorite way to relax after studying or working?", 0),
+    ("Is there a skill you'd love to master one day?", 0),
+    ("Do you prefer reading books or watching shows?", 0),
+    ("Favorite movie?", 0),
+]
+
+
+def load_generated_questions(path=GENERATED_QUESTIONS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _bank_digest(questions, model_name):
+    payload = json.dumps([model_name, questions], ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _dedupe_cluster(embeddings, threshold):
+    """Positions of the members kept by a greedy near-duplicate pass (first occurrence wins)."""
+    kept = []
+    for i in range(len(embeddings)):
+        if not kept or (embeddings[kept] @ embeddings[i]).max() < threshold:
+            kept.append(i)
+    return np.array(kept, dtype=np.int64)
+
+
+def build_question_gate(questions, model, cache, out_dir=GATE_DIR, dedup_threshold=DEDUP_THRESHOLD,
+                        questions_per_cluster=QUESTIONS_PER_CLUSTER, seed=0, dtype=EMBEDDING_DTYPE):
+    """Deduplicate and cluster the question bank and write the gate arrays."""
+    digest = _bank_digest(questions, cache.model_name)
+    seen, unique = set(), []
+    for question in questions:
+        key = " ".join(question.lower().split())
+        if key not in seen:
+            seen.add(key)
+            unique.append(question)
+    print(f"⚙️ Clustering {len(unique)} unique generated question(s) ({len(questions) - len(unique)} exact duplicates)...")
+    embeddings = np.asarray(cache.encode(unique, model), dtype=np.float32)
+
+    k = max(1, min(len(unique), len(unique) // questions_per_cluster))
+    _, labels = minibatch_kmeans(embeddings, k, seed=seed)
+
+    members, offsets = [], [0]
+    for cluster in range(k):
+        positions = np.flatnonzero(labels == cluster)
+        if not len(positions):
+            continue
+        positions = positions[_dedupe_cluster(embeddings[positions], dedup_threshold)]
+        members.append(positions)
+        offsets.append(offsets[-1] + len(positions))
+    order = np.concatenate(members)
+
+    os.makedirs(out_dir, exist_ok=True)
+    stored = save_embeddings(os.path.join(out_dir, "embeddings.npy"), embeddings[order], dtype)
+    # Bounds are computed on the stored (possibly quantized) vectors, which is what queries are scored against
+    centroids, radius, norm = [], [], []
+    for lo, hi in zip(offsets[:-1], offsets[1:]):
+        vectors = stored[lo:hi]
+        lengths = np.linalg.norm(vectors, axis=1) + 1e-12
+        centroid = embeddings[order[lo:hi]].mean(axis=0)
+        centroid /= np.linalg.norm(centroid) + 1e-12
+        centroids.append(centroid)
+        radius.append(float((vectors @ centroid / lengths).min()))
+        norm.append(float(lengths.max()))
+    save_array(os.path.join(out_dir, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    save_array(os.path.join(out_dir, "centroids.npy"), np.array(centroids, dtype=np.float32))
+    save_array(os.path.join(out_dir, "radius.npy"), np.array(radius, dtype=np.float32))
+    save_array(os.path.join(out_dir, "norm.npy"), np.array(norm, dtype=np.float32))
+    with open(os.path.join(out_dir, "questions.json"), "w", encoding="utf-8") as f:
+        json.dump([unique[i] for i in order], f, ensure_ascii=False)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"bank": digest, "model_name": cache.model_name, "questions": len(questions),
+                   "unique": len(unique), "kept": int(len(order)), "clusters": len(centroids),
+                   "dedup_threshold": dedup_threshold, "dtype": dtype}, f)
+    print(f"✅ Question gate written to {out_dir} ({len(order)} {dtype} question(s) in {len(centroids)} cluster(s)).")
+
+
+class QuestionGate:
+    """Best similarity of questions to the deduplicated, clustered question bank."""
+
+    def __init__(self, path=GATE_DIR):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "questions.json"), "r", encoding="utf-8") as f:
+            self.questions = json.load(f)
+        self.embeddings = load_embeddings(os.path.join(path, "embeddings.npy"))
+        self.offsets = np.asarray(load_array(os.path.join(path, "offsets.npy")))
+        self.centroids = np.asarray(load_array(os.path.join(path, "centroids.npy")))
+        # Angular radius of each cluster: no member is further from its centroid
+        self.radius_angle = np.arccos(np.clip(np.asarray(load_array(os.path.join(path, "radius.npy"))), -1.0, 1.0))
+        self.norm = np.asarray(load_array(os.path.join(path, "norm.npy")))
+        self.index = build_index(self.centroids, "hnsw") if len(self.centroids) > ANN_MIN_CENTROIDS else None
+        self.visited = 0  # member rows scored so far (for reports)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _candidates(self, queries):
+        """(clusters to visit, upper bound per cluster) for every query, best bound first."""
+        if self.index is not None:
+            _, ids = index_search(self.index, queries, min(PROBE_CLUSTERS, len(self.centroids)))
+            return [(row_ids[row_ids >= 0], np.full(len(row_ids), np.inf)) for row_ids in ids]
+        sims = queries @ self.centroids.T
+        # norm * cos(angle(q, c) - radius) bounds the similarity of q to any member of the cluster
+        angles = np.maximum(np.arccos(np.clip(sims, -1.0, 1.0)) - self.radius_angle, 0.0)
+        bounds = np.cos(angles) * self.norm + 1e-4
+        return [(np.argsort(-b, kind="stable"), np.sort(b)[::-1]) for b in bounds]
+
+    def search(self, queries, top_n=1, stop_at=None):
+        """[[(question, score)]] of the ``top_n`` most similar bank questions per query, best first.
+
+        With ``stop_at`` a query stops once its best score is known to be on
+        one side of it: a score reached it, or no unvisited cluster can. The
+        best score found is then not necessarily the max.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+        results = []
+        for query, (clusters, bounds) in zip(queries, self._candidates(queries)):
+            ids, scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            for cluster, bound in zip(clusters, bounds):
+                if (len(scores) == top_n and bound <= scores[-1]) or (stop_at is not None and bound < stop_at):
+                    break
+                lo, hi = self.offsets[cluster], self.offsets[cluster + 1]
+                cluster_scores = self.embeddings.dot(query, rows=slice(lo, hi))
+                self.visited += hi - lo
+                ids = np.concatenate([ids, np.arange(lo, hi)])
+                scores = np.concatenate([scores, cluster_scores])
+                keep = np.argsort(-scores, kind="stable")[:top_n]
+                ids, scores = ids[keep], scores[keep]
+                if stop_at is not None and scores[0] >= stop_at:
+                    break
+            results.append([(self.questions[i], float(s)) for i, s in zip(ids, scores)])
+        return results
+
+    def _best(self, queries, stop_at):
+        return np.array([matches[0][1] if matches else 0.0 for matches in self.search(queries, 1, stop_at)],
+                        dtype=np.float32)
+
+    def max_similarity(self, queries, stop_at=GATE_THRESHOLD):
+        """Best similarity per query; only exact on both sides of ``stop_at`` when it is None."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with span("gate", batch_size=len(queries), bank=len(self)):
+            return self._best(queries, stop_at)
+
+    def is_related(self, queries, threshold=GATE_THRESHOLD):
+        return self.max_similarity(queries, stop_at=threshold) >= threshold
+
+
+def open_question_gate(model, cache, path=GATE_DIR, source=GENERATED_QUESTIONS_PATH, dtype=EMBEDDING_DTYPE):
+    """Load the gate, (re)building it if the question bank, the model or the dtype changed; None without a bank."""
+    questions = load_generated_questions(source)
+    if not questions:
+        return None
+    meta_path = os.path.join(path, "meta.json")
+    stale = True
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stale = meta["bank"] != _bank_digest(questions, cache.model_name) or meta.get("dtype") != dtype
+    if stale:
+        build_question_gate(questions, model, cache, path, dtype=dtype)
+    return QuestionGate(path)
+
+
+# ------------------------------
+# Evaluation
+# ------------------------------
+def gate_report(gate, model, cache, eval_set=GATE_EVAL_SET, threshold=GATE_THRESHOLD, source=GENERATED_QUESTIONS_PATH,
+                repeats=20):
+    """Accuracy and latency of the full-bank scan vs the clustered gate (exact and early exit)."""
+    questions = [q for q, _ in eval_set]
+    labels = np.array([label for _, label in eval_set])
+    queries = model.encode(questions, convert_to_numpy=True, normalize_embeddings=True)
+    bank = np.asarray(cache.encode(load_generated_questions(source), model), dtype=np.float32)
+
+    variants = {
+        "full scan": (lambda q: (bank @ q.T).max(axis=0), len(bank), "float32"),
+        "clustered (exact max)": (lambda q: gate._best(q, None), len(gate), gate.embeddings.dtype),
+        "clustered (early exit)": (lambda q: gate._best(q, threshold), len(gate), gate.embeddings.dtype),
+    }
+    rows = []
+    reference = None
+    for name, (score, bank_size, dtype) in variants.items():
+        visited = gate.visited
+        start = time.perf_counter()
+        for _ in range(repeats):
+            scores = np.concatenate([score(query[None, :]) for query in queries])
+        latency_ms = (time.perf_counter() - start) * 1000 / (repeats * len(queries))
+        predictions = (scores >= threshold).astype(int)
+        reference = predictions if reference is None else reference
+        rows.append({
+            "gate": name,
+            "bank": bank_size,
+            "dtype": dtype,
+            "accuracy": float((predictions == labels).mean()),
+            "agreement": float((predictions == reference).mean()),
+            "ms_per_question": latency_ms,
+            "rows_scored": bank_size if name == "full scan" else (gate.visited - visited) / (repeats * len(queries)),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from utils import model_registry
+    from utils.embedding_cache import EmbeddingCache
+    from utils.inference_backend import variant_name
+
+    model = model_registry.get("sbert")
+    cache = EmbeddingCache(variant_name(model_registry.SBERT_MODEL))
+    gate = open_question_gate(model, cache)
+    if gate is None:
+        print("⚠️ No 'generated_questions.txt' found or it's empty!")
+    else:
+        print(f"\n📊 Gate on {len(GATE_EVAL_SET)} course / non-course questions (threshold {GATE_THRESHOLD}):")
+        print(gate_report(gate, model, cache).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
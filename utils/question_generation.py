@@ -1,47 +1,190 @@
 import os
-from transformers import pipeline
+import json
+import numpy as np
+from collections import deque
+from multiprocessing import get_context
 from tqdm import tqdm
-
-# Load question generation pipeline
-qg_pipeline = pipeline("text2text-generation", model="valhalla/t5-base-qg-hl")
+from utils.review_store import text_hash
 
 # Folder containing review text files
-reviews_folder = "reviews"
+reviews_folder = "data/reviews"
 
 # Output file to store only questions
-output_path = "generated_questions.txt"
-
-# Ensure clean start
-with open(output_path, "w", encoding="utf-8") as f:
-    f.write("Generated Questions:\n\n")
-
-# Collect all file paths first for tqdm to work
-all_files = []
-for root, dirs, files in os.walk(reviews_folder):
-    for filename in files:
-        if filename.endswith(".txt"):
-            all_files.append(os.path.join(root, filename))
-
-# Process files with progress bar
-for filepath in tqdm(all_files, desc="🔍 Processing review files"):
-    with open(filepath, "r", encoding="utf-8") as review_file:
-        lines = review_file.readlines()
-
-    for line in tqdm(lines, desc=f"✏️ Generating questions from {os.path.basename(filepath)}", leave=False):
-        line = line.strip()
-        if not line:
-            continue
-
-        try:
-            # Generate question(s)
-            question_output = qg_pipeline(line, max_length=128, num_return_sequences=1)
-
-            # Write only questions
-            with open(output_path, "a", encoding="utf-8") as out_f:
-                for q in question_output:
-                    out_f.write(f"{q['generated_text']}\n")
-
-        except Exception as e:
-            print(f"❌ Error generating question from: {line[:60]}... | {e}")
-
-print(f"\n✅ All questions saved to: {output_path}")
+output_path = "data/intermediate/generated_questions.txt"
+
+# Checkpoint manifest (per-file progress) and hashes of inputs already processed
+manifest_path = "data/intermediate/question_generation.manifest.json"
+seen_inputs_path = "data/intermediate/question_generation.inputs.npy"
+
+NUM_WORKERS = 2  # QG model replicas; use 1 on a single GPU
+BATCH_SIZE = 16  # review lines per forward pass
+CHECKPOINT_EVERY = 20  # batches between manifest saves
+
+
+def is_proper_question(text):
+    """Keep only generated lines that are actual questions."""
+    return text.strip().endswith("?")
+
+
+# ------------------------------
+# Worker side: one QG pipeline per process
+# ------------------------------
+_qg_pipeline = None
+
+
+def _init_worker():
+    global _qg_pipeline
+    from utils import model_registry
+    _qg_pipeline = model_registry.get("qg")
+
+
+def _generate(lines):
+    """Generate questions for a batch of review lines (falls back to one-by-one on errors)."""
+    try:
+        outputs = _qg_pipeline(lines, max_length=128, num_return_sequences=1, batch_size=len(lines))
+    except Exception:
+        outputs = []
+        for line in lines:
+            try:
+                outputs.append(_qg_pipeline(line, max_length=128, num_return_sequences=1))
+            except Exception as e:
+                print(f"❌ Error generating question from: {line[:60]}... | {e}")
+                outputs.append([])
+    questions = []
+    for output in outputs:
+        for q in output if isinstance(output, list) else [output]:
+            questions.append(q["generated_text"].strip())
+    return questions
+
+
+# ------------------------------
+# Main process: streaming, dedupe, checkpointing
+# ------------------------------
+def load_checkpoint():
+    """Return (per-file line offsets, set of processed input hashes)."""
+    progress = {}
+    seen_inputs = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            progress = json.load(f)["files"]
+        if os.path.exists(seen_inputs_path):
+            seen_inputs = set(np.load(seen_inputs_path).tolist())
+    return progress, seen_inputs
+
+
+def save_checkpoint(progress, seen_inputs):
+    np.save(seen_inputs_path + ".tmp.npy", np.fromiter(seen_inputs, dtype=np.uint64, count=len(seen_inputs)))
+    os.replace(seen_inputs_path + ".tmp.npy", seen_inputs_path)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"files": progress}, f, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def requeue(line_offsets):
+    """Reopen finished review files so the next run picks up the lines past ``{filepath: lines already seen}``."""
+    progress, seen_inputs = load_checkpoint()
+    reopened = [f for f in line_offsets if progress.get(f) == "done"]
+    for filepath in reopened:
+        progress[filepath] = line_offsets[filepath]
+    if reopened:
+        save_checkpoint(progress, seen_inputs)
+    return len(reopened)
+
+
+def stream_batches(all_files, progress, seen_inputs):
+    """Yield (filepath, line number reached, lines, line hashes), skipping finished and duplicate lines."""
+    queued = set(seen_inputs)
+    for filepath in all_files:
+        line_no = progress.get(filepath, 0)
+        batch, hashes = [], []
+        with open(filepath, "r", encoding="utf-8") as review_file:
+            for current, line in enumerate(review_file, start=1):
+                if current <= line_no:
+                    continue
+                line_no = current
+                line = line.strip()
+                h = text_hash(line)
+                if line and h not in queued:
+                    queued.add(h)
+                    batch.append(line)
+                    hashes.append(h)
+                if len(batch) == BATCH_SIZE:
+                    yield filepath, line_no, batch, hashes
+                    batch, hashes = [], []
+        yield filepath, line_no, batch, hashes
+
+
+class _Done:
+    """Stand-in result for batches with no lines left to generate from."""
+
+    def get(self):
+        return []
+
+
+def main():
+    # Collect all file paths first for tqdm to work
+    all_files = []
+    for root, dirs, files in os.walk(reviews_folder):
+        for filename in files:
+            if filename.endswith(".txt"):
+                all_files.append(os.path.join(root, filename))
+    all_files.sort()
+
+    progress, seen_inputs = load_checkpoint()
+    if not progress and os.path.exists(output_path):
+        # No checkpoint means a fresh run: start from an empty output file
+        os.remove(output_path)
+
+    # Questions already written (from an interrupted run) are not written again
+    seen_outputs = set()
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            seen_outputs = {line.strip() for line in f if line.strip()}
+
+    remaining = [f for f in all_files if progress.get(f) != "done"]
+    print(f"🔍 {len(all_files) - len(remaining)} file(s) already finished, {len(remaining)} to process")
+    offsets = {f: n for f, n in progress.items() if n != "done"}
+
+    written = 0
+    handled = 0
+    ctx = get_context("spawn")
+    with ctx.Pool(NUM_WORKERS, initializer=_init_worker) as pool, \
+            open(output_path, "a", encoding="utf-8", buffering=1 << 20) as out_f, \
+            tqdm(desc="✏️ Generating questions", unit="batch") as pbar:
+
+        def handle(filepath, line_no, hashes, result):
+            # Batches are handled in submission order, so the checkpoint always covers a prefix of the work
+            nonlocal written, handled
+            for q in result.get():
+                if is_proper_question(q) and q not in seen_outputs:
+                    seen_outputs.add(q)
+                    out_f.write(f"{q}\n")
+                    written += 1
+            seen_inputs.update(hashes)
+            progress[filepath] = line_no
+            handled += 1
+            pbar.update(1)
+            if handled % CHECKPOINT_EVERY == 0:
+                out_f.flush()
+                save_checkpoint(progress, seen_inputs)
+
+        # A bounded window of in-flight batches keeps memory flat while streaming
+        pending = deque()
+        for filepath, line_no, lines, hashes in stream_batches(remaining, offsets, seen_inputs):
+            result = pool.apply_async(_generate, (lines,)) if lines else _Done()
+            pending.append((filepath, line_no, hashes, result))
+            if len(pending) >= NUM_WORKERS * 4:
+                handle(*pending.popleft())
+        while pending:
+            handle(*pending.popleft())
+
+        out_f.flush()
+        for filepath in remaining:
+            progress[filepath] = "done"
+        save_checkpoint(progress, seen_inputs)
+
+    print(f"\n✅ {written} new question(s) saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Precomputed course-to-course recommendations.
+
+Every course gets one profile vector: the mean of its (normalized) review
+embeddings from ``utils.course_embeddings``, followed by its RoBERTa
+negative/neutral/positive shares and its 1-5 star rating distribution
+(weighted by ``SENTIMENT_WEIGHT`` / ``RATING_WEIGHT``). The build writes the
+profiles, per-course statistics and a top-``TOP_K`` neighbour table to
+``data/processed/recommender/``. Neighbours are exact for small catalogs and
+come from an HNSW index (``utils.ann_index``) above ``ANN_MIN_COURSES``
+courses.
+
+``Recommender`` answers from these arrays only (no review is re-encoded):
+
+* ``similar``: courses like X (a table lookup);
+* ``best_for_topic``: best-rated courses for a topic embedding (one
+  ``courses x dim`` product);
+* ``compare``: side-by-side statistics and similarity of two courses.
+
+When reviews are appended to the store (``utils.ingest``),
+``update_recommender`` recomputes the statistics and centroids of the courses
+that gained reviews only, then refreshes the neighbour table.
+
+Build it with ``python -m utils.recommender`` from the repository root (after
+``utils.course_embeddings`` and ``utils.sentiment_engine``).
+"""
+
+import os
+import json
+import numpy as np
+from utils.review_store import open_review_store, load_array, save_array
+from utils.course_embeddings import CourseRetriever
+from utils.sentiment_engine import SentimentStore, SENTIMENT_DIR, ROBERTA_COLUMNS, SENTIMENT_LABELS
+from utils.ann_index import build_index, search as index_search
+
+RECOMMENDER_DIR = "data/processed/recommender"
+TOP_K = 20  # neighbours kept per course
+ANN_MIN_COURSES = 5000  # exact all-pairs similarity below this many courses, HNSW above
+SENTIMENT_WEIGHT = 0.35
+RATING_WEIGHT = 0.35
+TOPIC_THRESHOLD = 0.3  # min similarity of a course's review centroid to a topic
+MIN_REVIEWS = 5  # courses with fewer reviews are not ranked by rating
+PRIOR_REVIEWS = 20  # ratings are shrunk towards the catalog mean as if by this many average reviews
+
+
+def course_statistics(store, sentiment_store=None, courses=None):
+    """Per-course review count, rating distribution/mean and mean RoBERTa shares, in ``store.groups()`` order
+    (or for the given (institution, course) pairs)."""
+    groups = store.groups() if courses is None else ((inst, name, store.row_ids(inst, name)) for inst, name in courses)
+    stats = []
+    for institution, course, row_ids in groups:
+        ratings = np.asarray(store.rating[row_ids])
+        ratings = ratings[~np.isnan(ratings)]
+        stars = np.clip(np.rint(ratings).astype(np.int64), 1, 5)
+        distribution = np.bincount(stars - 1, minlength=5) / max(len(stars), 1)
+        entry = {
+            "institution": institution,
+            "course": course,
+            "reviews": int(len(row_ids)),
+            "mean_rating": float(ratings.mean()) if len(ratings) else None,
+            "rating_distribution": [float(p) for p in distribution],
+            "sentiment": None,
+        }
+        if sentiment_store is not None and len(row_ids):
+            shares = [float(np.mean(sentiment_store.columns[c][row_ids])) for c in ROBERTA_COLUMNS]
+            entry["sentiment"] = dict(zip(SENTIMENT_LABELS, shares))
+        stats.append(entry)
+    return stats
+
+
+def build_profiles(topics, stats):
+    """Unit-length profile per course: review centroid + weighted sentiment shares + weighted rating distribution."""
+    sentiment = np.array([[s["sentiment"][label] for label in SENTIMENT_LABELS] if s["sentiment"] else [0.0] * 3
+                          for s in stats], dtype=np.float32)
+    ratings = np.array([s["rating_distribution"] for s in stats], dtype=np.float32)
+    profiles = np.hstack([topics, SENTIMENT_WEIGHT * sentiment, RATING_WEIGHT * ratings]).astype(np.float32)
+    return profiles / (np.linalg.norm(profiles, axis=1, keepdims=True) + 1e-12)
+
+
+def nearest_neighbours(profiles, top_k=TOP_K):
+    """(ids, scores) of the ``top_k`` most similar other courses, best first."""
+    n = len(profiles)
+    k = min(top_k, n - 1)
+    if k <= 0:
+        return np.zeros((n, 0), dtype=np.int32), np.zeros((n, 0), dtype=np.float32)
+    if n <= ANN_MIN_COURSES:
+        similarities = profiles @ profiles.T
+        np.fill_diagonal(similarities, -np.inf)
+        ids = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarities, ids, axis=1)
+    else:
+        scores, ids = index_search(build_index(profiles, "hnsw"), profiles, k + 1)
+        # Drop each course itself from its own result list
+        keep = ids != np.arange(n)[:, None]
+        ids = np.array([row[mask][:k] for row, mask in zip(ids, keep)])
+        scores = np.array([row[mask][:k] for row, mask in zip(scores, keep)])
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(ids, order, axis=1).astype(np.int32), np.take_along_axis(scores, order, axis=1).astype(np.float32)
+
+
+def course_topics(retriever, stats):
+    """Normalized review-embedding centroid of every course in ``stats`` (zeros for courses without reviews)."""
+    topics = []
+    for entry in stats:
+        _, matrix = retriever.matrix(entry["institution"], entry["course"])
+        centroid = matrix.mean() if len(matrix) else None
+        topics.append(centroid)
+    dim = next((len(t) for t in topics if t is not None), 0)
+    topics = np.stack([t if t is not None else np.zeros(dim, dtype=np.float32) for t in topics])
+    return topics / (np.linalg.norm(topics, axis=1, keepdims=True) + 1e-12)
+
+
+def _save(store, stats, topics, model_name, out_dir, top_k):
+    profiles = build_profiles(topics, stats)
+    neighbours, scores = nearest_neighbours(profiles, top_k)
+
+    os.makedirs(out_dir, exist_ok=True)
+    save_array(os.path.join(out_dir, "topics.npy"), topics.astype(np.float32))
+    save_array(os.path.join(out_dir, "profiles.npy"), profiles)
+    save_array(os.path.join(out_dir, "neighbours.npy"), neighbours)
+    save_array(os.path.join(out_dir, "neighbour_scores.npy"), scores)
+    with open(os.path.join(out_dir, "courses.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"store": store.store_digest(), "model_name": model_name, "top_k": top_k}, f)
+
+
+def build_recommender(store, retriever=None, sentiment_store=None, out_dir=RECOMMENDER_DIR, top_k=TOP_K):
+    """Compute course profiles and the neighbour table from precomputed embeddings and sentiment."""
+    retriever = retriever or CourseRetriever(store)
+    stats = course_statistics(store, sentiment_store)
+    _save(store, stats, course_topics(retriever, stats), retriever.model_name, out_dir, top_k)
+    print(f"✅ Recommendations for {len(stats)} course(s) written to {out_dir}")
+
+
+def update_recommender(store, start, courses, retriever=None, sentiment_store=None, out_dir=RECOMMENDER_DIR,
+                       top_k=TOP_K):
+    """Refresh the courses that gained reviews since the store had ``start`` rows, then the neighbour table.
+
+    Falls back to ``build_recommender`` if the persisted recommender was not built from exactly those rows.
+    """
+    retriever = retriever or CourseRetriever(store)
+    meta_path = os.path.join(out_dir, "meta.json")
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    if meta is None or meta["store"] != store.store_digest(start) or meta["model_name"] != retriever.model_name:
+        build_recommender(store, retriever, sentiment_store, out_dir, top_k)
+        return
+
+    current = Recommender(out_dir)
+    stats = list(current.courses)
+    topics = np.array(current.topics, dtype=np.float32)
+    changed = course_statistics(store, sentiment_store, courses)
+    changed_topics = course_topics(retriever, changed)
+    for entry, topic in zip(changed, changed_topics):
+        key = (entry["institution"], entry["course"])
+        if key in current.positions:
+            stats[current.positions[key]] = entry
+            topics[current.positions[key]] = topic
+        else:
+            stats.append(entry)
+            topics = np.vstack([topics, topic[None, :]])
+    _save(store, stats, topics, retriever.model_name, out_dir, top_k)
+    print(f"✅ Recommendations refreshed for {len(changed)} course(s), {len(stats)} total.")
+
+
+class Recommender:
+    """Course recommendations answered from the precomputed profiles and neighbour table."""
+
+    def __init__(self, path=RECOMMENDER_DIR):
+        self.path = path
+        with open(os.path.join(path, "courses.json"), "r", encoding="utf-8") as f:
+            self.courses = json.load(f)
+        self.positions = {(c["institution"], c["course"]): i for i, c in enumerate(self.courses)}
+        self.topics = np.asarray(load_array(os.path.join(path, "topics.npy")))
+        self.profiles = np.asarray(load_array(os.path.join(path, "profiles.npy")))
+        self.neighbours = np.asarray(load_array(os.path.join(path, "neighbours.npy")))
+        self.neighbour_scores = np.asarray(load_array(os.path.join(path, "neighbour_scores.npy")))
+
+        ratings = np.array([c["mean_rating"] if c["mean_rating"] is not None else np.nan for c in self.courses])
+        counts = np.array([c["reviews"] for c in self.courses], dtype=np.float64)
+        prior = float(np.nanmean(ratings)) if np.isfinite(ratings).any() else 0.0
+        # Bayesian average: a course needs many reviews before a perfect mean outranks well-established courses
+        self.adjusted_rating = (np.nan_to_num(ratings, nan=prior) * counts + prior * PRIOR_REVIEWS) / (counts + PRIOR_REVIEWS)
+        self.review_counts = counts
+
+    def _position(self, institution, course):
+        if (institution, course) not in self.positions:
+            raise KeyError(f"Unknown course '{course}' ({institution})")
+        return self.positions[(institution, course)]
+
+    def _entry(self, i, **extra):
+        c = self.courses[i]
+        return {"institution": c["institution"], "course": c["course"], "reviews": c["reviews"],
+                "mean_rating": c["mean_rating"], **extra}
+
+    def similar(self, institution, course, k=10):
+        """Courses most like the given one (profile cosine similarity)."""
+        i = self._position(institution, course)
+        return [self._entry(int(j), similarity=float(score))
+                for j, score in zip(self.neighbours[i][:k], self.neighbour_scores[i][:k])]
+
+    def best_for_topic(self, topic_embedding, k=10, threshold=TOPIC_THRESHOLD, min_reviews=MIN_REVIEWS):
+        """Best-rated courses whose reviews are about a topic (``topic_embedding`` from the Sentence-BERT model)."""
+        query = np.asarray(topic_embedding, dtype=np.float32).reshape(-1)
+        relevance = self.topics @ (query / (np.linalg.norm(query) or 1.0))
+        candidates = np.flatnonzero((relevance >= threshold) & (self.review_counts >= min_reviews))
+        order = candidates[np.lexsort((-relevance[candidates], -self.adjusted_rating[candidates]))][:k]
+        return [self._entry(int(i), relevance=float(relevance[i]), adjusted_rating=float(self.adjusted_rating[i]))
+                for i in order]
+
+    def compare(self, first, second):
+        """Side-by-side statistics of two ``(institution, course)`` pairs and how similar they are."""
+        i, j = self._position(*first), self._position(*second)
+        return {
+            "courses": [self.courses[i], self.courses[j]],
+            "similarity": float(self.profiles[i] @ self.profiles[j]),
+            "topic_similarity": float(self.topics[i] @ self.topics[j]),
+            "better_rated": self.courses[i]["course"] if self.adjusted_rating[i] >= self.adjusted_rating[j]
+            else self.courses[j]["course"],
+        }
+
+
+def open_recommender(store, path=RECOMMENDER_DIR):
+    """The persisted recommender, or None if it was never built or the review store changed since."""
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        if json.load(f)["store"] != store.store_digest():
+            return None
+    return Recommender(path)
+
+
+if __name__ == "__main__":
+    store = open_review_store()
+    sentiment_store = SentimentStore() if os.path.exists(os.path.join(SENTIMENT_DIR, "hash.npy")) else None
+    if sentiment_store is None:
+        print("⚠️ No sentiment store found; profiles use embeddings and ratings only.")
+    build_recommender(store, sentiment_store=sentiment_store)
@@ -0,0 +1,406 @@
+"""Columnar, memory-mapped review store.
+
+The store is built once from ``data/processed/data.pkl``: reviews are
+deduplicated, sorted by (institution, course) and written as one ``.npy`` file
+per column, so every process can ``np.load(..., mmap_mode="r")`` them and share
+pages. Variable-length text columns are kept as a UTF-8 byte blob plus an
+offsets array. ``index.json`` maps every (institution, course) pair to its
+row range, so fetching a course touches only that course's rows.
+
+New reviews are appended in place by ``append_reviews`` (see ``utils.ingest``):
+each batch becomes a segment at the end of every column, so a course that
+gains reviews owns one row range per segment. ``index.json`` is rewritten last
+and records the committed row count, so readers never see a half-written batch.
+
+Build it with ``python -m utils.review_store`` from the repository root.
+"""
+
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import numpy as np
+
+DATA_PKL = "data/processed/data.pkl"
+STORE_DIR = "data/processed/review_store"
+INGESTED_PATH = "data/processed/ingested_reviews.jsonl"  # appended batches, replayed when the store is rebuilt
+
+TEXT_COLUMNS = ["reviews", "reviewers", "date_reviews", "course_id"]
+FORMAT_VERSION = 1
+
+
+def text_hash(text):
+    """Stable 64-bit content hash of a piece of text."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _clean(value):
+    """Turn a DataFrame cell into a string ('' for missing values)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return str(value)
+
+
+def load_array(path):
+    """Memory-map an .npy file (zero-length arrays cannot be mapped)."""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path)
+
+
+def save_array(path, array):
+    """Write an .npy file atomically so readers never see a partial file."""
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def append_array(path, values, length=None):
+    """Append rows to an .npy file in place, keeping only its first ``length`` rows (default: all).
+
+    ``np.save`` pads the header so the row count can grow without moving the
+    data; the header is rewritten after the new rows are on disk. Falls back to
+    a full atomic rewrite if the header has no room left.
+    """
+    values = np.ascontiguousarray(values)
+    if not _append_in_place(path, values, length):
+        current = np.load(path)
+        current = current[:length] if length is not None else current
+        save_array(path, np.concatenate([current, values.astype(current.dtype)]))
+
+
+def _append_in_place(path, values, length):
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        data_offset = f.tell()
+        length = shape[0] if length is None else length
+        new_shape = (length + len(values),) + tuple(shape[1:])
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(dtype), new_shape)
+        prefix = 10 if version == (1, 0) else 12
+        if fortran_order or values.dtype != dtype or values.shape[1:] != tuple(shape[1:]) \
+                or len(header) + 1 > data_offset - prefix:
+            return False
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        f.seek(data_offset + length * row_bytes)
+        f.write(values.tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(prefix)
+        f.write((header.ljust(data_offset - prefix - 1) + "\n").encode("latin1"))
+    return True
+
+
+def _save_text_column(directory, name, values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    np.save(os.path.join(directory, f"{name}.bytes.npy"), blob)
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+
+def _append_text_column(directory, name, values, rows):
+    """Append strings to a blob + offsets column that has ``rows`` committed rows."""
+    offsets_path = os.path.join(directory, f"{name}.offsets.npy")
+    committed = np.load(offsets_path, mmap_mode="r")[:rows + 1]
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.empty(len(encoded), dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets)
+    offsets += committed[-1]
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    # Blob first, offsets second: the new offsets only ever point at bytes already written
+    append_array(os.path.join(directory, f"{name}.bytes.npy"), blob, int(committed[-1]))
+    append_array(offsets_path, offsets, rows + 1)
+
+
+class TextColumn:
+    """Read-only view over a blob + offsets string column."""
+
+    def __init__(self, directory, name, rows=None):
+        self.blob = load_array(os.path.join(directory, f"{name}.bytes.npy"))
+        self.offsets = load_array(os.path.join(directory, f"{name}.offsets.npy"))
+        if rows is not None:
+            self.offsets = self.offsets[:rows + 1]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def take(self, row_ids):
+        return [self[i] for i in row_ids]
+
+
+def _prepare(df):
+    """Drop missing and duplicate reviews, clean the course keys and sort by (institution, course)."""
+    df = df.drop_duplicates(subset=["reviews"])
+    df = df[df["reviews"].notna()].copy()
+    df["institution"] = df["institution"].map(_clean).str.strip()
+    df["name"] = df["name"].map(_clean).str.strip()
+    # Stable sort keeps the original review order inside every course
+    return df.sort_values(["institution", "name", "course_id"], kind="mergesort").reset_index(drop=True)
+
+
+def _ranges(df, offset=0, first_group=0):
+    """Course ranges ``[[institution, name, start, end]]``, group id per row and course_id ranges of sorted rows."""
+    courses = []
+    group_of_row = np.zeros(len(df), dtype=np.int32)
+    keys = list(zip(df["institution"], df["name"]))
+    start = 0
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[start]:
+            group_of_row[start:i] = first_group + len(courses)
+            courses.append([keys[start][0], keys[start][1], offset + start, offset + i])
+            start = i
+
+    # course_id -> row ranges (contiguous inside each course thanks to the sort)
+    course_ids = {}
+    cids = [_clean(c) for c in df["course_id"]]
+    start = 0
+    for i in range(1, len(cids) + 1):
+        if i == len(cids) or cids[i] != cids[start] or group_of_row[i] != group_of_row[start]:
+            if cids[start]:
+                course_ids.setdefault(cids[start], []).append([offset + start, offset + i])
+            start = i
+    return courses, group_of_row, course_ids
+
+
+def _ratings(df):
+    return np.array([float(r) if _clean(r) else np.nan for r in df["rating"]], dtype=np.float32)
+
+
+def _hashes(df):
+    return np.array([text_hash(_clean(r)) for r in df["reviews"]], dtype=np.uint64)
+
+
+def _write_index(directory, index):
+    path = os.path.join(directory, "index.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def build_review_store(df, out_dir=STORE_DIR):
+    """Deduplicate and sort the review DataFrame, then write it as a store."""
+    raw_rows = len(df)
+    duplicated = df.duplicated(subset=["reviews"], keep=False)
+    duplicate_rows = int(df.duplicated(subset=["reviews"]).sum())
+    duplicate_example = _clean(df.loc[duplicated, "reviews"].iloc[0]) if duplicate_rows else ""
+    df = _prepare(df)
+
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    for column in TEXT_COLUMNS:
+        _save_text_column(tmp_dir, column, [_clean(v) for v in df[column]])
+    np.save(os.path.join(tmp_dir, "rating.npy"), _ratings(df))
+    np.save(os.path.join(tmp_dir, "hash.npy"), _hashes(df))
+    courses, group_of_row, course_ids = _ranges(df)
+    np.save(os.path.join(tmp_dir, "group.npy"), group_of_row)
+
+    index = {
+        "version": FORMAT_VERSION,
+        "rows": len(df),
+        "courses": courses,
+        "course_ids": course_ids,
+        "meta": {
+            "raw_rows": raw_rows,
+            "duplicate_rows": duplicate_rows,
+            "duplicate_example": duplicate_example,
+        },
+    }
+    _write_index(tmp_dir, index)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+
+def append_reviews(df, path=STORE_DIR, ingested_path=INGESTED_PATH):
+    """Append a batch of reviews (data.pkl columns) to an existing store.
+
+    Reviews whose text is already stored, or repeated inside the batch, are
+    dropped. The rest are sorted by course and written as one new segment at
+    the end of every column. Returns ``(start, end, courses)``: the new row
+    range and the sorted (institution, course) pairs that gained reviews.
+    """
+    with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    rows = index["rows"]
+
+    raw_rows = len(df)
+    df = _prepare(df)
+    hashes = _hashes(df)
+    existing = np.sort(np.load(os.path.join(path, "hash.npy"), mmap_mode="r")[:rows])
+    positions = np.minimum(np.searchsorted(existing, hashes), max(len(existing) - 1, 0))
+    known = existing[positions] == hashes if len(existing) else np.zeros(len(hashes), dtype=bool)
+    df, hashes = df[~known].reset_index(drop=True), hashes[~known]
+
+    index["meta"]["raw_rows"] += raw_rows
+    index["meta"]["duplicate_rows"] += raw_rows - len(df)
+    if not len(df):
+        _write_index(path, index)
+        return rows, rows, []
+
+    courses, group_of_row, course_ids = _ranges(df, offset=rows, first_group=len(index["courses"]))
+    for column in TEXT_COLUMNS:
+        _append_text_column(path, column, [_clean(v) for v in df[column]], rows)
+    append_array(os.path.join(path, "rating.npy"), _ratings(df), rows)
+    append_array(os.path.join(path, "hash.npy"), hashes, rows)
+    append_array(os.path.join(path, "group.npy"), group_of_row, rows)
+
+    # Keep the accepted rows so a rebuild from data.pkl does not lose them
+    if ingested_path:
+        with open(ingested_path, "a", encoding="utf-8") as f:
+            df.to_json(f, orient="records", lines=True, force_ascii=False)
+
+    index["rows"] = rows + len(df)
+    index["courses"].extend(courses)
+    for course_id, ranges in course_ids.items():
+        index["course_ids"].setdefault(course_id, []).extend(ranges)
+    _write_index(path, index)
+    return rows, rows + len(df), sorted({(inst, name) for inst, name, _, _ in courses if inst and name})
+
+
+class ReviewStore:
+    """Memory-mapped access to the deduplicated reviews."""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.index_mtime = None
+        self.refresh()
+
+    def refresh(self):
+        """Re-open the store if ``index.json`` changed (e.g. ``utils.ingest`` appended reviews); True if it did."""
+        index_path = os.path.join(self.path, "index.json")
+        mtime = os.stat(index_path).st_mtime_ns
+        if mtime == self.index_mtime:
+            return False
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        rows = index["rows"]
+        # A course owns one range per segment it has reviews in
+        ranges = {}
+        for inst, name, start, end in index["courses"]:
+            ranges.setdefault((inst, name), []).append((start, end))
+
+        # Rows past the committed count belong to an interrupted append.
+        # Row arrays are swapped in before the ranges that point into them.
+        self.columns = {name: TextColumn(self.path, name, rows) for name in TEXT_COLUMNS}
+        self.rating = load_array(os.path.join(self.path, "rating.npy"))[:rows]
+        self.hash = load_array(os.path.join(self.path, "hash.npy"))[:rows]
+        self.group = load_array(os.path.join(self.path, "group.npy"))[:rows]
+        self.meta = index["meta"]
+        self.course_table = index["courses"]
+        self.course_id_ranges = index["course_ids"]
+        self.ranges = ranges
+        self.index_mtime = mtime
+        return True
+
+    def __len__(self):
+        return len(self.rating)
+
+    # ------------------------------
+    # Catalogue
+    # ------------------------------
+    def institutions(self):
+        return sorted({inst for inst, _ in self.ranges if inst})
+
+    def courses(self, institution):
+        return sorted(name for inst, name in self.ranges if inst == institution and name)
+
+    def groups(self):
+        """Yield (institution, course, row_ids) for every course."""
+        for inst, name in self.ranges:
+            if inst and name:
+                yield inst, name, self.row_ids(inst, name)
+
+    def course_of(self, row_id):
+        inst, name, _, _ = self.course_table[self.group[row_id]]
+        return inst, name
+
+    # ------------------------------
+    # Row lookups
+    # ------------------------------
+    def course_ranges(self, institution, course):
+        """The [start, end) row ranges of a course, ascending."""
+        return self.ranges.get((institution, course), [])
+
+    def row_ids(self, institution, course):
+        ranges = self.course_ranges(institution, course)
+        if len(ranges) == 1:
+            return np.arange(*ranges[0])
+        return np.concatenate([np.arange(start, end) for start, end in ranges] or [np.arange(0)])
+
+    def row_ids_for_course_id(self, course_id):
+        ranges = self.course_id_ranges.get(course_id, [])
+        if not ranges:
+            return np.arange(0)
+        return np.concatenate([np.arange(start, end) for start, end in ranges])
+
+    def store_digest(self, rows=None):
+        """Content fingerprint of the first ``rows`` reviews (default: all), for artifacts built from the whole store."""
+        return hashlib.blake2b(np.asarray(self.hash[:rows]).tobytes(), digest_size=16).hexdigest()
+
+    def digest(self, row_ids):
+        """Content fingerprint of a set of reviews, given by row id."""
+        return hashlib.blake2b(np.asarray(self.hash[row_ids]).tobytes(), digest_size=8).hexdigest()
+
+    def course_digest(self, institution, course):
+        """Content fingerprint of a course's review set (changes when its reviews change)."""
+        return self.digest(self.row_ids(institution, course))
+
+    def review(self, row_id):
+        return self.columns["reviews"][row_id]
+
+    def reviews(self, institution, course):
+        return self.columns["reviews"].take(self.row_ids(institution, course))
+
+    def reviews_for_course_id(self, course_id):
+        return self.columns["reviews"].take(self.row_ids_for_course_id(course_id))
+
+    def row(self, row_id):
+        """All fields of one review as a dict (same keys as data.pkl)."""
+        institution, name = self.course_of(row_id)
+        record = {column: self.columns[column][row_id] for column in TEXT_COLUMNS}
+        record.update(name=name, institution=institution, rating=float(self.rating[row_id]))
+        return record
+
+    def frame(self, row_ids):
+        """Materialize the given rows as a pandas DataFrame."""
+        import pandas as pd
+        return pd.DataFrame([self.row(i) for i in row_ids])
+
+
+def open_review_store(path=STORE_DIR, source=DATA_PKL):
+    """Open the store, (re)building it first if data.pkl is newer or it is missing."""
+    index_path = os.path.join(path, "index.json")
+    stale = os.path.exists(source) and (
+        not os.path.exists(index_path) or os.path.getmtime(source) > os.path.getmtime(index_path)
+    )
+    if stale:
+        print(f"⚙️ Building review store from {source}...")
+        with open(source, "rb") as f:
+            df = pickle.load(f)
+        if os.path.exists(INGESTED_PATH):
+            import pandas as pd
+            ingested = pd.read_json(INGESTED_PATH, lines=True, dtype=False, convert_dates=False)
+            df = pd.concat([df, ingested], ignore_index=True)
+        build_review_store(df, path)
+        print(f"✅ Review store written to {path}")
+    return ReviewStore(path)
+
+
+if __name__ == "__main__":
+    store = open_review_store()
+    print(f"🧾 {len(store)} unique reviews across {len(store.ranges)} courses")
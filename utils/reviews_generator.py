@@ -1,44 +1,79 @@
 import os
-import pickle
-import pandas as pd
+import json
+from concurrent.futures import ThreadPoolExecutor
+from utils.review_store import open_review_store
 
-# 1. Load DataFrame
-with open("data.pkl", "rb") as f:
-    df = pickle.load(f)
+NUM_WORKERS = 4  # parallel course writers (1 = sequential)
+WRITE_BUFFER = 1 << 20  # bytes buffered per course file
 
-# 2. Print stats before removing duplicates
-total_reviews = len(df)
-duplicate_reviews = df.duplicated(subset=["reviews"]).sum()
-unique_reviews = total_reviews - duplicate_reviews
+# Per-course content hashes of the last export, so unchanged courses are skipped
+manifest_path = "data/processed/reviews_export.manifest.json"
 
-print(f"\n🧾 Total reviews in dataset: {total_reviews}")
-print(f"🔁 Duplicate reviews found: {duplicate_reviews}")
-print(f"✨ Unique reviews retained: {unique_reviews}")
+# Base folder to store reviews
+base_dir = "data/reviews"
 
-# 3. Drop duplicates based on review text
-df = df.drop_duplicates(subset=["reviews"]).reset_index(drop=True)
 
-# 4. Base folder to store reviews
-base_dir = "reviews"
-os.makedirs(base_dir, exist_ok=True)
+def sanitize(name):
+    return name.replace("/", "_").replace("\\", "_").strip()
 
-# 5. Loop through institutions and their courses
-for institution in sorted(df["institution"].dropna().unique()):
-    sanitized_institution = institution.replace("/", "_").replace("\\", "_").strip()
-    inst_dir = os.path.join(base_dir, sanitized_institution)
-    os.makedirs(inst_dir, exist_ok=True)
+def course_file_path(institution, course):
+    return os.path.join(base_dir, sanitize(institution), f"{sanitize(course)}.txt")
 
-    inst_df = df[df["institution"] == institution]
-    courses = sorted(inst_df["name"].dropna().unique())
+def load_manifest():
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-    for course in courses:
-        sanitized_course = course.replace("/", "_").replace("\\", "_").strip()
-        course_file = os.path.join(inst_dir, f"{sanitized_course}.txt")
+def save_manifest(manifest):
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
 
-        course_df = inst_df[inst_df["name"] == course]
+def export_course(store, institution, course, course_file):
+    """Stream one course's reviews to disk through a buffered writer."""
+    with open(course_file, "w", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        for review in store.reviews(institution, course):
+            f.write(f"{review.strip()}\n")
 
-        with open(course_file, "w", encoding="utf-8") as f:
-            for review in course_df["reviews"]:
-                f.write(f"{review.strip()}\n")
 
-print("\n✅ All reviews have been exported to the 'reviews' folder, one per line per file.")
\ No newline at end of file
+if __name__ == "__main__":
+    # 1. Open the review store (deduplicated and grouped once at build time)
+    store = open_review_store()
+
+    # 2. Print stats recorded when the store was built
+    total_reviews = store.meta["raw_rows"]
+    duplicate_reviews = store.meta["duplicate_rows"]
+    unique_reviews = total_reviews - duplicate_reviews
+
+    print(f"\n🧾 Total reviews in dataset: {total_reviews}")
+    print(f"🔁 Duplicate reviews found: {duplicate_reviews}")
+    print(f"✨ Unique reviews retained: {unique_reviews}")
+
+    # 3. Base folder to store reviews
+    os.makedirs(base_dir, exist_ok=True)
+    manifest = load_manifest()
+
+    # 4. Walk the prebuilt (institution, course) groups once, keeping only changed courses
+    jobs = []
+    for institution, course, _ in store.groups():
+        course_file = course_file_path(institution, course)
+        digest = store.course_digest(institution, course)
+        if manifest.get(course_file) == digest and os.path.exists(course_file):
+            continue
+        os.makedirs(os.path.dirname(course_file), exist_ok=True)
+        jobs.append((institution, course, course_file, digest))
+
+    print(f"\n📝 {len(jobs)} course file(s) changed, {len(manifest)} previously exported.")
+
+    # 5. Write the changed courses, optionally in parallel
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as pool:
+        futures = [(pool.submit(export_course, store, inst, course, path), path, digest)
+                   for inst, course, path, digest in jobs]
+        for future, course_file, digest in futures:
+            future.result()
+            manifest[course_file] = digest
+
+    save_manifest(manifest)
+
+    print("\n✅ All reviews have been exported to the 'data/reviews' folder, one per line per file.")
@@ -0,0 +1,244 @@
+"""Batched sentiment scoring with a persisted per-review results store.
+
+RoBERTa runs over length-sorted, padded batches instead of one review per
+forward pass, and VADER is spread over a process pool. ``build_sentiment_store``
+scores every review in the review store once and writes one ``.npy`` column per
+score (aligned with the review store's row ids) plus per-course aggregates to
+``data/processed/sentiment/``; reviews that were already scored are reused by
+content hash. Reviews appended to the review store later are scored on their
+own by ``update_sentiment_store``, which extends the columns in place and only
+recomputes the aggregates of the courses that gained reviews. At question time
+``SentimentStore`` turns sentiment into a lookup.
+
+Build it with ``python -m utils.sentiment_engine`` from the repository root.
+"""
+
+import os
+import json
+import numpy as np
+from multiprocessing import Pool
+from utils.review_store import open_review_store, load_array, save_array, append_array
+from utils.corpus_stats import load_canonical_map
+from utils.tracing import span
+
+SENTIMENT_DIR = "data/processed/sentiment"
+
+VADER_COLUMNS = ["vader_neg", "vader_neu", "vader_pos", "vader_compound"]
+ROBERTA_COLUMNS = ["roberta_neg", "roberta_neu", "roberta_pos"]
+SCORE_COLUMNS = VADER_COLUMNS + ROBERTA_COLUMNS
+SENTIMENT_LABELS = ["negative", "neutral", "positive"]
+
+
+# ------------------------------
+# RoBERTa: padded, length-bucketed batches
+# ------------------------------
+def score_roberta(texts, tokenizer, model, batch_size=32, max_length=512, device=None):
+    """Return an (n, 3) array of negative/neutral/positive probabilities."""
+    import torch
+
+    device = device or next(model.parameters()).device
+    encoded = tokenizer(list(texts), truncation=True, max_length=max_length)
+    lengths = np.array([len(ids) for ids in encoded["input_ids"]])
+    # Sorting by length keeps padding inside each batch to a minimum
+    order = np.argsort(lengths, kind="stable")
+    scores = np.zeros((len(texts), 3), dtype=np.float32)
+
+    model.eval()
+    with torch.no_grad(), span("roberta", batch_size=len(texts), tokens=int(lengths.sum())):
+        for start in range(0, len(order), batch_size):
+            batch_ids = order[start:start + batch_size]
+            features = [{key: encoded[key][i] for key in encoded.keys()} for i in batch_ids]
+            batch = tokenizer.pad(features, return_tensors="pt").to(device)
+            logits = model(**batch).logits
+            scores[batch_ids] = torch.softmax(logits, dim=-1).cpu().numpy()
+    return scores
+
+
+# ------------------------------
+# VADER: process pool
+# ------------------------------
+_sia = None
+
+
+def _init_vader():
+    global _sia
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    _sia = SentimentIntensityAnalyzer()
+
+
+def _vader_chunk(texts):
+    rows = []
+    for text in texts:
+        scores = _sia.polarity_scores(text)
+        rows.append((scores["neg"], scores["neu"], scores["pos"], scores["compound"]))
+    return rows
+
+
+def score_vader(texts, processes=None, chunk_size=2000):
+    """Return an (n, 4) array of VADER neg/neu/pos/compound scores."""
+    texts = list(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    if len(chunks) <= 1 or processes == 1:
+        _init_vader()
+        results = [_vader_chunk(chunk) for chunk in chunks]
+    else:
+        with Pool(processes=processes, initializer=_init_vader) as pool:
+            results = pool.map(_vader_chunk, chunks)
+    rows = [row for chunk in results for row in chunk]
+    return np.array(rows, dtype=np.float32).reshape(len(texts), 4)
+
+
+# ------------------------------
+# Persisted store
+# ------------------------------
+def course_aggregates(store, columns, courses=None):
+    """Mean scores and RoBERTa label distribution for every course (or only the given (institution, course) pairs)."""
+    groups = store.groups() if courses is None else ((inst, name, store.row_ids(inst, name)) for inst, name in courses)
+    aggregates = []
+    for institution, course, row_ids in groups:
+        roberta = np.stack([np.asarray(columns[c][row_ids]) for c in ROBERTA_COLUMNS], axis=1)
+        counts = np.bincount(roberta.argmax(axis=1), minlength=3)
+        distribution = {label: float(count / max(len(row_ids), 1)) for label, count in zip(SENTIMENT_LABELS, counts)}
+        aggregates.append({
+            "institution": institution,
+            "course": course,
+            "reviews": int(len(row_ids)),
+            "mean": {c: float(columns[c][row_ids].mean()) if len(row_ids) else 0.0 for c in SCORE_COLUMNS},
+            "distribution": distribution,
+            "overall": max(distribution, key=distribution.get),
+        })
+    return aggregates
+
+
+def _save_aggregates(out_dir, aggregates):
+    path = os.path.join(out_dir, "course_aggregates.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(aggregates, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def score_texts(texts, tokenizer, model, batch_size=32, processes=None, use_vader=True):
+    """{column: scores} of every ``SCORE_COLUMNS`` entry for a list of texts."""
+    vader = score_vader(texts, processes=processes) if use_vader else np.zeros((len(texts), 4), dtype=np.float32)
+    roberta = score_roberta(texts, tokenizer, model, batch_size=batch_size)
+    scores = {c: vader[:, i] for i, c in enumerate(VADER_COLUMNS)}
+    scores.update({c: roberta[:, i] for i, c in enumerate(ROBERTA_COLUMNS)})
+    return scores
+
+
+def build_sentiment_store(store, tokenizer, model, out_dir=SENTIMENT_DIR, batch_size=32, processes=None, use_vader=True):
+    """Score every review with VADER and RoBERTa, reusing scores of already-seen reviews.
+
+    With ``use_vader=False`` (e.g. offline, without the VADER lexicon) the VADER columns stay zero.
+    """
+    hashes = np.asarray(store.hash)
+    columns = {c: np.zeros(len(store), dtype=np.float32) for c in SCORE_COLUMNS}
+    todo = np.arange(len(store))
+
+    if os.path.exists(os.path.join(out_dir, "hash.npy")):
+        previous = SentimentStore(out_dir)
+        found, positions = previous.locate(hashes)
+        for c in SCORE_COLUMNS:
+            columns[c][found] = previous.columns[c][positions[found]]
+        todo = np.flatnonzero(~found)
+
+    # Near-duplicates take the scores of their canonical review
+    canonical = load_canonical_map(store)
+    targets = todo
+    if canonical is not None:
+        todo = np.unique(canonical[todo])
+
+    if len(todo):
+        print(f"⚙️ Scoring sentiment for {len(targets)} review(s) as {len(todo)} unique text(s) "
+              f"({len(store) - len(targets)} reused)...")
+        scores = score_texts(store.columns["reviews"].take(todo), tokenizer, model, batch_size, processes, use_vader)
+        for c in SCORE_COLUMNS:
+            columns[c][todo] = scores[c]
+        if canonical is not None:
+            for c in SCORE_COLUMNS:
+                columns[c][targets] = columns[c][canonical[targets]]
+
+    os.makedirs(out_dir, exist_ok=True)
+    for c in SCORE_COLUMNS:
+        save_array(os.path.join(out_dir, f"{c}.npy"), columns[c])
+    save_array(os.path.join(out_dir, "hash.npy"), hashes)
+    _save_aggregates(out_dir, course_aggregates(store, columns))
+    print(f"✅ Sentiment scores written to {out_dir}")
+
+
+def update_sentiment_store(store, start, courses, tokenizer, model, out_dir=SENTIMENT_DIR, batch_size=32,
+                           processes=None, use_vader=True):
+    """Score the reviews appended to the store from row ``start`` on and refresh the aggregates of ``courses``.
+
+    Falls back to ``build_sentiment_store`` if the persisted scores do not cover exactly the first ``start`` rows.
+    """
+    previous = SentimentStore(out_dir)
+    if len(previous) != start or not np.array_equal(previous.hash, store.hash[:start]):
+        build_sentiment_store(store, tokenizer, model, out_dir, batch_size, processes, use_vader)
+        return
+    if len(store) > start:
+        print(f"⚙️ Scoring sentiment for {len(store) - start} new review(s)...")
+        texts = store.columns["reviews"].take(range(start, len(store)))
+        scores = score_texts(texts, tokenizer, model, batch_size, processes, use_vader)
+        for c in SCORE_COLUMNS:
+            append_array(os.path.join(out_dir, f"{c}.npy"), scores[c], start)
+        # The hash column goes last: it is what marks the new rows as scored
+        append_array(os.path.join(out_dir, "hash.npy"), np.asarray(store.hash[start:]), start)
+
+    updated = SentimentStore(out_dir)
+    aggregates = dict(previous.aggregates)
+    for entry in course_aggregates(store, updated.columns, courses):
+        aggregates[(entry["institution"], entry["course"])] = entry
+    _save_aggregates(out_dir, list(aggregates.values()))
+    print(f"✅ Sentiment scores extended to {len(updated)} review(s), {len(courses)} course aggregate(s) refreshed.")
+
+
+class SentimentStore:
+    """Memory-mapped per-review sentiment scores keyed by review-store row id."""
+
+    def __init__(self, path=SENTIMENT_DIR):
+        self.path = path
+        self.columns = {c: load_array(os.path.join(path, f"{c}.npy")) for c in SCORE_COLUMNS}
+        self.hash = load_array(os.path.join(path, "hash.npy"))
+        # Sorted once, so every lookup is a binary search
+        self._hash_order = np.argsort(self.hash, kind="stable")
+        self._sorted_hashes = np.asarray(self.hash)[self._hash_order]
+        with open(os.path.join(path, "course_aggregates.json"), "r", encoding="utf-8") as f:
+            self.aggregates = {(a["institution"], a["course"]): a for a in json.load(f)}
+
+    def __len__(self):
+        return len(self.hash)
+
+    def locate(self, hashes):
+        """Return (found mask, row ids) for review content hashes."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(self.hash):
+            return np.zeros(len(hashes), dtype=bool), np.zeros(len(hashes), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_hashes, hashes), len(self._sorted_hashes) - 1)
+        found = self._sorted_hashes[positions] == hashes
+        return found, self._hash_order[positions]
+
+    def scores(self, row_id):
+        """All scores of one review plus its RoBERTa label, in the notebook's format."""
+        roberta = [float(self.columns[c][row_id]) for c in ROBERTA_COLUMNS]
+        return {
+            **{c: float(self.columns[c][row_id]) for c in SCORE_COLUMNS},
+            "negative": roberta[0],
+            "neutral": roberta[1],
+            "positive": roberta[2],
+            "sentiment": SENTIMENT_LABELS[int(np.argmax(roberta))],
+        }
+
+    def lookup(self, row_ids):
+        return [self.scores(row_id) for row_id in row_ids]
+
+    def course_aggregate(self, institution, course):
+        return self.aggregates.get((institution, course))
+
+
+if __name__ == "__main__":
+    from utils import model_registry
+
+    store = open_review_store()
+    tokenizer, model = model_registry.get("roberta_sentiment")
+    build_sentiment_store(store, tokenizer, model)
@@ -1,25 +1,24 @@
-import pandas as pd
-from summarizer import Summarizer  # BERTSUM
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
 from sumy.summarizers.text_rank import TextRankSummarizer
-from transformers import T5Tokenizer, T5ForConditionalGeneration, PegasusTokenizer, PegasusForConditionalGeneration
 from rouge_score import rouge_scorer
+from utils import model_registry
+from utils.review_store import open_review_store
+from utils.cluster_summary import summarize_reviews
 
-# Load CSV
-df = pd.read_csv("coursera_reviews.csv")  # Ensure columns: 'Course Name', 'Reviews'
+# Models come from the registry, so each process (or batch-evaluation worker) loads them once
 
-def get_reviews_for_course(course_name):
-    """Retrieve all reviews for a given course name."""
-    course_reviews = df[df["course_id"] == course_name]["reviews"][:300].dropna()
+def get_reviews_for_course(store, course_id):
+    """Retrieve the first 300 reviews of a course_id from the review store, merged into one text."""
+    course_reviews = [r for r in store.reviews_for_course_id(course_id) if r][:300]
     print(course_reviews[:20])
-    if course_reviews.empty:
+    if not course_reviews:
         return None
-    return " ".join(course_reviews.tolist())  # Merge all reviews into a single text
+    return " ".join(course_reviews)  # Merge all reviews into a single text
 
 def summarize_with_bertsum(text):
     """Extractive summarization using BERTSUM."""
-    model = Summarizer()
+    model = model_registry.get("bertsum")
     return model(text, ratio=0.3)  # Keep 30% of the text
 
 def summarize_with_textrank(text):
@@ -29,28 +28,35 @@ def summarize_with_textrank(text):
     summary = summarizer(parser.document, 3)  # Extract top 3 sentences
     return " ".join(str(sentence) for sentence in summary)
 
+def summarize_with_clusters(reviews):
+    """Extractive summarization by clustering sentence embeddings of a list of reviews (no 300-review cap)."""
+    return summarize_reviews(reviews, model_registry.get("sbert"))
+
+def _generate_summaries(tokenizer, model, texts):
+    """Beam-search summaries of a padded batch of texts."""
+    inputs = tokenizer(list(texts), return_tensors="pt", max_length=512, truncation=True, padding=True)
+    inputs = inputs.to(next(model.parameters()).device)
+
+    summary_ids = model.generate(**inputs, max_length=100, min_length=30, length_penalty=2.0, num_beams=4, early_stopping=True)
+    return tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+def summarize_batch_with_t5(texts):
+    """Abstractive summarization of several texts at once using T5 (fp32 or int8, see utils/inference_backend.py)."""
+    tokenizer, model = model_registry.get("t5")
+    return _generate_summaries(tokenizer, model, ["summarize: " + text for text in texts])
+
+def summarize_batch_with_pegasus(texts):
+    """Abstractive summarization of several texts at once using PEGASUS."""
+    tokenizer, model = model_registry.get("pegasus")
+    return _generate_summaries(tokenizer, model, texts)
+
 def summarize_with_t5(text):
     """Abstractive summarization using T5."""
-    model_name = "t5-small"
-    tokenizer = T5Tokenizer.from_pretrained(model_name)
-    model = T5ForConditionalGeneration.from_pretrained(model_name)
-    
-    input_text = "summarize: " + text
-    input_ids = tokenizer.encode(input_text, return_tensors="pt", max_length=512, truncation=True)
-    
-    summary_ids = model.generate(input_ids, max_length=100, min_length=30, length_penalty=2.0, num_beams=4, early_stopping=True)
-    return tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+    return summarize_batch_with_t5([text])[0]
 
 def summarize_with_pegasus(text):
     """Abstractive summarization using PEGASUS."""
-    model_name = "google/pegasus-xsum"
-    tokenizer = PegasusTokenizer.from_pretrained(model_name)
-    model = PegasusForConditionalGeneration.from_pretrained(model_name)
-    
-    input_ids = tokenizer.encode(text, return_tensors="pt", max_length=512, truncation=True)
-    
-    summary_ids = model.generate(input_ids, max_length=100, min_length=30, length_penalty=2.0, num_beams=4, early_stopping=True)
-    return tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+    return summarize_batch_with_pegasus([text])[0]
 
 def compute_rouge(reference, summary):
     """Compute ROUGE scores between reference and generated summary."""
@@ -62,31 +68,38 @@ def compute_rouge(reference, summary):
         'ROUGE-L': scores['rougeL'].fmeasure
     }
 
-# User Input
-course_name = input("Enter Course Name: ")
-reviews = get_reviews_for_course(course_name)
+if __name__ == "__main__":
+    store = open_review_store()
 
-if reviews:
-    # Using first 3 sentences as the reference summary
-    reference_summary = " ".join(reviews.split(". ")[:3])
+    # User Input
+    course_name = input("Enter Course ID: ")
+    reviews = get_reviews_for_course(store, course_name)
 
-    print("\n🔹 Summarization Results for:", course_name)
+    if reviews:
+        # Using first 3 sentences as the reference summary
+        reference_summary = " ".join(reviews.split(". ")[:3])
+
+        print("\n🔹 Summarization Results for:", course_name)
     
-    bertsum_summary = summarize_with_bertsum(reviews)
-    print("\n📌 BERTSUM (Extractive):\n", bertsum_summary)
-    print("🔹 ROUGE Scores:", compute_rouge(reference_summary, bertsum_summary))
+        bertsum_summary = summarize_with_bertsum(reviews)
+        print("\n📌 BERTSUM (Extractive):\n", bertsum_summary)
+        print("🔹 ROUGE Scores:", compute_rouge(reference_summary, bertsum_summary))
+
+        textrank_summary = summarize_with_textrank(reviews)
+        print("\n📌 TextRank (Extractive):\n", textrank_summary)
+        print("🔹 ROUGE Scores:", compute_rouge(reference_summary, textrank_summary))
 
-    textrank_summary = summarize_with_textrank(reviews)
-    print("\n📌 TextRank (Extractive):\n", textrank_summary)
-    print("🔹 ROUGE Scores:", compute_rouge(reference_summary, textrank_summary))
+        cluster_summary = summarize_with_clusters([r for r in store.reviews_for_course_id(course_name) if r])
+        print("\n📌 Sentence Clusters (Extractive, all reviews):\n", cluster_summary)
+        print("🔹 ROUGE Scores:", compute_rouge(reference_summary, cluster_summary))
 
-    t5_summary = summarize_with_t5(reviews)
-    print("\n📌 T5 (Abstractive):\n", t5_summary)
-    print("🔹 ROUGE Scores:", compute_rouge(reference_summary, t5_summary))
+        t5_summary = summarize_with_t5(reviews)
+        print("\n📌 T5 (Abstractive):\n", t5_summary)
+        print("🔹 ROUGE Scores:", compute_rouge(reference_summary, t5_summary))
 
-    pegasus_summary = summarize_with_pegasus(reviews)
-    print("\n📌 PEGASUS (Abstractive):\n", pegasus_summary)
-    print("🔹 ROUGE Scores:", compute_rouge(reference_summary, pegasus_summary))
+        pegasus_summary = summarize_with_pegasus(reviews)
+        print("\n📌 PEGASUS (Abstractive):\n", pegasus_summary)
+        print("🔹 ROUGE Scores:", compute_rouge(reference_summary, pegasus_summary))
 
-else:
-    print("Course not found!")
+    else:
+        print("Course not found!")
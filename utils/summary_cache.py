@@ -0,0 +1,102 @@
+"""Persistent hierarchical summary cache.
+
+Two tables in ``data/processed/summary_cache.sqlite``:
+
+* ``chunks`` memoizes the generated token ids of every chunk (map step and
+  every reduce level), keyed by a hash of (model, generation params, prompt,
+  chunk token ids);
+* ``summaries`` holds the final merged summary per (course, model + params),
+  together with a digest of the chunk keys it was built from.
+
+A warm request is a single ``summaries`` lookup. When a course gains reviews
+the digest no longer matches, but only the chunks whose content changed (plus
+the reduce steps above them) miss the ``chunks`` table and are regenerated.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+SUMMARY_CACHE_PATH = "data/processed/summary_cache.sqlite"
+
+
+def cache_key(*parts):
+    """Stable hex digest over JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class SummaryCache:
+    """SQLite-backed chunk memo table plus final-summary table."""
+
+    def __init__(self, path=SUMMARY_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (key TEXT PRIMARY KEY, output TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "course TEXT, params TEXT, digest TEXT, summary TEXT, PRIMARY KEY (course, params))"
+        )
+        self.conn.commit()
+        self.hits = {"chunks": 0, "summaries": 0}
+        self.misses = {"chunks": 0, "summaries": 0}
+
+    # ------------------------------
+    # Chunk memoization
+    # ------------------------------
+    def get_chunks(self, keys):
+        """Return {key: token ids} for the keys that are cached."""
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(f"SELECT key, output FROM chunks WHERE key IN ({placeholders})", batch)
+                found.update((key, json.loads(output)) for key, output in rows)
+        self.hits["chunks"] += len(found)
+        self.misses["chunks"] += len(set(keys)) - len(found)
+        return found
+
+    def put_chunks(self, items):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (key, output) VALUES (?, ?)",
+                [(key, json.dumps(ids)) for key, ids in items.items()],
+            )
+            self.conn.commit()
+
+    # ------------------------------
+    # Final summaries
+    # ------------------------------
+    def get_summary(self, course, params, digest):
+        """Cached summary for a course if it was built from exactly the same chunks."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT digest, summary FROM summaries WHERE course = ? AND params = ?", (course, params)
+            ).fetchone()
+        if row and row[0] == digest:
+            self.hits["summaries"] += 1
+            return row[1]
+        self.misses["summaries"] += 1
+        return None
+
+    def put_summary(self, course, params, digest, summary):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (course, params, digest, summary) VALUES (?, ?, ?, ?)",
+                (course, params, digest, summary),
+            )
+            self.conn.commit()
+
+    def invalidate(self, course):
+        """Drop the final summaries of a course (chunk entries stay reusable)."""
+        with self.lock:
+            self.conn.execute("DELETE FROM summaries WHERE course = ?", (course,))
+            self.conn.commit()
+
+    def stats(self):
+        return {"hits": dict(self.hits), "misses": dict(self.misses)}
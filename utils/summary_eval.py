@@ -0,0 +1,195 @@
+"""Batch evaluation of the summarization models over every course.
+
+Walks all courses of the review store (or a random sample) and runs the
+summarizers of ``summarization_variousmodels.py`` over a process pool. Models
+run one at a time, so each worker loads the current model once; T5 and
+PEGASUS summarize several courses per ``generate`` call. One row per
+(model, course) with ROUGE-1/2/L, latency and worker memory is appended to
+``data/processed/summary_eval.csv`` as soon as it is ready. Courses already
+scored in the file are skipped, so an interrupted overnight run resumes where
+it stopped (failed courses are retried).
+
+Run it from the repository root::
+
+    python -m utils.summary_eval --sample 50 --models textrank t5 --workers 4
+"""
+
+import os
+import csv
+import time
+import argparse
+import resource
+import numpy as np
+import pandas as pd
+from multiprocessing import get_context
+from tqdm import tqdm
+from utils.review_store import open_review_store
+from utils.model_registry import rss_mb
+from utils import summarization_variousmodels as models
+
+MODELS = ("bertsum", "textrank", "clusters", "t5", "pegasus")
+RESULTS_PATH = "data/processed/summary_eval.csv"
+NUM_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+MAX_REVIEWS = 300  # same cap as get_reviews_for_course; the cluster summarizer reads every review
+BATCH_SIZES = {"t5": 8, "pegasus": 4}  # courses per generate() call
+MAX_WORKERS = {"clusters": 1}  # the cluster summarizer writes to the shared embedding cache
+COLUMNS = ["model", "course_id", "reviews", "rouge1", "rouge2", "rougeL",
+           "latency_s", "rss_mb", "peak_rss_mb", "summary", "error"]
+
+SUMMARIZERS = {
+    "bertsum": lambda course: models.summarize_with_bertsum(course["text"]),
+    "textrank": lambda course: models.summarize_with_textrank(course["text"]),
+    "clusters": lambda course: models.summarize_with_clusters(course["reviews"]),
+}
+BATCH_SUMMARIZERS = {
+    "t5": models.summarize_batch_with_t5,
+    "pegasus": models.summarize_batch_with_pegasus,
+}
+
+
+# ------------------------------
+# Tasks
+# ------------------------------
+def course_ids(store, sample=None, seed=0):
+    ids = sorted(store.course_id_ranges)
+    if sample is not None and sample < len(ids):
+        ids = sorted(np.random.default_rng(seed).choice(ids, size=sample, replace=False).tolist())
+    return ids
+
+
+def make_tasks(store, ids, model):
+    """(model, courses) work items; each course carries its text, reference and (for clusters) all reviews."""
+    courses = []
+    for course_id in ids:
+        reviews = [r for r in store.reviews_for_course_id(course_id) if r]
+        if not reviews:
+            continue
+        text = " ".join(reviews[:MAX_REVIEWS])
+        courses.append({
+            "course_id": course_id,
+            "text": text,
+            # As in summarization_variousmodels.py, the first 3 sentences serve as the reference summary
+            "reference": " ".join(text.split(". ")[:3]),
+            "reviews": reviews if model == "clusters" else None,
+            "num_reviews": len(reviews),
+        })
+    batch_size = BATCH_SIZES.get(model, 1)
+    return [(model, courses[i:i + batch_size]) for i in range(0, len(courses), batch_size)]
+
+
+# ------------------------------
+# Workers
+# ------------------------------
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _row(model, course, summary, latency, error=""):
+    scores = models.compute_rouge(course["reference"], summary) if summary else {}
+    return {
+        "model": model,
+        "course_id": course["course_id"],
+        "reviews": course["num_reviews"],
+        "rouge1": scores.get("ROUGE-1", np.nan),
+        "rouge2": scores.get("ROUGE-2", np.nan),
+        "rougeL": scores.get("ROUGE-L", np.nan),
+        "latency_s": latency,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "summary": summary,
+        "error": error,
+    }
+
+
+def _evaluate(task):
+    """Summarize and score one batch of courses with one model; a failing course only fails its own row."""
+    model, courses = task
+    if model in BATCH_SUMMARIZERS:
+        start = time.perf_counter()
+        try:
+            summaries = BATCH_SUMMARIZERS[model]([course["text"] for course in courses])
+        except Exception as e:
+            return [_row(model, course, "", np.nan, f"{type(e).__name__}: {e}") for course in courses]
+        # Batched courses share the generate() call; each is charged an equal share
+        latency = (time.perf_counter() - start) / len(courses)
+        return [_row(model, course, summary, latency) for course, summary in zip(courses, summaries)]
+
+    rows = []
+    for course in courses:
+        start = time.perf_counter()
+        try:
+            summary = SUMMARIZERS[model](course)
+        except Exception as e:
+            rows.append(_row(model, course, "", np.nan, f"{type(e).__name__}: {e}"))
+            continue
+        rows.append(_row(model, course, summary, time.perf_counter() - start))
+    return rows
+
+
+# ------------------------------
+# Runner
+# ------------------------------
+def run_evaluation(store, model_names=MODELS, sample=None, workers=NUM_WORKERS, path=RESULTS_PATH, seed=0):
+    """Evaluate every requested model on every (sampled) course, streaming rows to ``path``."""
+    done = set()
+    if os.path.exists(path):
+        previous = pd.read_csv(path, usecols=["model", "course_id", "error"], dtype=str)
+        previous = previous[previous["error"].isna()]  # failed courses are retried
+        done = set(zip(previous["model"], previous["course_id"]))
+    ids = course_ids(store, sample, seed)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    ctx = get_context("spawn")
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if f.tell() == 0:
+            writer.writeheader()
+        for model in model_names:
+            todo = [course_id for course_id in ids if (model, str(course_id)) not in done]
+            tasks = make_tasks(store, todo, model)
+            if not tasks:
+                print(f"✅ {model}: all {len(ids)} course(s) already evaluated.")
+                continue
+            processes = min(MAX_WORKERS.get(model, workers), workers, len(tasks))
+            threads = max(1, (os.cpu_count() or 1) // processes)
+            with ctx.Pool(processes, initializer=_init_worker, initargs=(threads,)) as pool:
+                for rows in tqdm(pool.imap_unordered(_evaluate, tasks), total=len(tasks), desc=f"📝 {model}", unit="batch"):
+                    writer.writerows(rows)
+                    f.flush()
+    return pd.read_csv(path)
+
+
+def summarize_results(results):
+    """Mean scores, latency and peak memory per model."""
+    ok = results[results["error"].isna()] if "error" in results else results
+    table = ok.groupby("model").agg(
+        courses=("course_id", "count"),
+        rouge1=("rouge1", "mean"),
+        rouge2=("rouge2", "mean"),
+        rougeL=("rougeL", "mean"),
+        latency_s=("latency_s", "mean"),
+        p95_latency_s=("latency_s", lambda s: s.quantile(0.95)),
+        peak_rss_mb=("peak_rss_mb", "max"),
+    ).reindex(sorted(results["model"].unique()))
+    table["failed"] = results.groupby("model")["error"].count().reindex(table.index, fill_value=0)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate summarization models across courses.")
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    parser.add_argument("--sample", type=int, help="evaluate a random sample of this many courses")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = run_evaluation(open_review_store(), args.models, args.sample, args.workers, args.out, args.seed)
+    print("\n📊 Summarization models (mean over courses):")
+    print(summarize_results(results).to_string(float_format=lambda x: f"{x:.3f}"))
+    print(f"\n✅ Per-course results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
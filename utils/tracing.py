@@ -0,0 +1,178 @@
+"""Lightweight per-stage tracing and metrics for the QA pipeline.
+
+Wrap a stage in ``with span("retrieval", reviews=n) as s:`` (``s.set(...)``
+adds attributes such as batch sizes, token counts or ``cache_hit`` once they
+are known). Spans nest per thread/asyncio task; a span opened with no parent
+starts a new trace.
+
+* Every span feeds process-wide metrics (duration histogram, item counters,
+  cache hit/miss counters), exported in Prometheus text format by
+  ``prometheus_text`` / ``write_metrics``.
+* A trace is *sampled* with probability ``SAMPLE_RATE``. Only sampled traces
+  record memory deltas and are appended as one JSON line (root span plus
+  nested children) to ``data/processed/traces.jsonl``, which keeps the
+  overhead under load to two clock reads and a dict update per span.
+  Library calls sample nothing by default; the QA server and
+  ``utils.ask_question`` turn sampling on with ``configure``.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from utils.model_registry import rss_mb
+
+TRACE_PATH = "data/processed/traces.jsonl"
+METRICS_PATH = "data/processed/metrics.prom"
+SAMPLE_RATE = 0.0  # fraction of traces written to TRACE_PATH (0 disables traces, metrics stay on)
+ENTRY_SAMPLE_RATE = 0.1  # rate the server / CLI entry points configure
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNTED_ATTRS = ("batch_size", "tokens", "chunks", "reviews", "fallbacks")
+
+_config = {"sample_rate": SAMPLE_RATE, "trace_path": TRACE_PATH}
+_current = contextvars.ContextVar("qa_span", default=None)
+_lock = threading.Lock()
+_durations = {}  # stage -> [bucket counts..., sum, count]
+_items = {}  # (stage, attr) -> total
+_cache = {}  # (stage, "hit" | "miss") -> count
+
+
+def configure(sample_rate=None, trace_path=None):
+    if sample_rate is not None:
+        _config["sample_rate"] = sample_rate
+    if trace_path is not None:
+        _config["trace_path"] = trace_path
+
+
+class Span:
+    """One timed stage; sampled spans keep their children and memory delta."""
+
+    __slots__ = ("name", "attrs", "sampled", "children", "start", "duration", "rss_before", "rss_delta")
+
+    def __init__(self, name, attrs, sampled):
+        self.name = name
+        self.attrs = attrs
+        self.sampled = sampled
+        self.children = []
+        self.start = time.time()
+        self.duration = 0.0
+        self.rss_before = rss_mb() if sampled else 0.0
+        self.rss_delta = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration * 1000,
+            "rss_delta_mb": self.rss_delta,
+            **({"attrs": self.attrs} if self.attrs else {}),
+            **({"spans": [child.to_dict() for child in self.children]} if self.children else {}),
+        }
+
+
+@contextmanager
+def span(name, **attrs):
+    parent = _current.get()
+    sampled = parent.sampled if parent is not None else random.random() < _config["sample_rate"]
+    current = Span(name, attrs, sampled)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current.reset(token)
+        _observe(current)
+        if sampled:
+            current.rss_delta = rss_mb() - current.rss_before
+            if parent is not None:
+                parent.children.append(current)
+            else:
+                _write_trace(current)
+
+
+def _observe(current):
+    with _lock:
+        buckets = _durations.setdefault(current.name, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if current.duration <= bound:
+                buckets[i] += 1
+        buckets[-2] += current.duration
+        buckets[-1] += 1
+        for attr in COUNTED_ATTRS:
+            if isinstance(current.attrs.get(attr), (int, float)):
+                key = (current.name, attr)
+                _items[key] = _items.get(key, 0) + current.attrs[attr]
+        if "cache_hit" in current.attrs:
+            key = (current.name, "hit" if current.attrs["cache_hit"] else "miss")
+            _cache[key] = _cache.get(key, 0) + 1
+
+
+def _write_trace(root):
+    path = _config["trace_path"]
+    line = json.dumps(root.to_dict(), ensure_ascii=False, default=str)
+    with _lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# ------------------------------
+# Export
+# ------------------------------
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP qa_stage_duration_seconds Time spent per pipeline stage.",
+        "# TYPE qa_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        for stage, buckets in sorted(_durations.items()):
+            for bound, count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'qa_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'qa_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {buckets[-1]}')
+            lines.append(f'qa_stage_duration_seconds_sum{{stage="{stage}"}} {buckets[-2]:.6f}')
+            lines.append(f'qa_stage_duration_seconds_count{{stage="{stage}"}} {buckets[-1]}')
+        lines += ["# HELP qa_stage_items_total Items processed per stage (batch sizes, tokens, ...).",
+                  "# TYPE qa_stage_items_total counter"]
+        for (stage, attr), total in sorted(_items.items()):
+            lines.append(f'qa_stage_items_total{{stage="{stage}",item="{attr}"}} {total}')
+        lines += ["# HELP qa_cache_requests_total Cache lookups per stage and result.",
+                  "# TYPE qa_cache_requests_total counter"]
+        for (stage, result), count in sorted(_cache.items()):
+            lines.append(f'qa_cache_requests_total{{stage="{stage}",result="{result}"}} {count}')
+    lines += ["# HELP qa_process_resident_memory_mb Resident set size of the process.",
+              "# TYPE qa_process_resident_memory_mb gauge",
+              f"qa_process_resident_memory_mb {rss_mb():.1f}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path=METRICS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(path + ".tmp", path)
+
+
+def summary():
+    """{stage: {"count", "mean_ms"}} for quick console reports."""
+    with _lock:
+        return {stage: {"count": b[-1], "mean_ms": b[-2] / b[-1] * 1000 if b[-1] else 0.0}
+                for stage, b in _durations.items()}
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _items.clear()
+        _cache.clear()